@@ -560,22 +560,22 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(data => {
           console.log('URL已保存:', data);
           // URL保存成功后，发送指令
-          sendInstructionToOwlAPI(finalInstruction, sceneName);
+          sendInstructionToOwlAPI(finalInstruction, sceneName, currentUrl);
         })
         .catch(error => {
           console.error('保存URL时出错:', error);
           // 即使URL保存失败，也尝试发送指令
-          sendInstructionToOwlAPI(finalInstruction, sceneName);
+          sendInstructionToOwlAPI(finalInstruction, sceneName, currentUrl);
         });
       } else {
         // 不是需要保存URL的场景，直接发送指令
-        sendInstructionToOwlAPI(finalInstruction, sceneName);
+        sendInstructionToOwlAPI(finalInstruction, sceneName, currentUrl);
       }
     });
   }
 
   // 实际发送指令到OWL API的函数
-  function sendInstructionToOwlAPI(instruction, sceneName) {
+  function sendInstructionToOwlAPI(instruction, sceneName, url) {
     const statusElement = document.getElementById('status');
     
     fetch('http://localhost:7861/api/process_instruction', {
@@ -585,11 +585,13 @@ document.addEventListener('DOMContentLoaded', function() {
       },
       body: JSON.stringify({
         instruction: instruction,
-        scene: sceneName
+        scene: sceneName,
+        url: url
       })
     })
     .then(response => response.json())
     .then(data => {
+      console.log('任务ID:', data.job_id);
       // 更新状态为成功
       statusElement.textContent = '指令已发送成功';
       statusElement.className = 'success';
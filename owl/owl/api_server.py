@@ -11,16 +11,23 @@ import os
 import sys
 import json
 import http.server
-import socketserver
 import subprocess
 import threading
 import pathlib
 import queue
 import time
 import socket
+import shutil
 from clean_owl_results import extract_owl_response
-from result_viewer import update_result, start_result_viewer, DB_FILE
-import sqlite3  # 添加sqlite3导入
+from result_viewer import (
+    update_result, start_result_viewer,
+    parse_history_query, query_history_page, parse_history_search_query, search_history,
+    parse_run_stats_query, aggregate_run_metrics
+)
+from worker_pool import WorkerPool, DEFAULT_SCENE_MODULES
+from jobs import JobTable, JOB_RUNNING, JOB_COMPLETED, JOB_ERROR, EVENT_PREFIX
+from server_utils import PooledHTTPServer, LatencyHistogram, TimedRequestMixin, HTTP_WORKERS
+from history_db import get_connection, db_size_bytes
 
 # 获取项目根目录
 base_dir = pathlib.Path(__file__).parent.parent
@@ -31,18 +38,56 @@ instruction_file = str(base_dir / "owl" / "screenshot_instruction.txt")
 
 # print(instruction_file, "api_server.py")
 
+# 场景与处理脚本的对应关系，未列出的场景使用run_default.py
+SCENE_SCRIPTS = {
+    "文档助手": "run_file.py",
+    "学术论文": "run_scholar.py",
+    "聚焦事件": "run_news.py",
+    "产品页面": "run_product.py",
+    "旅行助手": "run_travel.py",
+}
+
+# 设置后所有场景都使用该脚本（如压测时使用桩脚本run_stub.py）
+SCENE_SCRIPT_OVERRIDE = os.getenv("OWL_SCENE_SCRIPT")
+
+# 常驻工作进程池配置，进程数为0时退回到每条指令启动一个子进程
+WORKER_POOL_SIZE = int(os.getenv("OWL_WORKER_POOL_SIZE", "2"))
+# 每个工作进程处理多少个任务后回收重建，0表示不回收
+WORKER_MAX_JOBS = int(os.getenv("OWL_WORKER_MAX_JOBS", "20"))
+# 是否在启动时预先导入全部场景脚本
+WORKER_WARMUP = os.getenv("OWL_WORKER_WARMUP", "1").lower() not in ("0", "false", "no")
+
+# 事件流没有新事件时发送心跳的间隔（秒）
+SSE_HEARTBEAT_INTERVAL = 15
+
+# 同时运行的任务数上限，超出的任务排队等待
+MAX_CONCURRENT_JOBS = int(os.getenv("OWL_MAX_CONCURRENT_JOBS", str(max(WORKER_POOL_SIZE, 1))))
+
+# 当前浏览网页URL的文件路径，提交任务时会复制到任务目录
+url_file = base_dir / "owl" / "current_url.json"
+
 # 使用队列存储处理结果
 result_queue = queue.Queue()
-# 全局变量，用于存储处理状态
-processing_status = {"status": "idle", "result": None}
+# 任务表，每个任务有独立的状态和工作目录
+job_table = JobTable(os.getenv("OWL_JOBS_DIR") or base_dir / "owl" / "jobs")
+# 限制同时运行的任务数
+job_slots = threading.BoundedSemaphore(MAX_CONCURRENT_JOBS)
+# 常驻工作进程池，在main中初始化
+worker_pool = None
+# API服务器的请求延迟统计
+api_latency = LatencyHistogram()
+
+class OWLRequestHandler(TimedRequestMixin, http.server.BaseHTTPRequestHandler):
+    # 记录各接口的请求耗时
+    latency_histogram = api_latency
 
-class OWLRequestHandler(http.server.BaseHTTPRequestHandler):
     def do_OPTIONS(self):
         # 处理CORS预检请求
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS, GET')  # 添加GET方法
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
     def do_POST(self):
@@ -61,21 +106,17 @@ class OWLRequestHandler(http.server.BaseHTTPRequestHandler):
                     self._send_error_response('未提供指令')
                     return
 
-                # 重置处理状态
-                global processing_status
-                processing_status = {"status": "processing", "result": None}
-                
-                # 设置环境变量
-                env = os.environ.copy()
-                env['PYTHONIOENCODING'] = 'utf-8'
+                # 创建任务，并把指令和URL写入任务目录
+                job = job_table.create(instruction, scene)
+                prepare_job_dir(job["job_id"], instruction, data.get('url'))
                 
                 # 在后台线程中运行OWL处理脚本
-                thread = threading.Thread(target=run_owl_script, args=(instruction, scene))
+                thread = threading.Thread(target=run_owl_script, args=(instruction, scene, job["job_id"]))
                 thread.daemon = True
                 thread.start()
                 
                 # 发送成功响应
-                self._send_success_response('指令已接收，正在处理中')
+                self._send_success_response('指令已接收，正在处理中', job_id=job["job_id"])
             
             except Exception as e:
                 self._send_error_response(f'处理指令时出错: {str(e)}')
@@ -94,8 +135,7 @@ class OWLRequestHandler(http.server.BaseHTTPRequestHandler):
                     return
                 
                 # 保存URL到JSON文件
-                url_file_path = base_dir / "owl" / "current_url.json"
-                with open(url_file_path, 'w', encoding='utf-8') as f:
+                with open(url_file, 'w', encoding='utf-8') as f:
                     json.dump({"url": url, "timestamp": time.time()}, f)
                 
                 # 发送成功响应
@@ -103,24 +143,8 @@ class OWLRequestHandler(http.server.BaseHTTPRequestHandler):
             
             except Exception as e:
                 self._send_error_response(f'保存URL时出错: {str(e)}')
-        elif self.path == '/api/get_result':
-            try:
-                # 直接从内存中获取结果
-                
-                if processing_status["status"] == "completed" and processing_status["result"]:
-                    # 发送结果
-                    self._send_json_response({
-                        'status': 'success',
-                        'result': processing_status["result"]
-                    })
-                else:
-                    self._send_json_response({
-                        'status': 'waiting',
-                        'result': '处理中，请稍候...'
-                    })
-            
-            except Exception as e:
-                self._send_error_response(str(e))
+        elif self.path == '/api/get_result' or self.path.startswith('/api/get_result/'):
+            self._send_job_result()
         elif self.path == '/api/clear_instruction':
             # 清除当前指令和结果
             try:
@@ -128,58 +152,69 @@ class OWLRequestHandler(http.server.BaseHTTPRequestHandler):
                 with open(instruction_file, 'w', encoding='utf-8') as f:
                     f.write('')
                 
-                # 重置处理状态
-                
-                processing_status = {"status": "idle", "result": None}
+                # 旧接口不再返回最近任务的结果
+                job_table.clear_latest()
                 
                 # 返回成功响应
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                
-                response = {"success": True, "message": "指令已清除"}
-                self.wfile.write(json.dumps(response).encode('utf-8'))
+                self._send_json_response({"success": True, "message": "指令已清除"})
             except Exception as e:
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                
-                response = {"success": False, "error": str(e)}
-                self.wfile.write(json.dumps(response).encode('utf-8'))
+                self._send_json_response({"success": False, "error": str(e)}, 500)
         else:
+            # 未读取的请求体会污染长连接中的下一个请求，直接关闭连接
+            self.close_connection = True
             self._send_error_response('未知的API端点')
     
     def do_GET(self):
         # 处理GET请求
-        if self.path == '/api/get_result':
+        if self.path == '/api/get_result' or self.path.startswith('/api/get_result/'):
+            self._send_job_result()
+        elif self.path == '/api/jobs':
+            # 列出所有任务及其状态
+            self._send_json_response({
+                'status': 'success',
+                'jobs': job_table.list(),
+                'active': job_table.count_active(),
+                'maxConcurrent': MAX_CONCURRENT_JOBS
+            })
+        elif self.path.startswith('/api/events/'):
+            # 以Server-Sent Events推送任务状态变化，推送在处理线程池之外的独立线程中进行
+            job_id = self.path[len('/api/events/'):]
+            if job_table.get(job_id) is None:
+                self._send_error_response("未找到指定的任务", 404)
+            else:
+                self.start_stream(self._stream_job_events, job_id)
+        elif self.path == '/api/metrics/latency':
+            # 各接口的请求延迟直方图
+            self._send_json_response({
+                'status': 'success',
+                'workers': HTTP_WORKERS,
+                **api_latency.snapshot()
+            })
+        elif self.path.split('?', 1)[0] == '/api/metrics/runs':
+            # 汇总历史记录中的运行指标（耗时、token用量）
             try:
-                # 直接从内存中获取结果
-                
-                
-                if processing_status["status"] == "completed" and processing_status["result"]:
-                    # 发送结果
-                    self._send_json_response({
-                        'status': 'success',
-                        'result': processing_status["result"]
-                    })
-                else:
-                    self._send_json_response({
-                        'status': 'waiting',
-                        'result': '处理中，请稍候...'
-                    })
-            
+                query = parse_run_stats_query(self.path)
+            except ValueError as e:
+                self._send_error_response(f"无效的统计参数: {str(e)}")
+                return
+            try:
+                self._send_json_response({
+                    'status': 'success',
+                    **aggregate_run_metrics(**query)
+                })
             except Exception as e:
-                self._send_error_response(str(e))
-        elif self.path == '/api/history':
-            # 从数据库获取历史记录
+                self._send_error_response(f"获取运行指标统计失败: {str(e)}")
+        elif self.path.split('?', 1)[0] == '/api/history':
+            # 从数据库分页获取历史记录
+            try:
+                query = parse_history_query(self.path)
+            except ValueError as e:
+                self._send_error_response(f"无效的分页参数: {str(e)}")
+                return
             try:
-                history = self._get_history_from_db()
                 self._send_json_response({
                     'status': 'success',
-                    'history': history,
-                    'totalPages': 1  # 简化版，实际应基于记录总数和每页显示数量计算
+                    **query_history_page(**query)
                 })
             except Exception as e:
                 self._send_error_response(f"获取历史记录失败: {str(e)}")
@@ -193,6 +228,20 @@ class OWLRequestHandler(http.server.BaseHTTPRequestHandler):
                 })
             except Exception as e:
                 self._send_error_response(f"获取数据库统计信息失败: {str(e)}")
+        elif self.path.split('?', 1)[0] == '/api/history/search':
+            # 全文搜索历史记录
+            try:
+                query = parse_history_search_query(self.path)
+            except ValueError as e:
+                self._send_error_response(f"无效的搜索参数: {str(e)}")
+                return
+            try:
+                self._send_json_response({
+                    'status': 'success',
+                    **search_history(**query)
+                })
+            except Exception as e:
+                self._send_error_response(f"搜索历史记录失败: {str(e)}")
         elif self.path.startswith('/api/history/'):
             # 获取单条历史记录详情
             try:
@@ -215,74 +264,104 @@ class OWLRequestHandler(http.server.BaseHTTPRequestHandler):
         else:
             self._send_error_response('未知的API端点')
     
-    def _send_success_response(self, message):
-        """发送成功响应"""
-        response = json.dumps({'status': 'success', 'message': message})
+    def _send_job_result(self):
+        """发送任务结果，路径中不带任务ID时返回最近提交的任务"""
+        try:
+            job_id = self.path[len('/api/get_result/'):] if self.path.startswith('/api/get_result/') else ''
+            job = job_table.get(job_id) if job_id else job_table.latest()
+            
+            if job_id and job is None:
+                self._send_error_response("未找到指定的任务", 404)
+            elif job and job["status"] == JOB_COMPLETED and job["result"]:
+                # 发送结果
+                self._send_json_response({
+                    'status': 'success',
+                    'job_id': job["job_id"],
+                    'result': job["result"]
+                })
+            elif job and job["status"] == JOB_ERROR:
+                self._send_json_response({
+                    'status': 'error',
+                    'job_id': job["job_id"],
+                    'result': job["result"]
+                })
+            else:
+                self._send_json_response({
+                    'status': 'waiting',
+                    'job_id': job["job_id"] if job else None,
+                    'state': job["status"] if job else 'idle',
+                    'result': '处理中，请稍候...'
+                })
+        
+        except Exception as e:
+            self._send_error_response(str(e))
+
+    def _stream_job_events(self, job_id):
+        """
+        推送任务事件直到任务结束：queued、running、round、tool_call、completed、error等。
+        客户端断线重连时通过Last-Event-ID从上次收到的事件之后继续推送。
+        """
+        try:
+            last_id = int(self.headers.get('Last-Event-ID') or 0)
+        except ValueError:
+            last_id = 0
+        
+        # 事件流没有Content-Length，以关闭连接表示结束
+        self.close_connection = True
         self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        self.wfile.write(response.encode('utf-8'))
+        
+        try:
+            while True:
+                events, finished = job_table.wait_events(job_id, last_id, SSE_HEARTBEAT_INTERVAL)
+                if events is None:
+                    break
+                if not events and not finished:
+                    self.wfile.write(b": keep-alive\n\n")
+                for event in events:
+                    chunk = f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+                    self.wfile.write(chunk.encode('utf-8'))
+                    last_id = event['id']
+                self.wfile.flush()
+                if finished:
+                    break
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            # 客户端已断开
+            pass
+
+    def _send_success_response(self, message, **extra):
+        """发送成功响应"""
+        self._send_json_response({'status': 'success', 'message': message, **extra})
     
     def _send_error_response(self, error_message, status_code=400):
         """发送错误响应"""
-        response = json.dumps({'error': error_message})
-        self.send_response(status_code)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(response.encode('utf-8'))
+        self._send_json_response({'error': error_message}, status_code)
 
-    def _send_json_response(self, data):
+    def _send_json_response(self, data, status_code=200):
         """发送JSON响应"""
-        response = json.dumps(data)
-        self.send_response(200)
+        response = json.dumps(data).encode('utf-8')
+        self.send_response(status_code)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        self.wfile.write(response.encode('utf-8'))
+        self.wfile.write(response)
 
-    def _get_history_from_db(self):
-        """从数据库获取历史记录"""
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # 查询历史记录，只返回基本信息
-        cursor.execute('''
-        SELECT id, timestamp, instruction, scene
-        FROM results_history
-        ORDER BY timestamp DESC
-        LIMIT 100
-        ''')
-        
-        results = []
-        for row in cursor.fetchall():
-            results.append({
-                'id': row['id'],
-                'timestamp': row['timestamp'],
-                'instruction': row['instruction'],
-                'scene': row['scene']
-            })
-        
-        conn.close()
-        return results
-    
     def _get_history_detail_from_db(self, record_id):
         """从数据库获取单条历史记录的详细信息"""
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         
         # 查询指定ID的历史记录详情
         cursor.execute('''
-        SELECT id, timestamp, result, instruction, article_url, scene, images, tables
+        SELECT id, timestamp, result, instruction, article_url, scene, images, tables, metrics
         FROM results_history
         WHERE id = ?
         ''', (record_id,))
         
         row = cursor.fetchone()
-        conn.close()
         
         if not row:
             return None
@@ -310,12 +389,17 @@ class OWLRequestHandler(http.server.BaseHTTPRequestHandler):
             except:
                 detail['tables'] = []
         
+        if row['metrics']:
+            try:
+                detail['metrics'] = json.loads(row['metrics'])
+            except ValueError:
+                pass
+        
         return detail
 
     def _get_db_stats(self):
         """获取数据库统计信息"""
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         
         # 获取总记录数
         cursor.execute('SELECT COUNT(*) FROM results_history')
@@ -328,25 +412,23 @@ class OWLRequestHandler(http.server.BaseHTTPRequestHandler):
         
         # 获取数据库文件大小
         try:
-            db_size_bytes = os.path.getsize(DB_FILE)
-            if db_size_bytes < 1024:
-                db_size = f"{db_size_bytes} B"
-            elif db_size_bytes < 1024 * 1024:
-                db_size = f"{db_size_bytes / 1024:.2f} KB"
+            size_bytes = db_size_bytes()
+            if size_bytes < 1024:
+                db_size = f"{size_bytes} B"
+            elif size_bytes < 1024 * 1024:
+                db_size = f"{size_bytes / 1024:.2f} KB"
             else:
-                db_size = f"{db_size_bytes / (1024 * 1024):.2f} MB"
+                db_size = f"{size_bytes / (1024 * 1024):.2f} MB"
         except:
             db_size = "未知"
         
-        conn.close()
-        
         return {
             'totalRecords': total_records,
             'latestRecord': latest_record,
             'dbSize': db_size
         }
 
-def read_stream(stream, output_list, prefix=""):
+def read_stream(stream, output_list, prefix="", on_event=None):
     """
     读取流并将输出添加到列表中。
     
@@ -354,8 +436,15 @@ def read_stream(stream, output_list, prefix=""):
         stream: 要读取的流。
         output_list: 存储输出的列表。
         prefix: 输出前缀。
+        on_event (callable, optional): 遇到以EVENT_PREFIX开头的事件行时调用。
     """
     for line in iter(stream.readline, ''):
+        if on_event is not None and line.startswith(EVENT_PREFIX):
+            try:
+                on_event(json.loads(line[len(EVENT_PREFIX):]))
+                continue
+            except Exception as e:
+                print(f"解析任务事件时出错: {str(e)}")
         try:
             print(f"{prefix}: {line.strip()}")
             output_list.append(line)
@@ -369,21 +458,129 @@ def read_stream(stream, output_list, prefix=""):
                 # 如果仍然失败，添加一个占位符
                 output_list.append("[内容包含无法显示的字符]")
 
-def run_owl_script(instruction, scene):
+def run_script_in_subprocess(script_path, instruction, job_env=None, on_event=None):
     """
-    运行OWL处理脚本来处理指令。
+    在独立的子进程中运行场景脚本（未启用工作进程池时使用）。
+    
+    参数:
+        script_path (str): 场景脚本路径。
+        instruction (str): 要处理的指令。
+        job_env (dict, optional): 额外传给脚本的环境变量。
+        on_event (callable, optional): 脚本输出事件行时调用。
+    
+    返回:
+        tuple: (返回码, 标准输出, 标准错误, 结果文件中的数据)
+    """
+    # 设置编码环境变量
+    env = os.environ.copy()
+    env['PYTHONIOENCODING'] = 'utf-8'
+    env.update(job_env or {})
+    
+    # 运行脚本并实时捕获输出
+    process = subprocess.Popen(
+        [sys.executable, script_path, instruction],
+        cwd=str(base_dir),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        bufsize=1,
+        universal_newlines=True,
+        encoding='utf-8',
+        env=env
+    )
+    
+    # 实时读取输出
+    stdout_output = []
+    stderr_output = []
+    
+    # 创建线程读取输出
+    stdout_thread = threading.Thread(
+        target=read_stream, 
+        args=(process.stdout, stdout_output, "脚本输出", on_event)
+    )
+    stderr_thread = threading.Thread(
+        target=read_stream, 
+        args=(process.stderr, stderr_output, "脚本错误")
+    )
+    
+    stdout_thread.daemon = True
+    stderr_thread.daemon = True
+    stdout_thread.start()
+    stderr_thread.start()
+    
+    # 等待进程完成
+    process.wait()
+    stdout_thread.join()
+    stderr_thread.join()
+    
+    stdout = "".join(stdout_output)
+    stderr = "".join(stderr_output)
+    
+    # 从输出中提取结果文件
+    result_data = None
+    result_file = None
+    
+    for line in stdout.splitlines():
+        if line.startswith("OWL_RESULT_FILE:"):
+            result_file = line.replace("OWL_RESULT_FILE:", "", 1).strip()
+            print(f"发现结果文件: {result_file}")
+            if os.path.exists(result_file):
+                try:
+                    with open(result_file, 'r', encoding='utf-8') as f:
+                        result_data = json.load(f)
+                    print(f"从文件读取JSON结果成功")
+                    break
+                except Exception as e:
+                    print(f"从文件读取JSON结果失败: {str(e)}")
+    
+    return process.returncode, stdout, stderr, result_data
+
+def prepare_job_dir(job_id, instruction, url=None):
+    """
+    把任务的指令和当前URL写入任务目录，避免并行任务共用同一份文件。
+    
+    参数:
+        job_id (str): 任务ID。
+        instruction (str): 要处理的指令。
+        url (str, optional): 请求中携带的URL，未提供时复制最近一次保存的URL。
+    """
+    job_dir = job_table.job_dir(job_id)
+    with open(os.path.join(job_dir, "screenshot_instruction.txt"), 'w', encoding='utf-8') as f:
+        f.write(instruction)
+    
+    if url:
+        with open(os.path.join(job_dir, "current_url.json"), 'w', encoding='utf-8') as f:
+            json.dump({"url": url, "timestamp": time.time()}, f)
+    elif os.path.exists(url_file):
+        shutil.copyfile(url_file, os.path.join(job_dir, "current_url.json"))
+
+def run_owl_script(instruction, scene, job_id):
+    """
+    等待空闲的运行名额后处理任务，同时运行的任务数不超过MAX_CONCURRENT_JOBS。
     
     参数:
         instruction (str): 要处理的指令。
         scene (str): 场景名称。
+        job_id (str): 任务ID。
+    
+    返回:
+        dict: 任务结束时的快照。
     """
-    # 在函数开始处声明全局变量
-    global processing_status
+    with job_slots:
+        job_table.update(job_id, status=JOB_RUNNING)
+        _run_owl_job(instruction, scene, job_id)
+    return job_table.get(job_id)
+
+def _run_owl_job(instruction, scene, job_id):
+    """
+    运行OWL处理脚本来处理指令。
     
+    参数:
+        instruction (str): 要处理的指令。
+        scene (str): 场景名称。
+        job_id (str): 任务ID，结果文件写入该任务的目录。
+    """
     try:
-        # 重置处理状态，确保清除旧结果
-        processing_status = {"status": "processing", "result": None}
-        
         # 清空结果查看器中的旧结果 - 使用空的占位符消息
         try:
             update_result({
@@ -394,28 +591,8 @@ def run_owl_script(instruction, scene):
         except Exception as e:
             print(f"更新处理状态时出错: {str(e)}")
         
-        # 清理主目录下的结果文件
-        main_result_file = os.path.join(base_dir, "owl", "owl_result.json")
-        if os.path.exists(main_result_file):
-            try:
-                os.remove(main_result_file)
-                print(f"已清除旧的结果文件: {main_result_file}")
-            except Exception as e:
-                print(f"清除旧结果文件时出错: {str(e)}")
-        
         # 根据场景选择不同的脚本
-        if scene == "文档助手":
-            script_name = "run_file.py"
-        elif scene == "学术论文":
-            script_name = "run_scholar.py"
-        elif scene == "聚焦事件":
-            script_name = "run_news.py"
-        elif scene == "产品页面":
-            script_name = "run_product.py"
-        elif scene == "旅行助手":
-            script_name = "run_travel.py"
-        else:
-            script_name = "run_default.py"
+        script_name = SCENE_SCRIPT_OVERRIDE or SCENE_SCRIPTS.get(scene, "run_default.py")
         
         # 构建脚本路径
         script_path = os.path.join(base_dir, "owl", "examples", script_name)
@@ -433,83 +610,61 @@ def run_owl_script(instruction, scene):
         if not os.path.exists(script_path):
             error_msg = f"脚本文件不存在: {script_path}"
             print(error_msg)
-            processing_status = {"status": "error", "result": error_msg}
+            job_table.update(job_id, status=JOB_ERROR, result=error_msg)
             return
         
-        # 设置编码环境变量
-        env = os.environ.copy()
-        env['PYTHONIOENCODING'] = 'utf-8'
-        
-        # 运行脚本并实时捕获输出
-        process = subprocess.Popen(
-            [sys.executable, script_path, instruction],
-            cwd=str(base_dir),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            universal_newlines=True,
-            encoding='utf-8',
-            env=env
-        )
-        
-        # 实时读取输出
-        stdout_output = []
-        stderr_output = []
-        
-        # 创建线程读取输出
-        stdout_thread = threading.Thread(
-            target=read_stream, 
-            args=(process.stdout, stdout_output, "脚本输出")
-        )
-        stderr_thread = threading.Thread(
-            target=read_stream, 
-            args=(process.stderr, stderr_output, "脚本错误")
-        )
+        # 场景脚本从OWL_JOB_DIR读取URL并写入结果文件
+        job_env = {"OWL_JOB_DIR": job_table.job_dir(job_id)}
         
-        stdout_thread.daemon = True
-        stderr_thread.daemon = True
-        stdout_thread.start()
-        stderr_thread.start()
-        
-        # 等待进程完成
-        process.wait()
-        stdout_thread.join()
-        stderr_thread.join()
-        
-        stdout = "".join(stdout_output)
-        stderr = "".join(stderr_output)
+        # 场景脚本输出的事件（每轮结束、工具调用等）实时转发给订阅者
+        def on_event(event):
+            job_table.publish(job_id, event.get("event", "message"), event.get("data"))
+            # 每轮结束时把阶段性回答推送到结果查看器（"正在处理中"开头的结果不写入历史记录）
+            data = event.get("data") or {}
+            if event.get("event") == "round" and data.get("assistant"):
+                try:
+                    update_result({
+                        "instruction": instruction,
+                        "scene": scene,
+                        "answer": f"正在处理中（第{data.get('round', 0) + 1}轮）...\n\n{data['assistant']}"
+                    })
+                except Exception as e:
+                    print(f"推送阶段性结果时出错: {str(e)}")
         
-        # 检查进程返回码
-        if process.returncode != 0:
-            error_msg = f"脚本执行失败，返回码: {process.returncode}\n错误输出: {stderr}"
-            print(error_msg)
-            processing_status = {"status": "error", "result": error_msg}
-            
-            # 更新错误信息到结果查看器
+        if worker_pool is not None:
+            # 交给常驻工作进程处理，省去启动解释器和导入依赖的时间
+            stdout, stderr = "", ""
+            module_name = f"examples.{pathlib.Path(script_path).stem}"
             try:
-                update_result(error_msg)
+                result_data = worker_pool.submit(module_name, instruction, job_env, on_event)
             except Exception as e:
-                print(f"更新结果查看器时出错: {str(e)}")
+                error_msg = f"工作进程执行失败: {str(e)}"
+                print(error_msg)
+                job_table.update(job_id, status=JOB_ERROR, result=error_msg)
+                
+                # 更新错误信息到结果查看器
+                try:
+                    update_result(error_msg)
+                except Exception as e:
+                    print(f"更新结果查看器时出错: {str(e)}")
+                
+                return
+        else:
+            returncode, stdout, stderr, result_data = run_script_in_subprocess(script_path, instruction, job_env, on_event)
             
-            return
-        
-        # 从输出中提取结果文件
-        result_data = None
-        result_file = None
-        
-        for line in stdout.splitlines():
-            if line.startswith("OWL_RESULT_FILE:"):
-                result_file = line.replace("OWL_RESULT_FILE:", "", 1).strip()
-                print(f"发现结果文件: {result_file}")
-                if os.path.exists(result_file):
-                    try:
-                        with open(result_file, 'r', encoding='utf-8') as f:
-                            result_data = json.load(f)
-                        print(f"从文件读取JSON结果成功")
-                        break
-                    except Exception as e:
-                        print(f"从文件读取JSON结果失败: {str(e)}")
+            # 检查进程返回码
+            if returncode != 0:
+                error_msg = f"脚本执行失败，返回码: {returncode}\n错误输出: {stderr}"
+                print(error_msg)
+                job_table.update(job_id, status=JOB_ERROR, result=error_msg)
+                
+                # 更新错误信息到结果查看器
+                try:
+                    update_result(error_msg)
+                except Exception as e:
+                    print(f"更新结果查看器时出错: {str(e)}")
+                
+                return
         
         try:
             def clean_text(text):
@@ -544,6 +699,8 @@ def run_owl_script(instruction, scene):
                     
                     article_url = result_data.get("article_url", "")
                     all_rounds = result_data.get("all_rounds", [])
+                    # run_society返回的运行指标（耗时、token用量），随历史记录保存
+                    metrics = (result_data.get("token_count") or {}).get("metrics")
                     
                     # 创建结构化结果
                     structured_result = {
@@ -552,24 +709,26 @@ def run_owl_script(instruction, scene):
                         "answer": answer,
                         "article_url": article_url,
                         "all_rounds": all_rounds,
-                        "chat_history": chat_history
+                        "chat_history": chat_history,
+                        "metrics": metrics
                     }
                     
                     # 更新结果查看器
                     update_result(structured_result)
                     
-                    # 更新处理状态
-                    processing_status = {
-                        "status": "completed", 
-                        "result": answer,
-                        "structured_result": structured_result
-                    }
+                    # 更新任务状态
+                    job_table.update(
+                        job_id,
+                        status=JOB_COMPLETED,
+                        result=answer,
+                        structured_result=structured_result
+                    )
                 else:
                     # 如果是简单数据
                     result = f"指令: {instruction}\n\n回答: {clean_text(result_data)}"
                     clean_result = extract_owl_response(result)
                     
-                    processing_status = {"status": "completed", "result": clean_result, "raw_result": result}
+                    job_table.update(job_id, status=JOB_COMPLETED, result=clean_result, raw_result=result)
                     update_result(clean_result)
             else:
                 # 如果没有结构化数据，从stdout中提取
@@ -611,12 +770,13 @@ def run_owl_script(instruction, scene):
                     "stderr": stderr
                 }
                 
-                processing_status = {
-                    "status": "completed", 
-                    "result": clean_result, 
-                    "raw_result": result,
-                    "structured_result": structured_result
-                }
+                job_table.update(
+                    job_id,
+                    status=JOB_COMPLETED,
+                    result=clean_result,
+                    raw_result=result,
+                    structured_result=structured_result
+                )
                 
                 update_result(structured_result)
             
@@ -628,7 +788,7 @@ def run_owl_script(instruction, scene):
             import traceback
             traceback.print_exc()
             
-            processing_status = {"status": "error", "result": error_msg}
+            job_table.update(job_id, status=JOB_ERROR, result=error_msg)
             
             # 更新错误信息到结果查看器
             try:
@@ -643,7 +803,7 @@ def run_owl_script(instruction, scene):
         traceback.print_exc()
         
         # 更新处理状态为错误
-        processing_status = {"status": "error", "result": error_msg}
+        job_table.update(job_id, status=JOB_ERROR, result=error_msg)
         
         # 同样更新错误信息到结果查看器
         try:
@@ -651,8 +811,6 @@ def run_owl_script(instruction, scene):
         except Exception as e:
             print(f"更新结果查看器时出错: {str(e)}")
 
-    return processing_status
-
 def is_port_in_use(port):
     """检查端口是否被占用"""
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -694,7 +852,6 @@ def main():
     """启动API服务器"""
     port = 7861
     handler = OWLRequestHandler
-    global processing_status
     
     # 检查并释放需要的端口
     ports_to_check = [7861, 7865, 7866]
@@ -721,10 +878,26 @@ def main():
         import traceback
         traceback.print_exc()
     
+    # 启动常驻工作进程池
+    global worker_pool
+    if WORKER_POOL_SIZE > 0:
+        try:
+            worker_pool = WorkerPool(
+                work_dir=base_dir,
+                size=WORKER_POOL_SIZE,
+                max_jobs=WORKER_MAX_JOBS,
+                warmup=WORKER_WARMUP,
+                scene_modules=[f"examples.{pathlib.Path(SCENE_SCRIPT_OVERRIDE).stem}"]
+                if SCENE_SCRIPT_OVERRIDE else DEFAULT_SCENE_MODULES,
+            ).start()
+        except Exception as e:
+            print(f"启动工作进程池时出错，将为每条指令启动独立子进程: {str(e)}")
+            worker_pool = None
+    
     # 启动API服务器
     try:
-        with socketserver.TCPServer(("", port), handler) as httpd:
-            print(f"API服务器已启动，监听端口{port}...")
+        with PooledHTTPServer(("", port), handler, workers=HTTP_WORKERS) as httpd:
+            print(f"API服务器已启动，监听端口{port}，处理线程数: {HTTP_WORKERS}...")
             httpd.serve_forever()
     except OSError as e:
         if "地址已经被使用" in str(e) or "Address already in use" in str(e):
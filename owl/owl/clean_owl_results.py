@@ -76,16 +76,19 @@ def extract_owl_response(owl_result):
 
 def save_clean_response(input_file, output_file):
     """
-    从JSON文件中读取OWL结果，提取有用部分并保存
+    从JSON或JSONL文件中读取OWL结果，提取有用部分并保存
     
     参数:
-        input_file (str): 输入的JSON文件路径
+        input_file (str): 输入的JSON文件路径，以.jsonl结尾时按每行一条记录读取
         output_file (str): 输出的文本文件路径
     """
     try:
         # 读取JSON文件
         with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+            if input_file.endswith('.jsonl'):
+                data = [json.loads(line) for line in f if line.strip()]
+            else:
+                data = json.load(f)
         
         # 处理每个结果
         clean_results = []
@@ -113,6 +116,6 @@ def save_clean_response(input_file, output_file):
 
 # 使用示例
 if __name__ == "__main__":
-    input_file = "owl_results_history.json"
+    input_file = "owl_results_history.jsonl"
     output_file = "clean_results.json"
     save_clean_response(input_file, output_file)
\ No newline at end of file
@@ -49,16 +49,18 @@ logger = get_logger(__name__)
 LEVEL = 1
 SAVE_RESULT = True
 test_idx = [0]
+# Tasks solved at once, each in its own worker process
+PROCESSES = 1
+# Seconds a task may run in a worker process before it is stopped
+TASK_TIMEOUT = None
 
 
-def main():
-    """Main function to run the GAIA benchmark."""
-    # Create cache directory
-    cache_dir = "tmp/"
-    os.makedirs(cache_dir, exist_ok=True)
-    result_dir = "results/"
-    os.makedirs(result_dir, exist_ok=True)
+def construct_agent_kwargs():
+    """Create the models and tools of the agents.
 
+    Called once in each worker process, so that every worker has its own
+    models, browser and code sandbox.
+    """
     # Create models for different components
     models = {
         "user": ModelFactory.create(
@@ -114,9 +116,27 @@ def main():
     # Configure agent roles and parameters
     user_agent_kwargs = {"model": models["user"]}
     assistant_agent_kwargs = {"model": models["assistant"], "tools": tools}
+    return user_agent_kwargs, assistant_agent_kwargs
+
+
+def main():
+    """Main function to run the GAIA benchmark."""
+    # Create cache directory
+    cache_dir = "tmp/"
+    os.makedirs(cache_dir, exist_ok=True)
+    result_dir = "results/"
+    os.makedirs(result_dir, exist_ok=True)
+
+    if PROCESSES > 1 or TASK_TIMEOUT is not None:
+        # each worker process builds its own agents with construct_agent_kwargs
+        user_agent_kwargs, assistant_agent_kwargs = None, None
+    else:
+        user_agent_kwargs, assistant_agent_kwargs = construct_agent_kwargs()
 
     # Initialize benchmark
-    benchmark = GAIABenchmark(data_dir="data/gaia", save_to="results/result.json")
+    benchmark = GAIABenchmark(
+        data_dir="data/gaia", save_to="results/result.json", processes=PROCESSES
+    )
 
     # Print benchmark information
     print(f"Number of validation examples: {len(benchmark.valid)}")
@@ -132,6 +152,8 @@ def main():
         user_agent_kwargs=user_agent_kwargs,
         assistant_role_name="assistant",
         assistant_agent_kwargs=assistant_agent_kwargs,
+        agent_kwargs_factory=construct_agent_kwargs,
+        task_timeout=TASK_TIMEOUT,
     )
 
     # Output results
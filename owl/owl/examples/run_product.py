@@ -25,19 +25,17 @@ import os
 import json
 import io
 from dotenv import load_dotenv
-from camel.models import ModelFactory
 from camel.toolkits import (
     CodeExecutionToolkit,
     ExcelToolkit,
     ImageAnalysisToolkit,
-    SearchToolkit,
     VideoAnalysisToolkit,
     BrowserToolkit,
     FileWriteToolkit,
 )
 from camel.types import ModelPlatformType, ModelType
 from camel.societies import RolePlaying
-from owl.utils import run_society, DocumentProcessingToolkit
+from owl.utils import run_society, print_round_event, AnswerStabilityChecker, early_stop_enabled, DocumentProcessingToolkit, enable_parallel_tool_calls, MultiSearchToolkit, shared_model, shared_tools
 from camel.logger import set_log_level
 import pathlib
 import logging
@@ -107,38 +105,39 @@ def construct_society(question: str) -> RolePlaying:
     """
 
     # 为不同组件创建模型,temperature设为0.7：	中等创造性，既能推理也有变化，专业推荐：temperature=0.5 更自由探索：temperature=0.9
+    # 相同配置的模型和工具包在进程内只创建一次，之后的社会直接复用
     models = {
-        "user": ModelFactory.create(
+        "user": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_MAX,
             model_config_dict={"temperature": 0.7},
         ),
-        "assistant": ModelFactory.create(
+        "assistant": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_MAX,
             model_config_dict={"temperature": 0.7},
         ),
-        "browsing": ModelFactory.create(
+        "browsing": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_VL_MAX,
             model_config_dict={"temperature": 0.7},
         ),
-        "planning": ModelFactory.create(
+        "planning": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_MAX,
             model_config_dict={"temperature": 0.7},
         ),
-        "video": ModelFactory.create(
+        "video": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_VL_MAX,
             model_config_dict={"temperature": 0.7},
         ),
-        "image": ModelFactory.create(
+        "image": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_VL_MAX,
             model_config_dict={"temperature": 0.7},
         ),
-        "document": ModelFactory.create(
+        "document": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_VL_MAX,
             model_config_dict={"temperature": 0.7},
@@ -147,22 +146,22 @@ def construct_society(question: str) -> RolePlaying:
 
     # 配置工具包
     tools = [
-        *BrowserToolkit(
+        *shared_tools(
+            BrowserToolkit,
             headless=False,
             web_agent_model=models["browsing"],
             planning_agent_model=models["planning"],
             output_language="Chinese",
-        ).get_tools(),
+        ),
+        # 视频工具包内部的对话智能体不会重置，每个任务单独创建，避免不同任务的视频和问题互相串扰
         *VideoAnalysisToolkit(model=models["video"]).get_tools(),
-        *CodeExecutionToolkit(sandbox="subprocess", verbose=True).get_tools(),
-        *ImageAnalysisToolkit(model=models["image"]).get_tools(),
-        SearchToolkit().search_duckduckgo,
-        SearchToolkit().search_google,
-        SearchToolkit().search_wiki,
-        SearchToolkit().search_baidu,
-        *ExcelToolkit().get_tools(),
-        *DocumentProcessingToolkit(model=models["document"]).get_tools(),
-        *FileWriteToolkit(output_dir="./").get_tools(),
+        *shared_tools(CodeExecutionToolkit, sandbox="subprocess", verbose=True),
+        *shared_tools(ImageAnalysisToolkit, model=models["image"]),
+        # 一次调用并发查询多个搜索引擎，结果按URL去重合并
+        *shared_tools(MultiSearchToolkit),
+        *shared_tools(ExcelToolkit),
+        *shared_tools(DocumentProcessingToolkit, model=models["document"]),
+        *shared_tools(FileWriteToolkit, output_dir="./"),
     ]
 
     # 购物专属角色设定
@@ -178,7 +177,7 @@ def construct_society(question: str) -> RolePlaying:
     
     1. 信息获取策略：
        - 优先使用extract_document_content工具直接爬取网页内容，而不是模拟浏览行为
-       - 对于电商平台，使用search_baidu或search_google获取目标URL
+       - 对于电商平台，使用search_web获取目标URL
        - 使用DocumentProcessingToolkit处理结构化数据
     
     2. 产品分析要点：
@@ -210,6 +209,9 @@ def construct_society(question: str) -> RolePlaying:
         output_language="Chinese",
     )
 
+    # 同一轮回复中的多个搜索、文档提取调用并行执行，浏览器等其他工具仍按顺序执行
+    enable_parallel_tool_calls(society.assistant_agent)
+
     return society
 
 def log_task_details(task_types, instruction, answer):
@@ -235,7 +237,13 @@ def process_instruction(instruction: str):
     print(f"发送给智能体的任务提示:\n{task_prompt}\n")
     
     society = construct_society(task_prompt) #参数改成task_prompt而不是instruction
-    answer, chat_history, token_count = run_society(society, 5)
+    # 每轮结束后输出事件，api_server实时转发给订阅者；设置OWL_EARLY_STOP=1时，回答在相邻两轮间基本不变则提前结束
+    answer, chat_history, token_count = run_society(
+        society,
+        5,
+        on_round=print_round_event,
+        convergence_checker=AnswerStabilityChecker() if early_stop_enabled() else None,
+    )
 
     # 输出结果
     print(f"\033[94m指令: {instruction}\033[0m")
@@ -259,13 +267,15 @@ def main():
     """主函数，用于运行截图指令处理系统。"""
     
     instruction = sys.argv[1]
+    # api_server为每个任务分配独立目录，单独运行脚本时使用默认目录
+    job_dir = os.getenv("OWL_JOB_DIR") or str(base_dir)
     print("this is run_product.py")
     
     # 处理指令并获取结构化结果
     result = process_instruction(instruction)
     
     # 将结果写入统一的结果文件
-    result_file_path = os.path.join(base_dir, "owl_result.json")
+    result_file_path = os.path.join(job_dir, "owl_result.json")
     with open(result_file_path, 'w', encoding='utf-8') as f:
         json.dump(result, f, ensure_ascii=False)
     
@@ -12,12 +12,10 @@ import os
 import json
 import io
 from dotenv import load_dotenv
-from camel.models import ModelFactory
 from camel.toolkits import (
     CodeExecutionToolkit,
     ExcelToolkit,
     ImageAnalysisToolkit,
-    SearchToolkit,
     VideoAnalysisToolkit,
     BrowserToolkit,
     FileWriteToolkit,
@@ -26,7 +24,7 @@ from camel.toolkits import (
 )
 from camel.types import ModelPlatformType, ModelType
 from camel.societies import RolePlaying
-from owl.utils import run_society, DocumentProcessingToolkit
+from owl.utils import run_society, print_round_event, AnswerPatternChecker, early_stop_enabled, DocumentProcessingToolkit, enable_parallel_tool_calls, MultiSearchToolkit, shared_model, shared_tools
 from camel.logger import set_log_level
 import pathlib
 import logging
@@ -58,39 +56,39 @@ def construct_society(question: str) -> RolePlaying:
         RolePlaying: 一个配置好的智能体社会，准备处理问题。
     """
 
-    # 为不同组件创建模型
+    # 为不同组件获取模型，相同配置的模型和工具包在进程内只创建一次，之后的社会直接复用
     models = {
-        "user": ModelFactory.create(
+        "user": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_MAX,
             model_config_dict={"temperature": 0},
         ),
-        "assistant": ModelFactory.create(
+        "assistant": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_MAX,
             model_config_dict={"temperature": 0},
         ),
-        "browsing": ModelFactory.create(
+        "browsing": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_VL_MAX,
             model_config_dict={"temperature": 0},
         ),
-        "planning": ModelFactory.create(
+        "planning": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_MAX,
             model_config_dict={"temperature": 0},
         ),
-        "video": ModelFactory.create(
+        "video": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_VL_MAX,
             model_config_dict={"temperature": 0},
         ),
-        "image": ModelFactory.create(
+        "image": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_VL_MAX,
             model_config_dict={"temperature": 0},
         ),
-        "document": ModelFactory.create(
+        "document": shared_model(
             model_platform=ModelPlatformType.QWEN,
             model_type=ModelType.QWEN_VL_MAX,
             model_config_dict={"temperature": 0},
@@ -99,24 +97,24 @@ def construct_society(question: str) -> RolePlaying:
 
     # 配置工具包
     tools = [
-        *BrowserToolkit(
+        *shared_tools(
+            BrowserToolkit,
             headless=False,
             web_agent_model=models["browsing"],
             planning_agent_model=models["planning"],
             output_language="Chinese",
-        ).get_tools(),
+        ),
 
+        # 视频工具包内部的对话智能体不会重置，每个任务单独创建，避免不同任务的视频和问题互相串扰
         *VideoAnalysisToolkit(model=models["video"]).get_tools(),
-        *CodeExecutionToolkit(sandbox="subprocess", verbose=True).get_tools(),
-        *ImageAnalysisToolkit(model=models["image"]).get_tools(),
-        SearchToolkit().search_duckduckgo,
-        SearchToolkit().search_google,
-        SearchToolkit().search_wiki,
-        SearchToolkit().search_baidu,
-        *ExcelToolkit().get_tools(),
-        *DocumentProcessingToolkit(model=models["document"]).get_tools(),
-        *FileWriteToolkit(output_dir="./").get_tools(),
-        *ArxivToolkit().get_tools(),
+        *shared_tools(CodeExecutionToolkit, sandbox="subprocess", verbose=True),
+        *shared_tools(ImageAnalysisToolkit, model=models["image"]),
+        # 一次调用并发查询多个搜索引擎，结果按URL去重合并
+        *shared_tools(MultiSearchToolkit),
+        *shared_tools(ExcelToolkit),
+        *shared_tools(DocumentProcessingToolkit, model=models["document"]),
+        *shared_tools(FileWriteToolkit, output_dir="./"),
+        *shared_tools(ArxivToolkit),
         # *GoogleScholarToolkit().get_tools(),
     ]
 
@@ -140,6 +138,9 @@ def construct_society(question: str) -> RolePlaying:
         output_language="Chinese",
     )
 
+    # 同一轮回复中的多个搜索、文档提取调用并行执行，浏览器等其他工具仍按顺序执行
+    enable_parallel_tool_calls(society.assistant_agent)
+
     return society
 
 
@@ -154,7 +155,7 @@ def process_instruction(instruction: str):
         dict: 包含处理结果和聊天历史的字典。
     """
     url = None
-    url_file_path = os.path.join(base_dir, "current_url.json")
+    url_file_path = os.path.join(os.getenv("OWL_JOB_DIR") or base_dir, "current_url.json")
     
     try:
         if os.path.exists(url_file_path):
@@ -181,7 +182,13 @@ def process_instruction(instruction: str):
         print(f"\033[94m未找到URL，使用原始指令\033[0m")
     
     society = construct_society(enhanced_instruction)
-    answer, chat_history, token_count = run_society(society, 3)
+    # 每轮结束后输出事件，api_server实时转发给订阅者；设置OWL_EARLY_STOP=1时，回答已总结创新点和局限性则提前结束
+    answer, chat_history, token_count = run_society(
+        society,
+        3,
+        on_round=print_round_event,
+        convergence_checker=AnswerPatternChecker([r"创新点", r"局限"]) if early_stop_enabled() else None,
+    )
     
     # 提取图像和表格信息
     extracted_images = []
@@ -211,12 +218,14 @@ def main():
     """主函数，用于运行截图指令处理系统。"""
     
     instruction = sys.argv[1]
+    # api_server为每个任务分配独立目录，单独运行脚本时使用默认目录
+    job_dir = os.getenv("OWL_JOB_DIR") or str(base_dir)
     print("this is run_scholar.py")
     
     result = process_instruction(instruction)
     
     # 创建一个更丰富的结果文件
-    result_file = os.path.join(base_dir, "owl_result.json")
+    result_file = os.path.join(job_dir, "owl_result.json")
     with open(result_file, 'w', encoding='utf-8') as f:
         json.dump(result, f, ensure_ascii=False)
     
@@ -0,0 +1,91 @@
+"""
+    * @FileDescription: 压测用的桩场景脚本，不调用模型和工具，按配置的耗时输出事件和结果文件
+    * @Author: 胡皓文
+    * @Date: 2025-04-12
+    * @LastEditors: 胡皓文
+    * @LastEditTime: 2025-04-12
+    * @Contributors: 胡皓文
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import pathlib
+
+base_dir = pathlib.Path(__file__).parent.parent
+
+# 与jobs.py中的EVENT_PREFIX一致，api_server据此转发事件
+EVENT_PREFIX = "OWL_EVENT:"
+
+# 每个任务的总耗时（秒），实际耗时在其0.5到1.5倍之间随机
+STUB_SECONDS = float(os.getenv("OWL_STUB_SECONDS", "2"))
+# 每个任务的轮数，每轮结束时输出一个round事件
+STUB_ROUNDS = int(os.getenv("OWL_STUB_ROUNDS", "3"))
+# 回答的字符数
+STUB_ANSWER_CHARS = int(os.getenv("OWL_STUB_ANSWER_CHARS", "2000"))
+# 任务失败的概率，用于检验错误路径
+STUB_ERROR_RATE = float(os.getenv("OWL_STUB_ERROR_RATE", "0"))
+
+
+def process_instruction(instruction: str):
+    """
+    模拟一次智能体社会的运行：分轮等待并输出事件，返回与真实场景脚本结构相同的结果。
+
+    参数:
+        instruction (str): 要处理的指令。
+
+    返回:
+        dict: 包含回答和聊天历史的字典。
+    """
+    rounds = max(STUB_ROUNDS, 1)
+    round_seconds = STUB_SECONDS * random.uniform(0.5, 1.5) / rounds
+    chat_history = []
+    for round_index in range(rounds):
+        time.sleep(round_seconds)
+        if random.random() < STUB_ERROR_RATE / rounds:
+            raise RuntimeError(f"桩脚本模拟的失败（第{round_index + 1}轮）")
+        assistant = f"第{round_index + 1}轮的解答：" + "桩" * (STUB_ANSWER_CHARS // rounds)
+        chat_history.append({
+            "user": f"Instruction: {instruction}",
+            "assistant": assistant,
+            "tool_calls": [],
+        })
+        event = {
+            "event": "round",
+            "data": {
+                "round": round_index,
+                "user": chat_history[-1]["user"],
+                "assistant": assistant,
+                "tool_calls": [],
+                "terminated": round_index == rounds - 1,
+            },
+        }
+        print(f"{EVENT_PREFIX}{json.dumps(event, ensure_ascii=False)}", flush=True)
+
+    return {
+        "instruction": instruction,
+        "answer": chat_history[-1]["assistant"],
+        "chat_history": chat_history,
+        "token_count": {"completion_token_count": 0, "prompt_token_count": 0},
+    }
+
+
+def main():
+    """主函数，供api_server以独立子进程方式运行"""
+    instruction = sys.argv[1]
+    job_dir = os.getenv("OWL_JOB_DIR") or str(base_dir)
+
+    result = process_instruction(instruction)
+
+    result_file_path = os.path.join(job_dir, "owl_result.json")
+    with open(result_file_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False)
+
+    # 通知api_server结果已写入文件
+    print(f"OWL_RESULT_FILE:{result_file_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+    * @FileDescription: 结果数据库（owl_results.db）的共享连接层：WAL模式、按线程复用连接
+    * @Author: 胡皓文
+    * @Date: 2025-04-10
+    * @LastEditors: 胡皓文
+    * @LastEditTime: 2025-04-10
+    * @Contributors: 胡皓文
+"""
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+# 数据库文件路径，压测等场景可通过OWL_DB_FILE指定独立的数据库
+DB_FILE = os.getenv("OWL_DB_FILE") or str(Path(__file__).parent / "owl_results.db")
+
+# 页缓存大小（KB），每个连接独立计算
+DB_CACHE_SIZE_KB = int(os.getenv("OWL_DB_CACHE_SIZE_KB", "8192"))
+# WAL模式下NORMAL只在检查点时同步磁盘，断电最多丢失最近的提交，不会损坏数据库
+DB_SYNCHRONOUS = os.getenv("OWL_DB_SYNCHRONOUS", "NORMAL").upper()
+# 遇到写锁时最多等待多久（毫秒）
+DB_BUSY_TIMEOUT_MS = 5000
+# 每个连接缓存的预编译语句数量，SQL文本相同的查询直接复用
+DB_CACHED_STATEMENTS = 256
+
+
+class ConnectionPool:
+    """
+    按线程复用的SQLite连接池。
+
+    sqlite3的连接不能跨线程使用，这里为每个线程保留一个连接，
+    线程池中的处理线程在整个生命周期内复用同一个连接及其预编译语句缓存。
+    数据库使用WAL日志模式，读操作不会被正在进行的写事务阻塞。
+
+    参数:
+        db_file (str): 数据库文件路径。
+    """
+
+    def __init__(self, db_file):
+        self.db_file = str(db_file)
+        self._local = threading.local()
+        self._wal_lock = threading.Lock()
+        self._wal_enabled = False
+
+    def connection(self):
+        """返回当前线程的连接，首次调用时创建"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            cached_statements=DB_CACHED_STATEMENTS,
+        )
+        conn.row_factory = sqlite3.Row
+        # 日志模式保存在数据库文件中，只需设置一次
+        with self._wal_lock:
+            if not self._wal_enabled:
+                conn.execute("PRAGMA journal_mode=WAL")
+                self._wal_enabled = True
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# 两个服务器共用的连接池
+pool = ConnectionPool(DB_FILE)
+
+
+def get_connection():
+    """返回当前线程复用的结果数据库连接（行以sqlite3.Row返回）"""
+    return pool.connection()
+
+
+def db_size_bytes():
+    """数据库占用的磁盘空间，包含尚未合并到主文件的WAL日志"""
+    size = os.path.getsize(DB_FILE)
+    wal_file = DB_FILE + "-wal"
+    if os.path.exists(wal_file):
+        size += os.path.getsize(wal_file)
+    return size
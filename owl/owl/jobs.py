@@ -0,0 +1,187 @@
+"""
+    * @FileDescription: 任务表，为每条指令分配独立的任务ID、状态和工作目录
+    * @Author: 胡皓文
+    * @Date: 2025-04-08
+    * @LastEditors: 胡皓文
+    * @LastEditTime: 2025-04-08
+    * @Contributors: 胡皓文
+"""
+
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_ERROR = "error"
+FINISHED_STATES = (JOB_COMPLETED, JOB_ERROR)
+
+# 任务列表中返回的字段（不包含完整结果）
+SUMMARY_FIELDS = ("job_id", "status", "scene", "instruction", "created_at", "started_at", "finished_at")
+
+# 场景脚本在标准输出中以该前缀输出一行JSON事件，由api_server转发给订阅者
+EVENT_PREFIX = "OWL_EVENT:"
+
+
+class JobTable:
+    """
+    线程安全的任务表。
+
+    每个任务拥有独立的目录，用于存放该任务的指令、URL和结果文件，
+    多个任务并行运行时不会互相覆盖。任务的状态变化和运行过程中的
+    事件按顺序记录在events中，订阅者通过wait_events等待新事件。
+
+    参数:
+        jobs_dir (str): 存放各任务目录的根目录。
+        max_finished (int): 最多保留多少个已结束的任务，超出后淘汰最早的任务。
+    """
+
+    def __init__(self, jobs_dir, max_finished=200):
+        self.jobs_dir = str(jobs_dir)
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        # 有新事件时唤醒等待中的订阅者
+        self._cond = threading.Condition(self._lock)
+        self._latest_id = None
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    def job_dir(self, job_id):
+        """返回任务的工作目录"""
+        return os.path.join(self.jobs_dir, job_id)
+
+    def create(self, instruction, scene):
+        """
+        创建一个新任务并为其建立工作目录。
+
+        参数:
+            instruction (str): 要处理的指令。
+            scene (str): 场景名称。
+
+        返回:
+            dict: 新任务的快照。
+        """
+        job_id = uuid.uuid4().hex[:16]
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        job = {
+            "job_id": job_id,
+            "status": JOB_QUEUED,
+            "instruction": instruction,
+            "scene": scene,
+            "result": None,
+            "structured_result": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "events": [],
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._append_event(job, JOB_QUEUED)
+            self._latest_id = job_id
+            self._evict()
+            return dict(job)
+
+    def update(self, job_id, **fields):
+        """更新任务字段，状态变为运行中或结束时自动记录时间"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = fields.get("status")
+            status_changed = status is not None and status != job["status"]
+            if status == JOB_RUNNING and job["started_at"] is None:
+                job["started_at"] = time.time()
+            if status in FINISHED_STATES:
+                job["finished_at"] = time.time()
+            job.update(fields)
+            if status_changed:
+                data = {"result": job["result"]} if status in FINISHED_STATES else None
+                self._append_event(job, status, data)
+            return dict(job)
+
+    def publish(self, job_id, event, data=None):
+        """
+        记录任务运行过程中的事件（如一轮对话结束、工具调用）。
+
+        参数:
+            job_id (str): 任务ID。
+            event (str): 事件类型。
+            data (dict, optional): 事件内容。
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._append_event(job, event, data)
+
+    def wait_events(self, job_id, after_id=0, timeout=15.0):
+        """
+        获取编号大于after_id的事件，没有新事件时最多等待timeout秒。
+
+        返回:
+            tuple: (事件列表, 任务是否已结束)，任务不存在时事件列表为None。
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return None, True
+                events = job["events"][after_id:]
+                finished = job["status"] in FINISHED_STATES
+                if events or finished:
+                    return events, finished
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], False
+                self._cond.wait(remaining)
+
+    def get(self, job_id):
+        """获取任务快照，不存在时返回None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def latest(self):
+        """获取最近提交的任务（兼容不带任务ID的旧接口）"""
+        with self._lock:
+            job = self._jobs.get(self._latest_id) if self._latest_id else None
+            return dict(job) if job else None
+
+    def clear_latest(self):
+        """清除最近任务的指针，旧接口将重新返回等待状态"""
+        with self._lock:
+            self._latest_id = None
+
+    def list(self):
+        """按提交时间倒序返回所有任务的摘要"""
+        with self._lock:
+            return [
+                {field: job[field] for field in SUMMARY_FIELDS}
+                for job in reversed(self._jobs.values())
+            ]
+
+    def count_active(self):
+        """统计排队中和运行中的任务数量"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["status"] not in FINISHED_STATES)
+
+    def _append_event(self, job, event, data=None):
+        # 调用方需持有锁；事件编号从1开始，与其在列表中的位置对应
+        job["events"].append({
+            "id": len(job["events"]) + 1,
+            "event": event,
+            "data": data or {},
+            "time": time.time(),
+        })
+        self._cond.notify_all()
+
+    def _evict(self):
+        # 调用方需持有锁；只淘汰已结束的任务
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
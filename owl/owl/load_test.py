@@ -0,0 +1,493 @@
+"""
+    * @FileDescription: api_server与结果查看器的端到端压测：模拟多个浏览器扩展客户端提交指令、轮询结果、
+    *                   翻阅历史记录并订阅WebSocket，输出吞吐量、延迟分位数、错误率和服务器内存曲线
+    * @Author: 胡皓文
+    * @Date: 2025-04-12
+    * @LastEditors: 胡皓文
+    * @LastEditTime: 2025-04-12
+    * @Contributors: 胡皓文
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import pathlib
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from collections import defaultdict
+
+import websockets
+
+# owl/owl目录，api_server.py所在位置
+server_dir = pathlib.Path(__file__).parent
+
+API_PORT = 7861
+WS_PORT = 7866
+
+# 报告中各延迟统计使用的分位数
+QUANTILES = {"p50": 0.50, "p95": 0.95, "p99": 0.99}
+
+
+def quantile(sorted_values, q):
+    """返回已排序数据的q分位数（最近秩法）"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize_latencies(values_ms):
+    """把一组延迟（毫秒）汇总为均值、最大值和各分位数"""
+    values = sorted(values_ms)
+    summary = {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 3) if values else None,
+        "max_ms": round(values[-1], 3) if values else None,
+    }
+    for name, q in QUANTILES.items():
+        value = quantile(values, q)
+        summary[f"{name}_ms"] = round(value, 3) if value is not None else None
+    return summary
+
+
+class Recorder:
+    """线程安全地记录各接口的请求延迟和错误"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = defaultdict(list)
+        self.jobs = defaultdict(int)
+        self.job_turnaround = []
+        self._lock = threading.Lock()
+
+    def request(self, endpoint, seconds, error=None):
+        with self._lock:
+            self.latencies[endpoint].append(seconds * 1000)
+            if error is not None:
+                self.errors[endpoint] += 1
+                # 每个接口只保留少量错误样本，避免报告过大
+                if len(self.error_samples[endpoint]) < 5:
+                    self.error_samples[endpoint].append(error)
+
+    def job(self, outcome, turnaround=None):
+        with self._lock:
+            self.jobs[outcome] += 1
+            if turnaround is not None:
+                self.job_turnaround.append(turnaround * 1000)
+
+
+class ExtensionClient(threading.Thread):
+    """
+    模拟一个浏览器扩展客户端：提交指令、轮询任务结果直到结束、查看历史记录，然后思考一段时间再继续。
+
+    参数:
+        client_id (int): 客户端编号。
+        args: 命令行参数。
+        recorder (Recorder): 延迟和错误的记录器。
+        deadline (float): 压测结束的时间点（time.monotonic）。
+    """
+
+    def __init__(self, client_id, args, recorder, deadline):
+        super().__init__(name=f"client-{client_id}", daemon=True)
+        self.client_id = client_id
+        self.args = args
+        self.recorder = recorder
+        self.deadline = deadline
+        self.conn = None
+
+    def _request(self, endpoint, method, path, body=None):
+        """发送一个请求并记录耗时，返回解析后的JSON；出错时返回None"""
+        start = time.perf_counter()
+        error = None
+        data = None
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.args.host, self.args.api_port, timeout=self.args.request_timeout)
+            payload = json.dumps(body).encode("utf-8") if body is not None else None
+            headers = {"Content-Type": "application/json"} if payload is not None else {}
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            raw = response.read()
+            if response.status >= 400:
+                error = f"HTTP {response.status}"
+            else:
+                data = json.loads(raw.decode("utf-8"))
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            # 连接出错后丢弃，下次请求重新建立
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+        self.recorder.request(endpoint, time.perf_counter() - start, error)
+        return data
+
+    def _think(self):
+        if self.args.think_time > 0:
+            time.sleep(random.uniform(0.5, 1.5) * self.args.think_time)
+
+    def run_job(self):
+        """提交一条指令并轮询到任务结束"""
+        submitted = time.perf_counter()
+        response = self._request("POST /api/process_instruction", "POST", "/api/process_instruction", {
+            "instruction": f"压测指令 {self.client_id}-{int(submitted * 1000)}",
+            "scene": self.args.scene,
+            "url": "https://example.com/load-test",
+        })
+        job_id = (response or {}).get("job_id")
+        if not job_id:
+            self.recorder.job("submit_failed")
+            return
+
+        job_deadline = time.monotonic() + self.args.job_timeout
+        while time.monotonic() < job_deadline:
+            time.sleep(self.args.poll_interval)
+            result = self._request("GET /api/get_result/*", "GET", f"/api/get_result/{job_id}")
+            status = (result or {}).get("status")
+            # get_result对完成的任务返回success，对失败的任务返回error，其余为waiting
+            if status in ("success", "error"):
+                turnaround = time.perf_counter() - submitted
+                self.recorder.job("completed" if status == "success" else "failed", turnaround)
+                return
+        self.recorder.job("timed_out")
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            self.run_job()
+            if time.monotonic() >= self.deadline:
+                break
+            page = random.randint(1, self.args.history_pages)
+            self._request("GET /api/history", "GET", f"/api/history?limit=20&page={page}")
+            self._think()
+        if self.conn is not None:
+            self.conn.close()
+
+
+async def _ws_client(index, args, recorder, stats, deadline):
+    """单个WebSocket订阅者：连接后持续接收结果推送，断开时重连"""
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            async with websockets.connect(f"ws://{args.host}:{args.ws_port}", open_timeout=args.request_timeout) as ws:
+                recorder.request("WS connect", time.perf_counter() - start)
+                while time.monotonic() < deadline:
+                    try:
+                        await asyncio.wait_for(ws.recv(), timeout=max(0.1, deadline - time.monotonic()))
+                        stats["messages"] += 1
+                    except asyncio.TimeoutError:
+                        break
+        except Exception as e:
+            recorder.request("WS connect", time.perf_counter() - start, f"{type(e).__name__}: {str(e)}")
+            stats["disconnects"] += 1
+            await asyncio.sleep(1)
+
+
+def run_ws_clients(args, recorder, stats, deadline):
+    """在独立线程的事件循环中运行全部WebSocket订阅者"""
+    async def main():
+        await asyncio.gather(*[_ws_client(i, args, recorder, stats, deadline) for i in range(args.ws_clients)])
+    asyncio.run(main())
+
+
+def process_rss_mb(pid):
+    """返回进程及其子进程（工作进程）的RSS（MB），无法读取时返回None"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+            main_rss = process.memory_info().rss
+            total_rss = 0
+            for p in processes:
+                try:
+                    total_rss += p.memory_info().rss
+                except psutil.Error:
+                    pass
+            return round(main_rss / 1048576, 1), round(total_rss / 1048576, 1)
+        except psutil.Error:
+            return None
+    # 没有psutil时在Linux上读取/proc，只统计主进程
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = round(int(line.split()[1]) / 1024, 1)
+                    return rss, None
+    except OSError:
+        return None
+    return None
+
+
+def sample_rss(pid, interval, samples, stop_event, start):
+    """定时采样服务器的内存占用，直到stop_event被设置"""
+    while not stop_event.is_set():
+        rss = process_rss_mb(pid)
+        if rss is not None:
+            samples.append({"t": round(time.monotonic() - start, 1), "rss_mb": rss[0], "total_rss_mb": rss[1]})
+        stop_event.wait(interval)
+
+
+def fetch_json(args, path):
+    """请求一次服务器接口，失败时返回None"""
+    try:
+        conn = http.client.HTTPConnection(args.host, args.api_port, timeout=args.request_timeout)
+        conn.request("GET", path)
+        response = conn.getresponse()
+        data = json.loads(response.read().decode("utf-8"))
+        conn.close()
+        return data
+    except Exception:
+        return None
+
+
+def start_server(args, data_dir):
+    """
+    以桩场景脚本启动api_server，数据库、任务目录均放在data_dir中，不影响正式数据。
+
+    返回:
+        subprocess.Popen: 服务器进程。
+    """
+    env = os.environ.copy()
+    env.update({
+        "PYTHONIOENCODING": "utf-8",
+        "OWL_SCENE_SCRIPT": "run_stub.py",
+        "OWL_DB_FILE": os.path.join(data_dir, "owl_results.db"),
+        "OWL_JOBS_DIR": os.path.join(data_dir, "jobs"),
+        "OWL_HISTORY_LOG": "0",
+        "OWL_STUB_SECONDS": str(args.stub_seconds),
+        "OWL_STUB_ROUNDS": str(args.stub_rounds),
+        "OWL_STUB_ERROR_RATE": str(args.stub_error_rate),
+    })
+    if args.worker_pool_size is not None:
+        env["OWL_WORKER_POOL_SIZE"] = str(args.worker_pool_size)
+    if args.max_concurrent_jobs is not None:
+        env["OWL_MAX_CONCURRENT_JOBS"] = str(args.max_concurrent_jobs)
+    log_file = open(os.path.join(data_dir, "api_server.log"), "w", encoding="utf-8")
+    process = subprocess.Popen(
+        [sys.executable, "api_server.py"],
+        cwd=str(server_dir),
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+        env=env,
+    )
+    # 等待API服务器和工作进程就绪
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"api_server启动失败，返回码 {process.returncode}，日志见 {log_file.name}")
+        if fetch_json(args, "/api/jobs") is not None:
+            return process
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"api_server在 {args.startup_timeout} 秒内未就绪，日志见 {log_file.name}")
+
+
+def build_report(args, recorder, ws_stats, rss_samples, elapsed, server_metrics):
+    """汇总压测结果，生成可在不同版本间对比的报告"""
+    endpoints = {}
+    total_requests = 0
+    total_errors = 0
+    for endpoint in sorted(recorder.latencies):
+        latencies = recorder.latencies[endpoint]
+        errors = recorder.errors.get(endpoint, 0)
+        total_requests += len(latencies)
+        total_errors += errors
+        endpoints[endpoint] = {
+            **summarize_latencies(latencies),
+            "throughput_rps": round(len(latencies) / elapsed, 3),
+            "errors": errors,
+            "error_rate": round(errors / len(latencies), 4) if latencies else 0,
+            "error_samples": recorder.error_samples.get(endpoint, []),
+        }
+
+    finished_jobs = recorder.jobs.get("completed", 0) + recorder.jobs.get("failed", 0)
+    all_jobs = sum(recorder.jobs.values())
+    rss_values = [sample["rss_mb"] for sample in rss_samples]
+    total_rss_values = [sample["total_rss_mb"] for sample in rss_samples if sample["total_rss_mb"] is not None]
+    return {
+        "config": {
+            "clients": args.clients,
+            "ws_clients": args.ws_clients,
+            "duration_s": args.duration,
+            "think_time_s": args.think_time,
+            "poll_interval_s": args.poll_interval,
+            "scene": args.scene,
+            "stub_seconds": args.stub_seconds,
+            "stub_rounds": args.stub_rounds,
+            "stub_error_rate": args.stub_error_rate,
+            "worker_pool_size": args.worker_pool_size,
+            "max_concurrent_jobs": args.max_concurrent_jobs,
+        },
+        "version": git_revision(),
+        "elapsed_s": round(elapsed, 3),
+        "requests": {
+            "total": total_requests,
+            "errors": total_errors,
+            "error_rate": round(total_errors / total_requests, 4) if total_requests else 0,
+            "throughput_rps": round(total_requests / elapsed, 3),
+        },
+        "endpoints": endpoints,
+        "jobs": {
+            "submitted": all_jobs,
+            **{outcome: recorder.jobs.get(outcome, 0) for outcome in ("completed", "failed", "timed_out", "submit_failed")},
+            "throughput_per_min": round(finished_jobs / elapsed * 60, 3),
+            "error_rate": round((all_jobs - recorder.jobs.get("completed", 0)) / all_jobs, 4) if all_jobs else 0,
+            "turnaround": summarize_latencies(recorder.job_turnaround),
+        },
+        "websocket": {
+            "clients": args.ws_clients,
+            "messages": ws_stats["messages"],
+            "messages_per_s": round(ws_stats["messages"] / elapsed, 3),
+            "disconnects": ws_stats["disconnects"],
+        },
+        "server_rss": {
+            "start_mb": rss_values[0] if rss_values else None,
+            "end_mb": rss_values[-1] if rss_values else None,
+            "peak_mb": max(rss_values) if rss_values else None,
+            "peak_total_mb": max(total_rss_values) if total_rss_values else None,
+            "samples": rss_samples,
+        },
+        "server_latency": (server_metrics or {}).get("routes"),
+    }
+
+
+def git_revision():
+    """当前代码的git版本，便于对比不同版本的报告"""
+    try:
+        return subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"], cwd=str(server_dir), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def print_report(report, baseline=None):
+    """在终端打印报告摘要，提供baseline时同时列出与其相比的变化"""
+    def delta(new, old):
+        if baseline is None or new is None or old is None:
+            return ""
+        if old == 0:
+            return f" ({new - old:+g})"
+        return f" ({(new - old) / old * 100:+.1f}%)"
+
+    base_endpoints = (baseline or {}).get("endpoints", {})
+    print(f"\n版本 {report['version']}，运行 {report['elapsed_s']} 秒，"
+          f"{report['config']['clients']} 个客户端，{report['config']['ws_clients']} 个WebSocket订阅者")
+    print(f"{'接口':<32}{'请求数':>8}{'rps':>10}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'错误率':>10}")
+    for endpoint, stats in report["endpoints"].items():
+        old = base_endpoints.get(endpoint, {})
+        print(f"{endpoint:<32}{stats['count']:>8}{stats['throughput_rps']:>10}"
+              f"{stats['p50_ms']:>12}{stats['p95_ms']:>12}{stats['p99_ms']:>12}{stats['error_rate']:>10}"
+              f"{delta(stats['p95_ms'], old.get('p95_ms'))}")
+    jobs = report["jobs"]
+    base_jobs = (baseline or {}).get("jobs", {})
+    print(f"\n任务: 提交 {jobs['submitted']}，完成 {jobs['completed']}，失败 {jobs['failed']}，超时 {jobs['timed_out']}，"
+          f"每分钟完成 {jobs['throughput_per_min']}{delta(jobs['throughput_per_min'], base_jobs.get('throughput_per_min'))}，"
+          f"周转时间p95 {jobs['turnaround']['p95_ms']} ms")
+    print(f"WebSocket: 收到 {report['websocket']['messages']} 条推送，断开 {report['websocket']['disconnects']} 次")
+    rss = report["server_rss"]
+    base_rss = (baseline or {}).get("server_rss", {})
+    print(f"服务器RSS: 开始 {rss['start_mb']} MB，结束 {rss['end_mb']} MB，"
+          f"峰值 {rss['peak_mb']} MB{delta(rss['peak_mb'], base_rss.get('peak_mb'))}，"
+          f"含工作进程峰值 {rss['peak_total_mb']} MB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="api_server与结果查看器的端到端压测")
+    parser.add_argument("--clients", type=int, default=10, help="并发的扩展客户端数量")
+    parser.add_argument("--ws-clients", type=int, default=10, help="WebSocket订阅者数量")
+    parser.add_argument("--duration", type=float, default=60, help="压测时长（秒）")
+    parser.add_argument("--think-time", type=float, default=1.0, help="客户端两次任务之间的平均思考时间（秒）")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="轮询任务结果的间隔（秒）")
+    parser.add_argument("--job-timeout", type=float, default=300, help="单个任务最长等待时间（秒）")
+    parser.add_argument("--request-timeout", type=float, default=30, help="单个请求的超时（秒）")
+    parser.add_argument("--history-pages", type=int, default=5, help="随机翻阅历史记录的页数范围")
+    parser.add_argument("--scene", default="默认场景", help="提交指令时携带的场景")
+    parser.add_argument("--stub-seconds", type=float, default=2, help="桩脚本每个任务的平均耗时（秒）")
+    parser.add_argument("--stub-rounds", type=int, default=3, help="桩脚本每个任务的轮数")
+    parser.add_argument("--stub-error-rate", type=float, default=0, help="桩脚本任务失败的概率")
+    parser.add_argument("--worker-pool-size", type=int, default=None, help="覆盖OWL_WORKER_POOL_SIZE")
+    parser.add_argument("--max-concurrent-jobs", type=int, default=None, help="覆盖OWL_MAX_CONCURRENT_JOBS")
+    parser.add_argument("--rss-interval", type=float, default=1.0, help="采样服务器内存的间隔（秒）")
+    parser.add_argument("--startup-timeout", type=float, default=120, help="等待服务器就绪的最长时间（秒）")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--api-port", type=int, default=API_PORT)
+    parser.add_argument("--ws-port", type=int, default=WS_PORT)
+    parser.add_argument("--no-start", action="store_true", help="不启动服务器，压测已在运行的服务器（需配合--server-pid采样内存）")
+    parser.add_argument("--server-pid", type=int, default=None, help="已在运行的服务器进程ID")
+    parser.add_argument("--report", default="load_test_report.json", help="JSON报告的输出路径")
+    parser.add_argument("--baseline", default=None, help="作为对比基准的旧报告")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """运行压测并写出报告"""
+    args = parse_args(argv)
+    server = None
+    data_dir = tempfile.mkdtemp(prefix="owl-load-test-")
+    if not args.no_start:
+        print(f"启动api_server（桩场景脚本），数据目录: {data_dir}")
+        server = start_server(args, data_dir)
+    server_pid = server.pid if server is not None else args.server_pid
+
+    recorder = Recorder()
+    ws_stats = {"messages": 0, "disconnects": 0}
+    rss_samples = []
+    stop_sampling = threading.Event()
+    start = time.monotonic()
+    deadline = start + args.duration
+    try:
+        if server_pid is not None:
+            threading.Thread(
+                target=sample_rss, args=(server_pid, args.rss_interval, rss_samples, stop_sampling, start), daemon=True
+            ).start()
+        ws_thread = None
+        if args.ws_clients > 0:
+            ws_thread = threading.Thread(target=run_ws_clients, args=(args, recorder, ws_stats, deadline), daemon=True)
+            ws_thread.start()
+
+        print(f"开始压测: {args.clients} 个客户端，{args.ws_clients} 个WebSocket订阅者，持续 {args.duration} 秒")
+        clients = [ExtensionClient(i, args, recorder, deadline) for i in range(args.clients)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            # 进行中的任务允许在结束时间后完成
+            client.join(args.duration + args.job_timeout)
+        if ws_thread is not None:
+            ws_thread.join(args.request_timeout)
+        elapsed = time.monotonic() - start
+
+        server_metrics = fetch_json(args, "/api/metrics/latency")
+    finally:
+        stop_sampling.set()
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    report = build_report(args, recorder, ws_stats, rss_samples, elapsed, server_metrics)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"\n报告已写入 {args.report}")
+    return 0 if report["requests"]["error_rate"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,18 +16,54 @@ from .common import extract_pattern
 from .enhanced_role_playing import (
     OwlRolePlaying,
     OwlGAIARolePlaying,
+    ContextCompactor,
     run_society,
     arun_society,
+    iter_society,
+    aiter_society,
+    print_round_event,
+    ConvergenceChecker,
+    AnswerStabilityChecker,
+    AnswerPatternChecker,
+    ModelJudgeChecker,
+    early_stop_enabled,
 )
+from .run_metrics import RunMetrics
+from .cassette import CassetteRecorder, CassettePlayer
+from .parallel_tools import ToolCallExecutor, enable_parallel_tool_calls
+from .multi_search import MultiSearchToolkit
 from .gaia import GAIABenchmark
 from .document_toolkit import DocumentProcessingToolkit
+from .document_cache import DocumentCache
+from .local_extractor import LocalExtractor
+from .registry import ComponentRegistry, shared_model, shared_tools
 
 __all__ = [
     "extract_pattern",
     "OwlRolePlaying",
     "OwlGAIARolePlaying",
+    "ContextCompactor",
     "run_society",
     "arun_society",
+    "iter_society",
+    "aiter_society",
+    "print_round_event",
+    "ConvergenceChecker",
+    "AnswerStabilityChecker",
+    "AnswerPatternChecker",
+    "ModelJudgeChecker",
+    "early_stop_enabled",
+    "RunMetrics",
+    "CassetteRecorder",
+    "CassettePlayer",
+    "ToolCallExecutor",
+    "enable_parallel_tool_calls",
+    "MultiSearchToolkit",
     "GAIABenchmark",
     "DocumentProcessingToolkit",
+    "DocumentCache",
+    "LocalExtractor",
+    "ComponentRegistry",
+    "shared_model",
+    "shared_tools",
 ]
@@ -0,0 +1,439 @@
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+
+import os
+import json
+import time
+import threading
+import importlib
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from openai.types.chat import ChatCompletion
+
+from camel.models import ModelFactory
+from camel.societies import RolePlaying
+from camel.toolkits.function_tool import FunctionTool
+from camel.types import ModelPlatformType, ModelType
+from camel.logger import get_logger
+
+logger = get_logger(__name__)
+
+CASSETTE_VERSION = 1
+
+# When set, every society run records a cassette into this directory
+RECORD_DIR_ENV = "OWL_RECORD_DIR"
+
+
+def _jsonable(value: Any) -> Any:
+    r"""The value itself if it survives a JSON round trip, else its string."""
+    try:
+        json.dumps(value)
+        return value
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class _CassetteTool(FunctionTool):
+    r"""A tool with the schema of another whose calls go to ``handler``,
+    which records or replays them. Unlike :class:`FunctionTool`, errors of
+    the handler are raised unchanged."""
+
+    def __init__(
+        self,
+        schema: Dict[str, Any],
+        handler: Callable[..., Any],
+        ahandler: Optional[Callable[..., Any]] = None,
+    ):
+        self.func = handler
+        self.openai_tool_schema = schema
+        self.synthesize_output = False
+        self.synthesize_output_model = None
+        self.synthesize_output_format = None
+        self.synthesize_schema_model = None
+        self._ahandler = ahandler
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self.func(**kwargs)
+
+    async def async_call(self, *args: Any, **kwargs: Any) -> Any:
+        if self._ahandler is not None:
+            return await self._ahandler(**kwargs)
+        return self.func(**kwargs)
+
+    @property
+    def is_async(self) -> bool:
+        return self._ahandler is not None
+
+
+def _society_info(society: RolePlaying) -> Dict[str, Any]:
+    r"""What is needed to build the society again for a replay."""
+    info: Dict[str, Any] = {
+        "class": f"{type(society).__module__}.{type(society).__qualname__}",
+        # the prompt after task specification, which is not replayed
+        "task_prompt": society.task_prompt,
+        "task_type": getattr(society.task_type, "value", society.task_type),
+        "user_role_name": getattr(society.user_sys_msg, "role_name", "user"),
+        "assistant_role_name": getattr(
+            society.assistant_sys_msg, "role_name", "assistant"
+        ),
+        "output_language": society.assistant_agent.output_language,
+    }
+    compactor = getattr(society, "context_compactor", None)
+    if compactor is not None:
+        info["context_compactor"] = {
+            "token_budget": compactor.token_budget,
+            "keep_recent_rounds": compactor.keep_recent_rounds,
+            "max_tool_output_chars": compactor.max_tool_output_chars,
+            "summary_chars": compactor.summary_chars,
+        }
+    return info
+
+
+def load_cassette(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        cassette = json.load(f)
+    if cassette.get("version") != CASSETTE_VERSION:
+        raise ValueError(
+            f"Unsupported cassette version {cassette.get('version')} in {path}"
+        )
+    return cassette
+
+
+class CassetteRecorder:
+    r"""Records every model call and tool call of a society run into a
+    cassette, a JSON file that :class:`CassettePlayer` replays offline.
+
+    Like :class:`RunMetrics`, :meth:`attach` wraps the model backend of each
+    agent; the agents' tools are swapped for recording proxies with the same
+    schemas. Model responses are stored as ``ChatCompletion`` dicts, tool
+    results as returned (or as strings when they are not JSON serializable).
+    Streaming responses cannot be stored and mark the cassette incomplete.
+
+    Args:
+        society (RolePlaying): The society to record.
+        path (str): The cassette file to write.
+    """
+
+    def __init__(self, society: RolePlaying, path: str):
+        self.society = society
+        self.path = path
+        self.interactions: List[Dict[str, Any]] = []
+        self.rounds: List[Dict[str, Any]] = []
+        self.complete = True
+        self._agents = {"user": society.user_agent, "assistant": society.assistant_agent}
+        self._patched: List[tuple] = []
+        self._tools: List[tuple] = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @classmethod
+    def from_env(cls, society: RolePlaying) -> Optional["CassetteRecorder"]:
+        r"""A recorder writing into ``$OWL_RECORD_DIR``, or ``None`` when the
+        variable is not set."""
+        record_dir = os.getenv(RECORD_DIR_ENV)
+        if not record_dir:
+            return None
+        name = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}-{id(society):x}.json"
+        return cls(society, os.path.join(record_dir, name))
+
+    def attach(self) -> None:
+        for agent_name, agent in self._agents.items():
+            backend = agent.model_backend
+            self._patch(backend, "run", self._recorded_model(agent_name, backend.run))
+            self._patch(backend, "arun", self._arecorded_model(agent_name, backend.arun))
+            for tool_name, tool in list(agent.tool_dict.items()):
+                self._tools.append((agent, tool_name, tool))
+                agent.tool_dict[tool_name] = self._recorded_tool(agent_name, tool_name, tool)
+
+    def detach(self) -> None:
+        for obj, name, previous in reversed(self._patched):
+            if previous is None:
+                obj.__dict__.pop(name, None)
+            else:
+                obj.__dict__[name] = previous
+        self._patched.clear()
+        for agent, tool_name, tool in self._tools:
+            agent.tool_dict[tool_name] = tool
+        self._tools.clear()
+
+    def _patch(self, obj: Any, name: str, wrapper: Any) -> None:
+        self._patched.append((obj, name, obj.__dict__.get(name)))
+        setattr(obj, name, wrapper)
+
+    def _add(self, interaction: Dict[str, Any]) -> None:
+        with self._lock:
+            self.interactions.append(interaction)
+
+    def _model_interaction(self, agent_name: str, response: Any, seconds: float) -> None:
+        if not isinstance(response, ChatCompletion):
+            logger.warning(
+                f"Cannot record a streaming response of {agent_name}, "
+                f"{self.path} will not replay"
+            )
+            self.complete = False
+            return
+        self._add(
+            {
+                "kind": "model",
+                "agent": agent_name,
+                "seconds": round(seconds, 4),
+                "response": response.model_dump(mode="json"),
+            }
+        )
+
+    def _recorded_model(self, agent_name, run):
+        def recorded_run(*args, **kwargs):
+            start = time.perf_counter()
+            response = run(*args, **kwargs)
+            self._model_interaction(agent_name, response, time.perf_counter() - start)
+            return response
+
+        return recorded_run
+
+    def _arecorded_model(self, agent_name, arun):
+        async def recorded_arun(*args, **kwargs):
+            start = time.perf_counter()
+            response = await arun(*args, **kwargs)
+            self._model_interaction(agent_name, response, time.perf_counter() - start)
+            return response
+
+        return recorded_arun
+
+    def _tool_interaction(self, agent_name, tool_name, args, start, result=None, error=None):
+        interaction = {
+            "kind": "tool",
+            "agent": agent_name,
+            "tool_name": tool_name,
+            "args": _jsonable(args),
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+        if error is not None:
+            interaction["error"] = f"{error!s}"
+        else:
+            interaction["result"] = _jsonable(result)
+        self._add(interaction)
+
+    def _recorded_tool(self, agent_name: str, tool_name: str, tool: FunctionTool) -> FunctionTool:
+        def handler(**kwargs):
+            start = time.perf_counter()
+            try:
+                result = tool(**kwargs)
+            except Exception as e:
+                self._tool_interaction(agent_name, tool_name, kwargs, start, error=e)
+                raise
+            self._tool_interaction(agent_name, tool_name, kwargs, start, result=result)
+            return result
+
+        async def ahandler(**kwargs):
+            start = time.perf_counter()
+            try:
+                result = await tool.async_call(**kwargs)
+            except Exception as e:
+                self._tool_interaction(agent_name, tool_name, kwargs, start, error=e)
+                raise
+            self._tool_interaction(agent_name, tool_name, kwargs, start, result=result)
+            return result
+
+        return _CassetteTool(
+            tool.get_openai_tool_schema(), handler, ahandler if tool.is_async else None
+        )
+
+    def end_round(self, record: dict) -> None:
+        r"""Note a finished round, given its record from :func:`iter_society`."""
+        self.rounds.append(
+            {
+                "round": record["round"],
+                "assistant": record["assistant"],
+                "terminated": record["terminated"],
+                "seconds": round(time.perf_counter() - self._start, 4),
+            }
+        )
+
+    def save(self) -> Optional[str]:
+        r"""Write the cassette. Returns its path, or ``None`` if the run
+        recorded nothing."""
+        if not self.rounds:
+            return None
+        cassette = {
+            "version": CASSETTE_VERSION,
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "complete": self.complete,
+            "society": _society_info(self.society),
+            "tools": {
+                agent_name: {
+                    "parallel": hasattr(agent, "_call_tool"),
+                    "schemas": [
+                        tool.get_openai_tool_schema()
+                        for tool in agent.tool_dict.values()
+                    ],
+                }
+                for agent_name, agent in self._agents.items()
+            },
+            "rounds": self.rounds,
+            "interactions": self.interactions,
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cassette, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        logger.info(
+            f"Recorded {len(self.interactions)} calls of {len(self.rounds)} "
+            f"rounds to {self.path}"
+        )
+        return self.path
+
+
+class CassettePlayer:
+    r"""Replays a cassette: builds the recorded society on stub models and
+    stub tools that return the recorded responses, so that a run needs no
+    model, search or crawl service and takes the same path every time.
+
+    Model responses are replayed in order per agent. Tool results are
+    matched by tool name and arguments, in order, so that parallel tool
+    calls may complete in any order. Calls that find no recorded response
+    are counted in :attr:`divergences`.
+
+    Args:
+        cassette (Dict[str, Any]): A cassette, see :func:`load_cassette`.
+        token_counter (BaseTokenCounter, optional): Token counter of the stub
+            models, e.g. an ``OpenAITokenCounter`` to include the cost of
+            counting real tokens. (default: :obj:`None`)
+    """
+
+    def __init__(self, cassette: Dict[str, Any], token_counter: Any = None):
+        if not cassette.get("complete", True):
+            raise ValueError("The cassette has unrecorded (streaming) model calls")
+        self.cassette = cassette
+        self.token_counter = token_counter
+        self.divergences: List[str] = []
+        # seconds spent in the stubs, which are not framework overhead
+        self.stub_seconds = 0.0
+        self._responses: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._tool_results: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def round_limit(self) -> int:
+        return len(self.cassette["rounds"])
+
+    @property
+    def answer(self) -> str:
+        return self.cassette["rounds"][-1]["assistant"]
+
+    def build_society(self) -> RolePlaying:
+        r"""Build the recorded society with stub models and tools, ready for
+        :func:`run_society`."""
+        self._responses = {"user": deque(), "assistant": deque()}
+        self._tool_results = {}
+        self.divergences = []
+        self.stub_seconds = 0.0
+        for interaction in self.cassette["interactions"]:
+            if interaction["kind"] == "model":
+                self._responses[interaction["agent"]].append(interaction["response"])
+            else:
+                self._tool_results.setdefault(interaction["tool_name"], []).append(
+                    interaction
+                )
+
+        info = self.cassette["society"]
+        module_name, _, class_name = info["class"].rpartition(".")
+        society_class = getattr(importlib.import_module(module_name), class_name)
+        kwargs: Dict[str, Any] = {
+            "task_prompt": info["task_prompt"],
+            "with_task_specify": False,
+            "user_role_name": info["user_role_name"],
+            "assistant_role_name": info["assistant_role_name"],
+            "output_language": info["output_language"],
+            "user_agent_kwargs": self._agent_kwargs("user"),
+            "assistant_agent_kwargs": self._agent_kwargs("assistant"),
+        }
+        if info.get("task_type") is not None:
+            from camel.types import TaskType
+
+            kwargs["task_type"] = TaskType(info["task_type"])
+        if info.get("context_compactor") is not None:
+            from .enhanced_role_playing import ContextCompactor
+
+            kwargs["context_compactor"] = ContextCompactor(**info["context_compactor"])
+        society = society_class(**kwargs)
+
+        for agent_name, agent in (
+            ("user", society.user_agent),
+            ("assistant", society.assistant_agent),
+        ):
+            agent.model_backend.run = self._replayed_model(agent_name)
+            if self.cassette["tools"][agent_name]["parallel"]:
+                from .parallel_tools import enable_parallel_tool_calls
+
+                enable_parallel_tool_calls(agent)
+        return society
+
+    def _agent_kwargs(self, agent_name: str) -> Dict[str, Any]:
+        model = ModelFactory.create(
+            model_platform=ModelPlatformType.DEFAULT,
+            model_type=ModelType.STUB,
+            token_counter=self.token_counter,
+        )
+        tools = [
+            _CassetteTool(schema, self._replayed_tool(schema["function"]["name"]))
+            for schema in self.cassette["tools"][agent_name]["schemas"]
+        ]
+        return {"model": model, "tools": tools} if tools else {"model": model}
+
+    def _replayed_model(self, agent_name: str):
+        def replayed_run(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with self._lock:
+                    queue = self._responses[agent_name]
+                    if not queue:
+                        self.divergences.append(f"{agent_name}: unrecorded model call")
+                        raise RuntimeError(f"The cassette has no more responses for {agent_name}")
+                    response = queue.popleft()
+                return ChatCompletion.model_validate(response)
+            finally:
+                self.stub_seconds += time.perf_counter() - start
+
+        return replayed_run
+
+    def _replayed_tool(self, tool_name: str):
+        def handler(**kwargs):
+            start = time.perf_counter()
+            try:
+                with self._lock:
+                    recorded = self._tool_results.get(tool_name, [])
+                    args = _jsonable(kwargs)
+                    match = next((r for r in recorded if r["args"] == args), None)
+                    if match is None and recorded:
+                        self.divergences.append(f"{tool_name}: arguments differ")
+                        match = recorded[0]
+                    if match is None:
+                        self.divergences.append(f"{tool_name}: unrecorded call")
+                        raise RuntimeError(f"The cassette has no more results for {tool_name}")
+                    recorded.remove(match)
+            finally:
+                self.stub_seconds += time.perf_counter() - start
+            if "error" in match:
+                raise ValueError(match["error"])
+            return match["result"]
+
+        return handler
+
+    def unused(self) -> int:
+        r"""Number of recorded calls the replay did not make."""
+        return sum(len(queue) for queue in self._responses.values()) + sum(
+            len(results) for results in self._tool_results.values()
+        )
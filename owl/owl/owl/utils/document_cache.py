@@ -0,0 +1,188 @@
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+from camel.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds an entry stays valid
+DEFAULT_TTL = int(os.getenv("OWL_DOC_CACHE_TTL", str(7 * 24 * 3600)))
+# Total size of the cached contents before the least recently used are evicted
+DEFAULT_MAX_BYTES = int(os.getenv("OWL_DOC_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS documents (
+        key TEXT PRIMARY KEY,
+        source TEXT,
+        value TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    )
+"""
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    r"""SHA-256 of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(source: str, extractor: str, options: Optional[Dict[str, Any]] = None) -> str:
+    r"""Key of an extraction: the source (URL or content hash), the extractor
+    that produced it and the options it was called with."""
+    payload = json.dumps(
+        {"source": source, "extractor": extractor, "options": options or {}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DocumentCache:
+    r"""On-disk cache of extracted document contents.
+
+    Entries live in a SQLite database in the given directory, so they are
+    shared by all toolkits, threads and processes using the same directory.
+    Entries older than ``ttl`` seconds are treated as missing, and when the
+    cached contents grow past ``max_bytes`` the least recently read entries
+    are evicted.
+
+    Args:
+        cache_dir (str): Directory of the cache database.
+        ttl (float): Seconds an entry stays valid, ``0`` to never expire.
+            (default: :obj:`DEFAULT_TTL`)
+        max_bytes (int): Size bound of the cached contents.
+            (default: :obj:`DEFAULT_MAX_BYTES`)
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.db_file = os.path.join(cache_dir, "document_cache.db")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_file) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_file, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(CREATE_TABLE_SQL)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_documents_accessed "
+                "ON documents(accessed_at)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        r"""Return the cached value, or ``None`` if it is missing or expired."""
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, created_at FROM documents WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None and self.ttl and now - row[1] > self.ttl:
+            with conn:
+                conn.execute("DELETE FROM documents WHERE key = ?", (key,))
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        with conn:
+            conn.execute(
+                "UPDATE documents SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any, source: Optional[str] = None) -> None:
+        r"""Store a JSON serializable value, then evict the least recently
+        used entries beyond ``max_bytes``."""
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(key, source, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, source, data, size, now, now),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM documents ORDER BY accessed_at"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM documents WHERE key = ?", evicted)
+        with self._lock:
+            self.evictions += len(evicted)
+        logger.debug(f"Evicted {len(evicted)} documents from {self.db_file}")
+
+    def clear(self) -> None:
+        r"""Remove all entries."""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM documents")
+
+    def stats(self) -> Dict[str, Any]:
+        r"""Hit and miss counts of this instance, and the size of the cache."""
+        entries, size = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents"
+        ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": size,
+            }
@@ -18,31 +18,93 @@ from camel.toolkits import ImageAnalysisToolkit, ExcelToolkit
 from camel.utils import retry_on_error
 from camel.logger import get_logger
 from camel.models import BaseModelBackend
+from .document_cache import DocumentCache, cache_key, file_digest, DEFAULT_TTL, DEFAULT_MAX_BYTES
+from .local_extractor import LocalExtractor, extract_pdf_text, TEXT_EXTENSIONS, HTML_EXTENSIONS
+from .url_probe import http_session, url_type_cache, HTTP_TIMEOUT
+from .file_ingest import download_file, extract_archive, file_extension, is_archive, read_structured_file
 from docx2markdown._docx_to_markdown import docx_to_markdown
 from chunkr_ai import Chunkr
 import requests
-import mimetypes
-import json
 from typing import List, Optional, Tuple, Literal
 from urllib.parse import urlparse
 import os
-import subprocess
-import xmltodict
+import tarfile
+import threading
+import zipfile
 import nest_asyncio
 
 nest_asyncio.apply()
 
 logger = get_logger(__name__)
 
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# read directly from disk, not worth caching
+LOCAL_EXTENSIONS = {
+    ".xls", ".xlsx", ".zip", ".tar", ".tar.gz", ".tgz", ".json", ".jsonl", ".jsonld", ".py", ".xml"
+}
+# URLs with these extensions are typed without fetching them; anything else (including
+# .php, .asp, .cgi, which system mime.types maps to non-HTML types) is probed
+URL_MEDIA_TYPES = {
+    ".pdf": "application/pdf",
+    ".doc": "application/msword",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".ppt": "application/vnd.ms-powerpoint",
+    ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    ".xls": "application/vnd.ms-excel",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".csv": "text/csv",
+    ".txt": "text/plain",
+    ".md": "text/markdown",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".mp4": "video/mp4",
+    ".html": "text/html",
+    ".htm": "text/html",
+}
+# extractors return these instead of raising
+FAILED_CONTENT_PREFIXES = ("Error", "No content found")
+
 
 class DocumentProcessingToolkit(BaseToolkit):
     r"""A class representing a toolkit for processing document and return the content of the document.
 
     This class provides method for processing docx, pdf, pptx, etc. It cannot process excel files.
+
+    PDFs, webpages and text files are first extracted locally (see :class:`LocalExtractor`); only
+    documents whose local extraction fails the quality checks are sent to Chunkr or Firecrawl.
+    Extractions that crawl, upload or call the vision model are cached on disk under ``cache_dir``
+    (see :class:`DocumentCache`), keyed by the URL or the file content and the extractor, so
+    repeated calls do not count against the crawl and upload quotas.
+
+    Args:
+        cache_dir (str, optional): Directory for downloads and the extraction cache.
+            (default: :obj:`"tmp/"`)
+        model (BaseModelBackend, optional): The vision model used to caption images.
+        use_cache (bool): Whether to cache extractions. (default: :obj:`True`)
+        cache_ttl (float): Seconds a cached extraction stays valid.
+            (default: :obj:`DEFAULT_TTL`)
+        cache_max_bytes (int): Size bound of the extraction cache.
+            (default: :obj:`DEFAULT_MAX_BYTES`)
+        local_first (bool): Whether to try local extraction before the remote services.
+            (default: :obj:`True`)
     """
 
+    # Bump when an extractor changes its output, so old cache entries are not reused
+    EXTRACTOR_VERSION = 2
+
     def __init__(
-        self, cache_dir: Optional[str] = None, model: Optional[BaseModelBackend] = None
+        self,
+        cache_dir: Optional[str] = None,
+        model: Optional[BaseModelBackend] = None,
+        use_cache: bool = True,
+        cache_ttl: float = DEFAULT_TTL,
+        cache_max_bytes: int = DEFAULT_MAX_BYTES,
+        local_first: bool = True,
     ):
         self.image_tool = ImageAnalysisToolkit(model=model)
         # self.audio_tool = AudioAnalysisToolkit()
@@ -52,6 +114,15 @@ class DocumentProcessingToolkit(BaseToolkit):
         if cache_dir:
             self.cache_dir = cache_dir
 
+        self.cache = (
+            DocumentCache(self.cache_dir, ttl=cache_ttl, max_bytes=cache_max_bytes)
+            if use_cache
+            else None
+        )
+        self.local_extractor = LocalExtractor() if local_first else None
+        # response of the GET made by _is_webpage, kept per thread for the extraction that follows
+        self._probe = threading.local()
+
     @retry_on_error()
     def extract_document_content(self, document_path: str) -> Tuple[bool, str]:
         r"""Extract the content of a given document (or url) and return the processed text.
@@ -63,13 +134,61 @@ class DocumentProcessingToolkit(BaseToolkit):
         Returns:
             Tuple[bool, str]: A tuple containing a boolean indicating whether the document was processed successfully, and the content of the document (if success).
         """
-        import asyncio
-
         logger.debug(
             f"Calling extract_document_content function with document_path=`{document_path}`"
         )
 
-        if any(document_path.endswith(ext) for ext in [".jpg", ".jpeg", ".png"]):
+        key = self._cache_key(document_path) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.debug(f"Using cached content of `{document_path}`")
+                return tuple(cached)
+
+        try:
+            success, content = self._extract_document_content(document_path)
+        finally:
+            # close the probe response if no extractor consumed it
+            self._take_probe_response()
+        # extractors report some failures as content, which must not be cached
+        if (
+            key is not None
+            and success
+            and not (isinstance(content, str) and content.startswith(FAILED_CONTENT_PREFIXES))
+        ):
+            self.cache.put(key, [success, content], source=document_path)
+        return success, content
+
+    def _cache_key(self, document_path: str) -> Optional[str]:
+        r"""Cache key of an extraction, or ``None`` for documents that are cheap to read
+        locally (json, xml, py, excel, archives)."""
+        if file_extension(document_path) in LOCAL_EXTENSIONS:
+            return None
+
+        parsed_url = urlparse(document_path)
+        if all([parsed_url.scheme, parsed_url.netloc]):
+            source = document_path.strip()
+        elif os.path.isfile(document_path):
+            source = f"sha256:{file_digest(document_path)}"
+        else:
+            return None
+
+        options = {"version": self.EXTRACTOR_VERSION}
+        if any(document_path.endswith(ext) for ext in IMAGE_EXTENSIONS):
+            # captions depend on the vision model
+            extractor = "image_caption"
+            model_type = self.image_tool.model.model_type
+            options["model"] = str(getattr(model_type, "value", model_type))
+        else:
+            extractor = "document"
+            options["output_format"] = "markdown"
+            options["local_first"] = self.local_extractor is not None
+        return cache_key(source, extractor, options)
+
+    def _extract_document_content(self, document_path: str) -> Tuple[bool, str]:
+        import asyncio
+
+        if any(document_path.endswith(ext) for ext in IMAGE_EXTENSIONS):
             res = self.image_tool.ask_question_about_image(
                 document_path, "Please make a detailed caption about the image."
             )
@@ -79,42 +198,41 @@ class DocumentProcessingToolkit(BaseToolkit):
         #     res = self.audio_tool.ask_question_about_audio(document_path, "Please transcribe the audio content to text.")
         #     return True, res
 
-        if any(document_path.endswith(ext) for ext in ["xls", "xlsx"]):
+        # compare whole extensions: a bare suffix check matches URLs such as .../wiki/Qatar
+        extension = file_extension(document_path)
+        parsed_url = urlparse(document_path)
+        if all([parsed_url.scheme, parsed_url.netloc]) and extension in LOCAL_EXTENSIONS:
+            downloaded_path = self._download_file(document_path)
+            if downloaded_path is None:
+                return False, f"Failed to download the file from {document_path}."
+            document_path = downloaded_path
+
+        if extension in (".xls", ".xlsx"):
             res = self.excel_tool.extract_excel_content(document_path)
             return True, res
 
-        if any(document_path.endswith(ext) for ext in ["zip"]):
+        if is_archive(document_path):
             extracted_files = self._unzip_file(document_path)
             return True, f"The extracted files are: {extracted_files}"
 
-        if any(document_path.endswith(ext) for ext in ["json", "jsonl", "jsonld"]):
-            with open(document_path, "r", encoding="utf-8") as f:
-                content = json.load(f)
-            f.close()
-            return True, content
+        # large files are summarized rather than loaded
+        if extension in (".json", ".jsonl", ".jsonld"):
+            return True, read_structured_file(document_path)
 
-        if any(document_path.endswith(ext) for ext in ["py"]):
+        if extension == ".py":
             with open(document_path, "r", encoding="utf-8") as f:
                 content = f.read()
             f.close()
             return True, content
 
-        if any(document_path.endswith(ext) for ext in ["xml"]):
-            data = None
-            with open(document_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            f.close()
-
-            try:
-                data = xmltodict.parse(content)
-                logger.debug(f"The extracted xml data is: {data}")
-                return True, data
-
-            except Exception:
-                logger.debug(f"The raw xml data is: {content}")
-                return True, content
+        if extension == ".xml":
+            return True, read_structured_file(document_path)
 
         if self._is_webpage(document_path):
+            if self.local_extractor is not None:
+                extracted_text = self._extract_webpage_locally(document_path)
+                if extracted_text is not None:
+                    return True, extracted_text
             extracted_text = self._extract_webpage_content(document_path)
             return True, extracted_text
 
@@ -126,6 +244,27 @@ class DocumentProcessingToolkit(BaseToolkit):
                 if not os.path.exists(document_path):
                     return False, f"Document not found at path: {document_path}."
 
+            if self.local_extractor is not None:
+                if not is_url and document_path.lower().endswith(TEXT_EXTENSIONS + HTML_EXTENSIONS):
+                    return True, self.local_extractor.extract_text_file(document_path)
+
+                # extensionless URLs were typed by _is_webpage, this reads its cache
+                is_pdf = document_path.lower().endswith(".pdf")
+                if is_url and not is_pdf:
+                    try:
+                        is_pdf = self._url_content_type(document_path) == "application/pdf"
+                    except requests.exceptions.RequestException:
+                        pass
+                if is_pdf:
+                    pdf_path = self._download_file(document_path) if is_url else document_path
+                    try:
+                        extracted_text = pdf_path and self.local_extractor.extract_pdf(pdf_path)
+                    except Exception as e:
+                        logger.warning(f"Error occurred while extracting pdf locally: {e}")
+                        extracted_text = None
+                    if extracted_text:
+                        return True, extracted_text
+
             # if is docx file, use docx2markdown to convert it
             if document_path.endswith(".docx"):
                 if is_url:
@@ -151,23 +290,14 @@ class DocumentProcessingToolkit(BaseToolkit):
                     f"Error occurred while using Chunkr to process document: {e}"
                 )
                 if document_path.endswith(".pdf"):
-                    # try using pypdf to extract text from pdf
+                    # fall back to the local text, even if it failed the quality checks
                     try:
-                        from PyPDF2 import PdfReader
-
                         if is_url:
                             tmp_path = self._download_file(document_path)
                             document_path = tmp_path
 
-                        # Open file in binary mode for PdfReader
-                        f = open(document_path, "rb")
-                        reader = PdfReader(f)
-                        extracted_text = ""
-                        for page in reader.pages:
-                            extracted_text += page.extract_text()
-                        f.close()
-
-                        return True, extracted_text
+                        texts, _ = extract_pdf_text(document_path)
+                        return True, "\n\n".join(texts)
 
                     except Exception as pdf_error:
                         logger.error(
@@ -190,18 +320,7 @@ class DocumentProcessingToolkit(BaseToolkit):
             if not is_url:
                 return False
 
-            path = parsed_url.path
-            file_type, _ = mimetypes.guess_type(path)
-            if file_type is not None and "text/html" in file_type:
-                return True
-
-            response = requests.head(url, allow_redirects=True, timeout=10)
-            content_type = response.headers.get("Content-Type", "").lower()
-
-            if "text/html" in content_type:
-                return True
-            else:
-                return False
+            return "text/html" in self._url_content_type(url)
 
         except requests.exceptions.RequestException as e:
             # raise RuntimeError(f"Error while checking the URL: {e}")
@@ -211,6 +330,45 @@ class DocumentProcessingToolkit(BaseToolkit):
         except TypeError:
             return True
 
+    def _url_content_type(self, url: str) -> str:
+        r"""Media type of a URL.
+
+        Document, image and media extensions in :obj:`URL_MEDIA_TYPES` decide directly, then the
+        type of URLs of the same host and path pattern seen before. Only unknown URLs are fetched: the GET is streamed, the type is read
+        from its headers, and the response is kept so the extraction does not fetch the URL again.
+        """
+        file_type = URL_MEDIA_TYPES.get(file_extension(url))
+        if file_type is not None:
+            return file_type
+
+        content_type = url_type_cache.get(url)
+        if content_type is not None:
+            return content_type
+
+        response = http_session().get(url, stream=True, allow_redirects=True, timeout=HTTP_TIMEOUT)
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if response.ok:
+            url_type_cache.set(url, content_type)
+        self._keep_probe_response(url, response)
+        return content_type
+
+    def _keep_probe_response(self, url: str, response: requests.Response) -> None:
+        self._take_probe_response()
+        self._probe.url, self._probe.response = url, response
+
+    def _take_probe_response(self, url: Optional[str] = None) -> Optional[requests.Response]:
+        r"""Return the response kept by :meth:`_is_webpage` for the URL, closing any other.
+        Without a URL the kept response is always closed."""
+        response = getattr(self._probe, "response", None)
+        if response is None:
+            return None
+        kept_url = self._probe.url
+        self._probe.url = self._probe.response = None
+        if url is not None and url == kept_url:
+            return response
+        response.close()
+        return None
+
     @retry_on_error()
     async def _extract_content_with_chunkr(
         self,
@@ -269,23 +427,32 @@ class DocumentProcessingToolkit(BaseToolkit):
 
         return str(data["data"][0]["markdown"])
 
-    def _download_file(self, url: str):
-        r"""Download a file from a URL and save it to the cache directory."""
+    def _extract_webpage_locally(self, url: str) -> Optional[str]:
+        r"""Fetch a webpage and convert its main content to markdown, or return ``None`` when the
+        page cannot be fetched or fails the quality checks (e.g. rendered by JavaScript)."""
         try:
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            file_name = url.split("/")[-1]
-
-            file_path = os.path.join(self.cache_dir, file_name)
-
-            with open(file_path, "wb") as file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    file.write(chunk)
+            response = self._take_probe_response(url) or http_session().get(url, timeout=HTTP_TIMEOUT)
+            with response:
+                response.raise_for_status()
+                html = response.text
+        except requests.exceptions.RequestException as e:
+            logger.info(f"Local fetch of {url} failed: {e}")
+            return None
+        return self.local_extractor.extract_html(html, url)
 
-            return file_path
+    def _download_file(self, url: str):
+        r"""Download a file from a URL to the cache directory, named by the hash of its content.
+        Returns ``None`` if the download fails."""
+        try:
+            return download_file(
+                url,
+                os.path.join(self.cache_dir, "downloads"),
+                response=self._take_probe_response(url),
+                session=http_session(),
+            )
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error downloading the file: {e}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"Error downloading the file: {e}")
 
     def _get_formatted_time(self) -> str:
         import time
@@ -293,25 +460,18 @@ class DocumentProcessingToolkit(BaseToolkit):
         return time.strftime("%m%d%H%M")
 
     def _unzip_file(self, zip_path: str) -> List[str]:
-        if not zip_path.endswith(".zip"):
-            raise ValueError("Only .zip files are supported")
+        if not is_archive(zip_path):
+            raise ValueError("Only .zip and .tar(.gz) files are supported")
 
-        zip_name = os.path.splitext(os.path.basename(zip_path))[0]
-        extract_path = os.path.join(self.cache_dir, zip_name)
-        os.makedirs(extract_path, exist_ok=True)
+        # the content hash keeps archives with the same name apart
+        zip_name = os.path.basename(zip_path).split(".")[0]
+        extract_path = os.path.join(self.cache_dir, f"{zip_name}-{file_digest(zip_path)[:12]}")
 
         try:
-            subprocess.run(["unzip", "-o", zip_path, "-d", extract_path], check=True)
-        except subprocess.CalledProcessError as e:
+            return extract_archive(zip_path, extract_path)
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
             raise RuntimeError(f"Failed to unzip file: {e}")
 
-        extracted_files = []
-        for root, _, files in os.walk(extract_path):
-            for file in files:
-                extracted_files.append(os.path.join(root, file))
-
-        return extracted_files
-
     def get_tools(self) -> List[FunctionTool]:
         r"""Returns a list of FunctionTool objects representing the functions in the toolkit.
 
@@ -12,23 +12,204 @@
 # limitations under the License.
 # ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
 
-from typing import Dict, List, Optional, Tuple
+import os
+import re
+import json
+import difflib
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 
 
 from camel.agents import ChatAgent
 from camel.responses import ChatAgentResponse
 from camel.messages.base import BaseMessage
+from camel.messages import FunctionCallingMessage
+from camel.memories import MemoryRecord
 from camel.societies import RolePlaying
+from camel.types import OpenAIBackendRole
 from camel.logger import get_logger
 
 
 from copy import deepcopy
+from dataclasses import replace
+
+from .run_metrics import RunMetrics
+from .cassette import CassetteRecorder
 
 logger = get_logger(__name__)
 
 
+class ContextCompactor:
+    r"""Keeps an agent's chat history within a prompt token budget.
+
+    Once an agent's context grows past ``token_budget``, large tool outputs
+    outside the most recent rounds are truncated first. If that is not
+    enough, the older rounds are folded into a single extractive summary
+    message. The system message and the last ``keep_recent_rounds`` rounds
+    are always kept verbatim.
+
+    Pass an instance as ``context_compactor`` to :class:`OwlRolePlaying`.
+    The society then also stops repeating the task prompt in every message,
+    since both system messages already contain it.
+
+    Args:
+        token_budget (int): Prompt tokens an agent's context may use before
+            it is compacted. (default: :obj:`12000`)
+        keep_recent_rounds (int): Number of most recent rounds kept
+            verbatim. (default: :obj:`2`)
+        max_tool_output_chars (int): Older tool outputs longer than this are
+            truncated. (default: :obj:`2000`)
+        summary_chars (int): Characters kept per message when older rounds
+            are summarized. (default: :obj:`300`)
+    """
+
+    SUMMARY_TAG = "owl_compacted_summary"
+
+    def __init__(
+        self,
+        token_budget: int = 12000,
+        keep_recent_rounds: int = 2,
+        max_tool_output_chars: int = 2000,
+        summary_chars: int = 300,
+    ):
+        self.token_budget = token_budget
+        self.keep_recent_rounds = max(1, keep_recent_rounds)
+        self.max_tool_output_chars = max_tool_output_chars
+        self.summary_chars = summary_chars
+
+    @staticmethod
+    def context_tokens(agent: ChatAgent) -> int:
+        r"""Number of tokens in the agent's whole chat history. Unlike
+        ``memory.get_context()``, this is counted before the history is
+        pruned to the model's token limit."""
+        messages = [
+            context_record.memory_record.to_openai_message()
+            for context_record in agent.memory.retrieve()
+        ]
+        token_counter = agent.memory.get_context_creator().token_counter
+        return token_counter.count_tokens_from_messages(messages)
+
+    @staticmethod
+    def text_tokens(agent: ChatAgent, text: str) -> int:
+        r"""Number of tokens ``text`` takes as a user message for the agent's
+        model."""
+        token_counter = agent.memory.get_context_creator().token_counter
+        return token_counter.count_tokens_from_messages(
+            [{"role": "user", "content": text}]
+        )
+
+    def compact(self, agent: ChatAgent) -> int:
+        r"""Compact the agent's memory if it exceeds the budget.
+
+        Returns:
+            int: Number of tokens removed from the agent's context.
+        """
+        tokens_before = self.context_tokens(agent)
+        if tokens_before <= self.token_budget:
+            return 0
+
+        records = [
+            context_record.memory_record
+            for context_record in agent.memory.retrieve()
+        ]
+        # every round starts with the message the agent received
+        round_starts = [
+            i
+            for i, record in enumerate(records)
+            if record.role_at_backend == OpenAIBackendRole.USER
+            and self.SUMMARY_TAG not in record.extra_info
+        ]
+        if len(round_starts) <= self.keep_recent_rounds:
+            return 0
+        cut = round_starts[-self.keep_recent_rounds]
+
+        system = [
+            r for r in records[:cut] if r.role_at_backend == OpenAIBackendRole.SYSTEM
+        ]
+        older = [
+            self._truncate_tool_output(r)
+            for r in records[:cut]
+            if r.role_at_backend != OpenAIBackendRole.SYSTEM
+        ]
+        recent = records[cut:]
+
+        self._rewrite(agent, system + older + recent)
+        tokens_after = self.context_tokens(agent)
+        if tokens_after > self.token_budget:
+            self._rewrite(agent, system + [self._summarize(older, agent)] + recent)
+            tokens_after = self.context_tokens(agent)
+
+        logger.info(
+            f"Compacted context of {agent.role_name}: "
+            f"{tokens_before} -> {tokens_after} tokens"
+        )
+        return max(0, tokens_before - tokens_after)
+
+    def _clip(self, text: str, limit: int) -> str:
+        text = str(text)
+        if len(text) <= limit:
+            return text
+        return f"{text[:limit]}... [{len(text) - limit} characters omitted]"
+
+    def _truncate_tool_output(self, record: MemoryRecord) -> MemoryRecord:
+        message = record.message
+        if (
+            not isinstance(message, FunctionCallingMessage)
+            or message.result is None
+            or len(str(message.result)) <= self.max_tool_output_chars
+        ):
+            return record
+        result = self._clip(message.result, self.max_tool_output_chars)
+        return record.model_copy(update={"message": replace(message, result=result)})
+
+    def _summarize(self, records: List[MemoryRecord], agent: ChatAgent) -> MemoryRecord:
+        lines = []
+        for record in records:
+            message = record.message
+            if self.SUMMARY_TAG in record.extra_info:
+                # keep the summary of rounds compacted earlier as is
+                lines.extend(message.content.splitlines()[1:])
+            elif isinstance(message, FunctionCallingMessage):
+                if message.result is not None:
+                    result = self._clip(message.result, self.summary_chars)
+                    lines.append(f"- {message.func_name} returned: {result}")
+                else:
+                    args = self._clip(
+                        json.dumps(message.args, ensure_ascii=False, default=str),
+                        self.summary_chars,
+                    )
+                    lines.append(f"- {message.role_name} called {message.func_name}({args})")
+            elif message.content:
+                content = self._clip(message.content, self.summary_chars)
+                lines.append(f"- {message.role_name}: {content}")
+
+        summary = BaseMessage.make_user_message(
+            role_name="summary",
+            content="Summary of the earlier rounds of our conversation:\n"
+            + "\n".join(lines),
+        )
+        return MemoryRecord(
+            message=summary,
+            role_at_backend=OpenAIBackendRole.USER,
+            extra_info={self.SUMMARY_TAG: "1"},
+            timestamp=records[-1].timestamp,
+            agent_id=agent.agent_id,
+        )
+
+    def _rewrite(self, agent: ChatAgent, records: List[MemoryRecord]) -> None:
+        agent.memory.clear()
+        agent.memory.write_records(records)
+
+
 class OwlRolePlaying(RolePlaying):
     def __init__(self, **kwargs):
+        # Keep the conversation within a prompt token budget, see ContextCompactor
+        self.context_compactor: Optional[ContextCompactor] = kwargs.pop(
+            "context_compactor", None
+        )
+        self._prompt_tokens_saved = 0
+        self._hint_tokens_saved: Optional[int] = None
+
         self.user_role_name = kwargs.get("user_role_name", "user")
         self.assistant_role_name = kwargs.get("assistant_role_name", "assistant")
 
@@ -211,9 +392,78 @@ Please note that our overall task may be very complicated. Here are some tips th
 
         return user_sys_msg, assistant_sys_msg
 
+    def _task_hints(self, full: bool = True) -> Tuple[str, str]:
+        r"""Return the hints appended to the user's instruction and to the
+        assistant's reply each round. Unless ``full``, the task prompt is not
+        repeated, as both system messages already contain it."""
+        tool_hint = "If there are available tools and you want to call them, never say 'I will ...', but first call the tool and reply based on tool call's result, and tell me which tool you have called."
+        if full:
+            user_hint = f"""\n
+            Here are auxiliary information about the overall task, which may help you understand the intent of the current task:
+            <auxiliary_information>
+            {self.task_prompt}
+            </auxiliary_information>
+            {tool_hint}
+            """
+            task_ref = f"our current task: <task>{self.task_prompt}</task>"
+        else:
+            user_hint = f"""\n
+            {tool_hint}
+            """
+            task_ref = "our overall task"
+        assistant_hint = f"""\n
+                Provide me with the next instruction and input (if needed) based on my response and {task_ref}
+                Before producing the final answer, please check whether I have rechecked the final answer using different toolkit as much as possible. If not, please remind me to do that.
+                If I have written codes, remind me to run the codes.
+                If you think our task is done, reply with `TASK_DONE` to end our conversation.
+            """
+        return user_hint, assistant_hint
+
+    def _compact_context(self) -> Optional[dict]:
+        r"""Compact both agents' memories before a round.
+
+        Returns:
+            Optional[dict]: ``None`` when compaction is off, otherwise the
+                tokens removed from the contexts this round, the estimated
+                prompt tokens saved by this round's calls (every token
+                removed so far would have been sent again) and the current
+                context size of each agent.
+        """
+        compactor = self.context_compactor
+        if compactor is None:
+            return None
+
+        removed = compactor.compact(self.user_agent) + compactor.compact(
+            self.assistant_agent
+        )
+        if self._hint_tokens_saved is None:
+            # each round's hints stay in the agents' memories without the task
+            full_user_hint, full_assistant_hint = self._task_hints(full=True)
+            user_hint, assistant_hint = self._task_hints(full=False)
+            self._hint_tokens_saved = (
+                compactor.text_tokens(self.assistant_agent, full_user_hint)
+                - compactor.text_tokens(self.assistant_agent, user_hint)
+                + compactor.text_tokens(self.user_agent, full_assistant_hint)
+                - compactor.text_tokens(self.user_agent, assistant_hint)
+            )
+        removed += self._hint_tokens_saved
+        self._prompt_tokens_saved += removed
+        return {
+            "tokens_removed": removed,
+            "prompt_tokens_saved": self._prompt_tokens_saved,
+            "context_tokens": {
+                "user": compactor.context_tokens(self.user_agent),
+                "assistant": compactor.context_tokens(self.assistant_agent),
+            },
+        }
+
     def step(
         self, assistant_msg: BaseMessage
     ) -> Tuple[ChatAgentResponse, ChatAgentResponse]:
+        compaction = self._compact_context()
+        user_hint, assistant_hint = self._task_hints(
+            full=self.context_compactor is None
+        )
         user_response = self.user_agent.step(assistant_msg)
         if user_response.terminated or user_response.msgs is None:
             return (
@@ -229,13 +479,7 @@ Please note that our overall task may be very complicated. Here are some tips th
         modified_user_msg = deepcopy(user_msg)
 
         if "TASK_DONE" not in user_msg.content:
-            modified_user_msg.content += f"""\n
-            Here are auxiliary information about the overall task, which may help you understand the intent of the current task:
-            <auxiliary_information>
-            {self.task_prompt}
-            </auxiliary_information>
-            If there are available tools and you want to call them, never say 'I will ...', but first call the tool and reply based on tool call's result, and tell me which tool you have called.
-            """
+            modified_user_msg.content += user_hint
 
         else:
             # The task is done, and the assistant agent need to give the final answer about the original task
@@ -245,6 +489,8 @@ Please note that our overall task may be very complicated. Here are some tips th
 
         # process assistant's response
         assistant_response = self.assistant_agent.step(modified_user_msg)
+        if compaction is not None:
+            assistant_response.info["compaction"] = compaction
         if assistant_response.terminated or assistant_response.msgs is None:
             return (
                 ChatAgentResponse(
@@ -260,12 +506,7 @@ Please note that our overall task may be very complicated. Here are some tips th
 
         modified_assistant_msg = deepcopy(assistant_msg)
         if "TASK_DONE" not in user_msg.content:
-            modified_assistant_msg.content += f"""\n
-                Provide me with the next instruction and input (if needed) based on my response and our current task: <task>{self.task_prompt}</task>
-                Before producing the final answer, please check whether I have rechecked the final answer using different toolkit as much as possible. If not, please remind me to do that.
-                If I have written codes, remind me to run the codes.
-                If you think our task is done, reply with `TASK_DONE` to end our conversation.
-            """
+            modified_assistant_msg.content += assistant_hint
 
         # return the modified messages
         return (
@@ -284,6 +525,10 @@ Please note that our overall task may be very complicated. Here are some tips th
     async def astep(
         self, assistant_msg: BaseMessage
     ) -> Tuple[ChatAgentResponse, ChatAgentResponse]:
+        compaction = self._compact_context()
+        user_hint, assistant_hint = self._task_hints(
+            full=self.context_compactor is None
+        )
         user_response = await self.user_agent.astep(assistant_msg)
         if user_response.terminated or user_response.msgs is None:
             return (
@@ -299,13 +544,7 @@ Please note that our overall task may be very complicated. Here are some tips th
         modified_user_msg = deepcopy(user_msg)
 
         if "TASK_DONE" not in user_msg.content:
-            modified_user_msg.content += f"""\n
-            Here are auxiliary information about the overall task, which may help you understand the intent of the current task:
-            <auxiliary_information>
-            {self.task_prompt}
-            </auxiliary_information>
-            If there are available tools and you want to call them, never say 'I will ...', but first call the tool and reply based on tool call's result, and tell me which tool you have called.
-            """
+            modified_user_msg.content += user_hint
 
         else:
             # The task is done, and the assistant agent need to give the final answer about the original task
@@ -314,6 +553,8 @@ Please note that our overall task may be very complicated. Here are some tips th
             """
 
         assistant_response = await self.assistant_agent.astep(user_msg)
+        if compaction is not None:
+            assistant_response.info["compaction"] = compaction
         if assistant_response.terminated or assistant_response.msgs is None:
             return (
                 ChatAgentResponse(
@@ -329,12 +570,7 @@ Please note that our overall task may be very complicated. Here are some tips th
 
         modified_assistant_msg = deepcopy(assistant_msg)
         if "TASK_DONE" not in user_msg.content:
-            modified_assistant_msg.content += f"""\n
-                Provide me with the next instruction and input (if needed) based on my response and our current task: <task>{self.task_prompt}</task>
-                Before producing the final answer, please check whether I have rechecked the final answer using different toolkit as much as possible. If not, please remind me to do that.
-                If I have written codes, remind me to run the codes.
-                If you think our task is done, reply with `TASK_DONE` to end our conversation.
-            """
+            modified_assistant_msg.content += assistant_hint
 
         return (
             ChatAgentResponse(
@@ -357,6 +593,10 @@ class OwlGAIARolePlaying(OwlRolePlaying):
     def step(
         self, assistant_msg: BaseMessage
     ) -> Tuple[ChatAgentResponse, ChatAgentResponse]:
+        compaction = self._compact_context()
+        user_hint, assistant_hint = self._task_hints(
+            full=self.context_compactor is None
+        )
         user_response = self.user_agent.step(assistant_msg)
         if user_response.terminated or user_response.msgs is None:
             return (
@@ -372,13 +612,7 @@ class OwlGAIARolePlaying(OwlRolePlaying):
         modified_user_msg = deepcopy(user_msg)
 
         if "TASK_DONE" not in user_msg.content:
-            modified_user_msg.content += f"""\n
-            Here are auxiliary information about the overall task, which may help you understand the intent of the current task:
-            <auxiliary_information>
-            {self.task_prompt}
-            </auxiliary_information>
-            If there are available tools and you want to call them, never say 'I will ...', but first call the tool and reply based on tool call's result, and tell me which tool you have called.
-            """
+            modified_user_msg.content += user_hint
 
         else:
             # The task is done, and the assistant agent need to give the final answer about the original task
@@ -400,6 +634,8 @@ class OwlGAIARolePlaying(OwlRolePlaying):
 
         # process assistant's response
         assistant_response = self.assistant_agent.step(modified_user_msg)
+        if compaction is not None:
+            assistant_response.info["compaction"] = compaction
         if assistant_response.terminated or assistant_response.msgs is None:
             return (
                 ChatAgentResponse(
@@ -415,12 +651,7 @@ class OwlGAIARolePlaying(OwlRolePlaying):
 
         modified_assistant_msg = deepcopy(assistant_msg)
         if "TASK_DONE" not in user_msg.content:
-            modified_assistant_msg.content += f"""\n
-                Provide me with the next instruction and input (if needed) based on my response and our current task: <task>{self.task_prompt}</task>
-                Before producing the final answer, please check whether I have rechecked the final answer using different toolkit as much as possible. If not, please remind me to do that.
-                If I have written codes, remind me to run the codes.
-                If you think our task is done, reply with `TASK_DONE` to end our conversation.
-            """
+            modified_assistant_msg.content += assistant_hint
 
         # return the modified messages
         return (
@@ -437,133 +668,450 @@ class OwlGAIARolePlaying(OwlRolePlaying):
         )
 
 
-def run_society(
-    society: OwlRolePlaying,
-    round_limit: int = 15,
-) -> Tuple[str, List[dict], dict]:
-    overall_completion_token_count = 0
-    overall_prompt_token_count = 0
+# Scene scripts print events to stdout with this prefix so that the API server
+# can relay them to subscribers. Must match EVENT_PREFIX in owl/owl/jobs.py.
+EVENT_PREFIX = "OWL_EVENT:"
 
-    chat_history = []
-    init_prompt = """
+# Environment variable turning on the convergence checkers of the scene
+# scripts. Stopping before TASK_DONE can cut off an answer the society was
+# still improving, so early stopping is off unless it is set.
+EARLY_STOP_ENV = "OWL_EARLY_STOP"
+
+INIT_PROMPT = """
     Now please give me instructions to solve over overall task step by step. If the task requires some specific knowledge, please instruct me to use tools to complete the task.
         """
-    input_msg = society.init_chat(init_prompt)
-    for _round in range(round_limit):
-        assistant_response, user_response = society.step(input_msg)
-        # Check if usage info is available before accessing it
-        if assistant_response.info.get("usage") and user_response.info.get("usage"):
-            overall_completion_token_count += assistant_response.info["usage"].get(
-                "completion_tokens", 0
-            ) + user_response.info["usage"].get("completion_tokens", 0)
-            overall_prompt_token_count += assistant_response.info["usage"].get(
-                "prompt_tokens", 0
-            ) + user_response.info["usage"].get("prompt_tokens", 0)
-
-        # convert tool call to dict
-        tool_call_records: List[dict] = []
-        if assistant_response.info.get("tool_calls"):
-            for tool_call in assistant_response.info["tool_calls"]:
-                tool_call_records.append(tool_call.as_dict())
-
-        _data = {
-            "user": user_response.msg.content
-            if hasattr(user_response, "msg") and user_response.msg
-            else "",
-            "assistant": assistant_response.msg.content
-            if hasattr(assistant_response, "msg") and assistant_response.msg
-            else "",
-            "tool_calls": tool_call_records,
-        }
 
-        chat_history.append(_data)
-        logger.info(
-            f"Round #{_round} user_response:\n {user_response.msgs[0].content if user_response.msgs and len(user_response.msgs) > 0 else ''}"
+
+def early_stop_enabled() -> bool:
+    r"""Whether ``$OWL_EARLY_STOP`` turns on early stopping (off by default).
+
+    Scene scripts only pass their :class:`ConvergenceChecker` to
+    :func:`run_society` when this returns :obj:`True`.
+    """
+    return os.getenv(EARLY_STOP_ENV, "0").lower() not in ("", "0", "false", "no")
+
+
+class ConvergenceChecker(ABC):
+    r"""Decides after each round whether the society already holds a complete
+    answer, so that :func:`iter_society` can stop before ``TASK_DONE``.
+
+    Any callable taking a round record and returning a bool can be used in
+    place of a subclass.
+    """
+
+    name = "convergence"
+
+    @abstractmethod
+    def __call__(self, record: dict) -> bool:
+        r"""Whether the answer in ``record`` is complete."""
+
+    @property
+    def tokens_used(self) -> int:
+        r"""Tokens spent by the checker itself, deducted from the savings."""
+        return 0
+
+
+class AnswerStabilityChecker(ConvergenceChecker):
+    r"""Converged once the assistant's answer stops changing.
+
+    Args:
+        threshold (float): Similarity ratio between consecutive assistant
+            messages above which they count as the same answer.
+        patience (int): Number of consecutive stable rounds required.
+        min_length (int): Messages shorter than this never count as an answer.
+    """
+
+    name = "answer_stability"
+
+    def __init__(
+        self, threshold: float = 0.9, patience: int = 1, min_length: int = 200
+    ):
+        self.threshold = threshold
+        self.patience = patience
+        self.min_length = min_length
+        self._previous: Optional[str] = None
+        self._stable_rounds = 0
+
+    def __call__(self, record: dict) -> bool:
+        answer = record["assistant"].split("Next request.", 1)[0].strip()
+        previous, self._previous = self._previous, answer
+        # a round that still calls tools is still gathering information
+        if record["tool_calls"] or len(answer) < self.min_length or previous is None:
+            self._stable_rounds = 0
+            return False
+        ratio = difflib.SequenceMatcher(None, previous, answer).ratio()
+        self._stable_rounds = self._stable_rounds + 1 if ratio >= self.threshold else 0
+        return self._stable_rounds >= self.patience
+
+
+class AnswerPatternChecker(ConvergenceChecker):
+    r"""Per-scene rule: converged once the assistant message matches every
+    pattern, e.g. the section headings the scene prompt asks for.
+
+    Args:
+        patterns (List[str]): Regular expressions that must all match.
+        allow_tool_calls (bool): Whether a round that called tools may count.
+    """
+
+    name = "answer_pattern"
+
+    def __init__(self, patterns: List[str], allow_tool_calls: bool = False):
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        self.allow_tool_calls = allow_tool_calls
+
+    def __call__(self, record: dict) -> bool:
+        if record["tool_calls"] and not self.allow_tool_calls:
+            return False
+        return all(pattern.search(record["assistant"]) for pattern in self.patterns)
+
+
+class ModelJudgeChecker(ConvergenceChecker):
+    r"""Asks a cheap model whether the latest assistant message already
+    answers the task completely.
+
+    Args:
+        model: The model backend used for the yes/no judgement.
+        task_prompt (str): The task the society is solving.
+        min_round (int): First round index at which the judge is consulted.
+    """
+
+    name = "model_judge"
+
+    JUDGE_PROMPT = """You judge whether an answer is complete.
+Reply with exactly YES if the answer fully solves the task and needs no further
+research or tool use, otherwise reply with exactly NO."""
+
+    def __init__(self, model, task_prompt: str, min_round: int = 1):
+        self.task_prompt = task_prompt
+        self.min_round = min_round
+        self._agent = ChatAgent(self.JUDGE_PROMPT, model=model)
+        self._tokens_used = 0
+
+    @property
+    def tokens_used(self) -> int:
+        return self._tokens_used
+
+    def __call__(self, record: dict) -> bool:
+        if record["round"] < self.min_round or record["tool_calls"]:
+            return False
+        self._agent.reset()
+        response = self._agent.step(
+            f"<task>{self.task_prompt}</task>\n<answer>{record['assistant']}</answer>"
         )
-        logger.info(
-            f"Round #{_round} assistant_response:\n {assistant_response.msgs[0].content if assistant_response.msgs and len(assistant_response.msgs) > 0 else ''}"
+        usage = response.info.get("usage") or {}
+        self._tokens_used += usage.get("prompt_tokens", 0) + usage.get(
+            "completion_tokens", 0
+        )
+        return bool(response.msgs) and response.msg.content.strip().upper().startswith(
+            "YES"
         )
 
-        if (
-            assistant_response.terminated
-            or user_response.terminated
-            or "TASK_DONE" in user_response.msg.content
-        ):
-            break
 
-        input_msg = assistant_response.msg
+def _check_convergence(
+    convergence_checker: Optional[Callable[[dict], bool]],
+    record: dict,
+    round_limit: int,
+) -> None:
+    r"""Run the checker on a round that did not terminate by itself and, if it
+    converged with rounds left, mark the record as an early exit."""
+    if convergence_checker is None or record["terminated"]:
+        return
+    rounds_run = record["round"] + 1
+    max_rounds_saved = round_limit - rounds_run
+    if max_rounds_saved <= 0 or not convergence_checker(record):
+        return
+
+    token_info = record["token_info"]
+    tokens_per_round = (
+        token_info["prompt_token_count"] + token_info["completion_token_count"]
+    ) / rounds_run
+    checker_tokens = getattr(convergence_checker, "tokens_used", 0)
+    # upper bounds: the society could also have said TASK_DONE before the limit
+    early_exit = {
+        "checker": getattr(
+            convergence_checker,
+            "name",
+            getattr(convergence_checker, "__name__", type(convergence_checker).__name__),
+        ),
+        "round": record["round"],
+        "max_rounds_saved": max_rounds_saved,
+        "max_tokens_saved": max(
+            0, int(tokens_per_round * max_rounds_saved) - checker_tokens
+        ),
+        "checker_tokens": checker_tokens,
+    }
+    logger.info(f"Early exit after round #{record['round']}: {early_exit}")
+    record["terminated"] = True
+    record["early_exit"] = early_exit
+    token_info["early_exit"] = early_exit
+
+
+def _round_record(
+    _round: int,
+    assistant_response: ChatAgentResponse,
+    user_response: ChatAgentResponse,
+    token_info: dict,
+    terminated: bool,
+) -> dict:
+    r"""Build the record yielded for a finished round."""
+    # convert tool call to dict
+    tool_call_records: List[dict] = []
+    if assistant_response.info.get("tool_calls"):
+        for tool_call in assistant_response.info["tool_calls"]:
+            tool_call_records.append(tool_call.as_dict())
+
+    logger.info(
+        f"Round #{_round} user_response:\n {user_response.msgs[0].content if user_response.msgs and len(user_response.msgs) > 0 else ''}"
+    )
+    logger.info(
+        f"Round #{_round} assistant_response:\n {assistant_response.msgs[0].content if assistant_response.msgs and len(assistant_response.msgs) > 0 else ''}"
+    )
+
+    record = {
+        "round": _round,
+        "user": user_response.msg.content
+        if hasattr(user_response, "msg") and user_response.msg
+        else "",
+        "assistant": assistant_response.msg.content
+        if hasattr(assistant_response, "msg") and assistant_response.msg
+        else "",
+        "tool_calls": tool_call_records,
+        "usage": {
+            "user": user_response.info.get("usage"),
+            "assistant": assistant_response.info.get("usage"),
+        },
+        "token_info": dict(token_info),
+        "terminated": terminated,
+    }
+    compaction = assistant_response.info.get("compaction")
+    if compaction is not None:
+        record["compaction"] = compaction
+    return record
+
+
+def _finish_round(
+    metrics: RunMetrics,
+    _round: int,
+    round_limit: int,
+    assistant_response: ChatAgentResponse,
+    user_response: ChatAgentResponse,
+    terminated: bool,
+    convergence_checker: Optional[Callable[[dict], bool]],
+) -> dict:
+    r"""Account a finished round and build its record. The last record of
+    the run gets the full metrics snapshot in its ``token_info``."""
+    metrics.end_step("user", user_response.info.get("usage"))
+    metrics.end_step("assistant", assistant_response.info.get("usage"))
+    metrics.rounds = _round + 1
 
-    answer = chat_history[-1]["assistant"]
     token_info = {
-        "completion_token_count": overall_completion_token_count,
-        "prompt_token_count": overall_prompt_token_count,
+        "completion_token_count": metrics.completion_tokens,
+        "prompt_token_count": metrics.prompt_tokens,
     }
+    if "compaction" in assistant_response.info:
+        metrics.prompt_tokens_saved += assistant_response.info["compaction"][
+            "prompt_tokens_saved"
+        ]
+        token_info["prompt_tokens_saved"] = metrics.prompt_tokens_saved
+    record = _round_record(
+        _round, assistant_response, user_response, token_info, terminated
+    )
+    _check_convergence(convergence_checker, record, round_limit)
+    if record["terminated"] or metrics.rounds >= round_limit:
+        record["token_info"]["metrics"] = metrics.as_dict()
+    return record
+
+
+def iter_society(
+    society: OwlRolePlaying,
+    round_limit: int = 15,
+    convergence_checker: Optional[Callable[[dict], bool]] = None,
+) -> Iterator[dict]:
+    r"""Run the society and yield a record as soon as each round finishes.
+
+    Each record holds the round index, the user and assistant messages, the
+    assistant's tool calls, the raw usage of both agents, the running
+    ``token_info`` totals and whether the conversation terminated. Tokens
+    are counted per model call (see :class:`RunMetrics`), and the last
+    record's ``token_info`` carries the run's ``metrics``: wall time, round
+    count, tokens and latency per agent and per model, and latency per tool.
+
+    When the society has a ``context_compactor``, each record also carries a
+    ``compaction`` report and ``token_info`` the total prompt tokens saved.
+
+    If ``convergence_checker`` reports a complete answer before ``TASK_DONE``,
+    the loop stops early and the last record (and its ``token_info``) carries
+    an ``early_exit`` entry with upper bounds of the rounds and tokens saved
+    (``max_rounds_saved`` and ``max_tokens_saved``): the society might have
+    said ``TASK_DONE`` before the round limit anyway.
+
+    When ``OWL_RECORD_DIR`` is set, the run's model and tool calls are
+    recorded into a cassette there, see :class:`CassetteRecorder`.
+    """
+    recorder = CassetteRecorder.from_env(society)
+    if recorder is not None:
+        recorder.attach()
+    metrics = RunMetrics()
+    metrics.attach({"user": society.user_agent, "assistant": society.assistant_agent})
+    try:
+        input_msg = society.init_chat(INIT_PROMPT)
+        for _round in range(round_limit):
+            assistant_response, user_response = society.step(input_msg)
+            terminated = (
+                assistant_response.terminated
+                or user_response.terminated
+                or "TASK_DONE" in user_response.msg.content
+            )
+            record = _finish_round(
+                metrics,
+                _round,
+                round_limit,
+                assistant_response,
+                user_response,
+                terminated,
+                convergence_checker,
+            )
+            if recorder is not None:
+                recorder.end_round(record)
+            yield record
 
-    return answer, chat_history, token_info
+            if record["terminated"]:
+                break
 
+            input_msg = assistant_response.msg
+    finally:
+        metrics.detach()
+        if recorder is not None:
+            recorder.detach()
+            recorder.save()
 
-async def arun_society(
+
+async def aiter_society(
     society: OwlRolePlaying,
     round_limit: int = 15,
-) -> Tuple[str, List[dict], dict]:
-    overall_completion_token_count = 0
-    overall_prompt_token_count = 0
-
-    chat_history = []
-    init_prompt = """
-    Now please give me instructions to solve over overall task step by step. If the task requires some specific knowledge, please instruct me to use tools to complete the task.
-        """
-    input_msg = society.init_chat(init_prompt)
-    for _round in range(round_limit):
-        assistant_response, user_response = await society.astep(input_msg)
-        # Check if usage info is available before accessing it
-        if assistant_response.info.get("usage") and user_response.info.get("usage"):
-            overall_prompt_token_count += assistant_response.info["usage"].get(
-                "completion_tokens", 0
+    convergence_checker: Optional[Callable[[dict], bool]] = None,
+) -> AsyncIterator[dict]:
+    r"""Async counterpart of :func:`iter_society`."""
+    recorder = CassetteRecorder.from_env(society)
+    if recorder is not None:
+        recorder.attach()
+    metrics = RunMetrics()
+    metrics.attach({"user": society.user_agent, "assistant": society.assistant_agent})
+    try:
+        input_msg = society.init_chat(INIT_PROMPT)
+        for _round in range(round_limit):
+            assistant_response, user_response = await society.astep(input_msg)
+            # Check other termination conditions
+            terminated = (
+                assistant_response.terminated
+                or user_response.terminated
+                or "TASK_DONE" in user_response.msg.content
+                or "任务已完成" in user_response.msg.content
+            )
+            record = _finish_round(
+                metrics,
+                _round,
+                round_limit,
+                assistant_response,
+                user_response,
+                terminated,
+                convergence_checker,
             )
-            overall_prompt_token_count += assistant_response.info["usage"].get(
-                "prompt_tokens", 0
-            ) + user_response.info["usage"].get("prompt_tokens", 0)
-
-        # convert tool call to dict
-        tool_call_records: List[dict] = []
-        if assistant_response.info.get("tool_calls"):
-            for tool_call in assistant_response.info["tool_calls"]:
-                tool_call_records.append(tool_call.as_dict())
-
-        _data = {
-            "user": user_response.msg.content
-            if hasattr(user_response, "msg") and user_response.msg
-            else "",
-            "assistant": assistant_response.msg.content
-            if hasattr(assistant_response, "msg") and assistant_response.msg
-            else "",
-            "tool_calls": tool_call_records,
+            if recorder is not None:
+                recorder.end_round(record)
+            yield record
+
+            if record["terminated"]:
+                break
+
+            input_msg = assistant_response.msg
+    finally:
+        metrics.detach()
+        if recorder is not None:
+            recorder.detach()
+            recorder.save()
+
+
+def _collect_round(record: dict, chat_history: List[dict]) -> dict:
+    chat_history.append(
+        {
+            "user": record["user"],
+            "assistant": record["assistant"],
+            "tool_calls": record["tool_calls"],
         }
+    )
+    return record["token_info"]
 
-        chat_history.append(_data)
-        logger.info(
-            f"Round #{_round} user_response:\n {user_response.msgs[0].content if user_response.msgs and len(user_response.msgs) > 0 else ''}"
-        )
-        logger.info(
-            f"Round #{_round} assistant_response:\n {assistant_response.msgs[0].content if assistant_response.msgs and len(assistant_response.msgs) > 0 else ''}"
-        )
 
-        # Check other termination conditions
-        if (
-            assistant_response.terminated
-            or user_response.terminated
-            or "TASK_DONE" in user_response.msg.content
-            or "任务已完成" in user_response.msg.content
-        ):
-            break
+def run_society(
+    society: OwlRolePlaying,
+    round_limit: int = 15,
+    on_round: Optional[Callable[[dict], None]] = None,
+    convergence_checker: Optional[Callable[[dict], bool]] = None,
+) -> Tuple[str, List[dict], dict]:
+    r"""Run the society to completion.
+
+    Args:
+        society (OwlRolePlaying): The society to run.
+        round_limit (int): Maximum number of rounds.
+        on_round (Callable, optional): Called with each round record from
+            :func:`iter_society` as soon as the round finishes.
+        convergence_checker (Callable, optional): Stops the loop early once
+            it reports a complete answer, see :class:`ConvergenceChecker`.
+
+    Returns:
+        Tuple[str, List[dict], dict]: The final answer, the chat history and
+            the token info, whose ``metrics`` entry holds the run's
+            :class:`RunMetrics` snapshot.
+    """
+    chat_history: List[dict] = []
+    token_info = {"completion_token_count": 0, "prompt_token_count": 0}
+    for record in iter_society(society, round_limit, convergence_checker):
+        token_info = _collect_round(record, chat_history)
+        if on_round is not None:
+            on_round(record)
 
-        input_msg = assistant_response.msg
+    answer = chat_history[-1]["assistant"]
+    return answer, chat_history, token_info
+
+
+async def arun_society(
+    society: OwlRolePlaying,
+    round_limit: int = 15,
+    on_round: Optional[Callable[[dict], None]] = None,
+    convergence_checker: Optional[Callable[[dict], bool]] = None,
+) -> Tuple[str, List[dict], dict]:
+    r"""Async counterpart of :func:`run_society`."""
+    chat_history: List[dict] = []
+    token_info = {"completion_token_count": 0, "prompt_token_count": 0}
+    async for record in aiter_society(society, round_limit, convergence_checker):
+        token_info = _collect_round(record, chat_history)
+        if on_round is not None:
+            on_round(record)
 
     answer = chat_history[-1]["assistant"]
-    token_info = {
-        "completion_token_count": overall_completion_token_count,
-        "prompt_token_count": overall_prompt_token_count,
-    }
+    return answer, chat_history, token_info
 
-    return answer, chat_history, token_info
\ No newline at end of file
+
+def print_round_event(record: dict) -> None:
+    r"""Print a round record as line-delimited JSON events on stdout.
+
+    One ``round`` event is printed per round, followed by one ``tool_call``
+    event per tool call. The API server relays them to job subscribers.
+    Pass this as ``on_round`` to :func:`run_society`.
+
+    Tool results (whole crawled pages and documents) are left out of the
+    events: the API server keeps every event of recent jobs in memory.
+    """
+    tool_calls = [
+        {"tool_name": tool_call.get("tool_name"), "args": tool_call.get("args")}
+        for tool_call in record["tool_calls"]
+    ]
+    events = [{"event": "round", "data": dict(record, tool_calls=tool_calls)}]
+    for tool_call in tool_calls:
+        events.append(
+            {"event": "tool_call", "data": {"round": record["round"], **tool_call}}
+        )
+    for event in events:
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        print(f"{EVENT_PREFIX}{line}", flush=True)
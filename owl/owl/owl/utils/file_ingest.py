@@ -0,0 +1,460 @@
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+
+import os
+import json
+import time
+import random
+import hashlib
+import tarfile
+import zipfile
+import mimetypes
+import tempfile
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+from xml.etree import ElementTree
+
+import requests
+
+from camel.logger import get_logger
+
+logger = get_logger(__name__)
+
+MB = 1024 * 1024
+# Downloads larger than this are aborted
+MAX_DOWNLOAD_BYTES = int(os.getenv("OWL_DOWNLOAD_MAX_MB", "1024")) * MB
+# A download of the same URL is reused for this many seconds
+DOWNLOAD_REUSE_SECONDS = 24 * 3600
+# Limits of archive extraction, guarding against zip bombs
+MAX_ARCHIVE_BYTES = int(os.getenv("OWL_ARCHIVE_MAX_MB", "1024")) * MB
+MAX_ARCHIVE_ENTRIES = int(os.getenv("OWL_ARCHIVE_MAX_ENTRIES", "10000"))
+# JSON, JSONL and XML files up to this size are returned in full, larger ones
+# as a summary with samples
+MAX_INLINE_BYTES = int(os.getenv("OWL_INLINE_FILE_MB", "1")) * MB
+SAMPLE_RECORDS = 5
+# Largest single item of a JSON file read while summarizing
+MAX_JSON_ITEM_CHARS = 64 * MB
+# Longest sample value in a summary, in characters
+MAX_SAMPLE_CHARS = 500
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz")
+CHUNK_SIZE = 1 << 16
+
+
+class IngestLimitError(ValueError):
+    r"""Raised when a download or archive exceeds its size limits."""
+
+
+def download_file(
+    url: str,
+    download_dir: str,
+    response: Optional[requests.Response] = None,
+    session: Optional[requests.Session] = None,
+    max_bytes: int = MAX_DOWNLOAD_BYTES,
+) -> str:
+    r"""Stream a URL to a file named by the SHA-256 of its content.
+
+    The body is hashed while it is written to a temporary file, so memory use
+    does not depend on the file size. Identical content downloaded from
+    different URLs is stored once, and a URL downloaded within
+    :obj:`DOWNLOAD_REUSE_SECONDS` is not requested again.
+
+    Args:
+        url (str): The URL to download.
+        download_dir (str): Directory of the downloads.
+        response (requests.Response, optional): An open streamed response of
+            the URL to read instead of making a request.
+        session (requests.Session, optional): Session for the request.
+        max_bytes (int): Size limit of the download.
+            (default: :obj:`MAX_DOWNLOAD_BYTES`)
+
+    Returns:
+        str: Path of the downloaded file, with the URL's file extension.
+    """
+    os.makedirs(download_dir, exist_ok=True)
+    # the URL points to the file it was last downloaded to
+    pointer = os.path.join(download_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".url")
+    try:
+        if time.time() - os.path.getmtime(pointer) < DOWNLOAD_REUSE_SECONDS:
+            with open(pointer, "r", encoding="utf-8") as f:
+                file_path = os.path.join(download_dir, f.read().strip())
+            if os.path.isfile(file_path):
+                if response is not None:
+                    response.close()
+                return file_path
+    except OSError:
+        pass
+
+    if response is None:
+        response = (session or requests).get(url, stream=True, timeout=(5, 60))
+    with response:
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+        extension = file_extension(url) or mimetypes.guess_extension(content_type) or ""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=download_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise IngestLimitError(
+                            f"Download of {url} exceeds {max_bytes // MB} MB"
+                        )
+                    digest.update(chunk)
+                    f.write(chunk)
+            file_name = digest.hexdigest()[:32] + extension
+            file_path = os.path.join(download_dir, file_name)
+            if os.path.exists(file_path):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    _write_atomic(pointer, file_name)
+    return file_path
+
+
+def file_extension(path: str) -> str:
+    r"""Lower-case extension of a local path or the path of a URL, with
+    compound archive extensions such as ``.tar.gz`` kept whole. ``""`` when
+    there is none (e.g. ``https://en.wikipedia.org/wiki/Qatar``)."""
+    parsed_url = urlparse(path)
+    if parsed_url.scheme and parsed_url.netloc:
+        path = parsed_url.path
+    path = path.lower()
+    for extension in ARCHIVE_EXTENSIONS:
+        if path.endswith(extension):
+            return extension
+    return os.path.splitext(path)[1]
+
+
+def _write_atomic(path: str, text: str) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def is_archive(path: str) -> bool:
+    return file_extension(path) in ARCHIVE_EXTENSIONS
+
+
+def extract_archive(
+    archive_path: str,
+    extract_dir: str,
+    max_bytes: int = MAX_ARCHIVE_BYTES,
+    max_entries: int = MAX_ARCHIVE_ENTRIES,
+) -> List[str]:
+    r"""Extract a zip or tar archive in-process, within size limits.
+
+    The limits are checked against the sizes the archive declares before
+    anything is written, and against the bytes actually written while
+    extracting. Entries pointing outside ``extract_dir`` are skipped. An
+    archive already extracted to ``extract_dir`` is not extracted again.
+
+    Args:
+        archive_path (str): Path of the archive.
+        extract_dir (str): Directory to extract to.
+        max_bytes (int): Limit of the total uncompressed size.
+            (default: :obj:`MAX_ARCHIVE_BYTES`)
+        max_entries (int): Limit of the number of files.
+            (default: :obj:`MAX_ARCHIVE_ENTRIES`)
+
+    Returns:
+        List[str]: Paths of the extracted files.
+    """
+    manifest = os.path.join(extract_dir, ".owl_extracted.json")
+    if os.path.exists(manifest):
+        with open(manifest, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    if archive_path.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as archive:
+            entries = [
+                (info.filename, info.file_size, info)
+                for info in archive.infolist()
+                if not info.is_dir()
+            ]
+            files = _extract_entries(
+                entries, archive.open, extract_dir, max_bytes, max_entries
+            )
+    else:
+        with tarfile.open(archive_path) as archive:
+            # links and devices are not extracted
+            entries = [
+                (member.name, member.size, member)
+                for member in archive.getmembers()
+                if member.isfile()
+            ]
+            files = _extract_entries(
+                entries, archive.extractfile, extract_dir, max_bytes, max_entries
+            )
+
+    _write_atomic(manifest, json.dumps(files, ensure_ascii=False))
+    return files
+
+
+def _extract_entries(entries, open_entry, extract_dir, max_bytes, max_entries) -> List[str]:
+    if len(entries) > max_entries:
+        raise IngestLimitError(f"Archive has {len(entries)} files, the limit is {max_entries}")
+    declared = sum(size for _, size, _ in entries)
+    if declared > max_bytes:
+        raise IngestLimitError(
+            f"Archive expands to {declared // MB} MB, the limit is {max_bytes // MB} MB"
+        )
+
+    root = os.path.realpath(extract_dir)
+    os.makedirs(root, exist_ok=True)
+    files, written = [], 0
+    for name, _, entry in entries:
+        target = os.path.realpath(os.path.join(root, name))
+        if os.path.commonpath([root, target]) != root:
+            logger.warning(f"Skipping archive entry outside the target directory: {name}")
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open_entry(entry) as source, open(target, "wb") as f:
+            # declared sizes can lie, count what is written
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise IngestLimitError(
+                        f"Archive expands to more than {max_bytes // MB} MB"
+                    )
+                f.write(chunk)
+        files.append(target)
+    return files
+
+
+def _clip(value: Any) -> Any:
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    if len(text) <= MAX_SAMPLE_CHARS:
+        return value
+    return text[:MAX_SAMPLE_CHARS] + f"... [{len(text) - MAX_SAMPLE_CHARS} more characters]"
+
+
+class _Sampler:
+    r"""First records plus a reservoir sample of the rest, and the counts of
+    the fields of object records."""
+
+    def __init__(self, size: int = SAMPLE_RECORDS):
+        self.size = size
+        self.count = 0
+        self.head: List[Any] = []
+        self.reservoir: List[Any] = []
+        self.fields: Dict[str, int] = {}
+        self._random = random.Random(0)
+
+    def add(self, record: Any) -> None:
+        if isinstance(record, dict):
+            for key in record:
+                self.fields[key] = self.fields.get(key, 0) + 1
+        self.add_lazy(lambda: record)
+
+    def add_lazy(self, make: Callable[[], Any]) -> None:
+        r"""Count a record, building it with ``make`` only if it is sampled."""
+        self.count += 1
+        if len(self.head) < self.size:
+            self.head.append(_clip(make()))
+            return
+        seen = self.count - self.size
+        if len(self.reservoir) < self.size:
+            self.reservoir.append(_clip(make()))
+        else:
+            slot = self._random.randrange(seen)
+            if slot < self.size:
+                self.reservoir[slot] = _clip(make())
+
+    def summary(self) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {"records": self.count, "first_records": self.head}
+        if self.reservoir:
+            summary["random_records"] = self.reservoir
+        if self.fields:
+            summary["fields"] = self.fields
+        return summary
+
+
+def iter_json_items(f, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[Any, Any]]:
+    r"""Iterate over the items of the top-level array or object of a JSON
+    file without loading it: yields ``(index, value)`` or ``(key, value)``.
+    Only one item is held in memory at a time."""
+    decoder = json.JSONDecoder()
+    buffer, eof = "", False
+
+    def fill() -> bool:
+        nonlocal buffer, eof
+        if eof:
+            return False
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+        return bool(chunk)
+
+    def skip(chars: str) -> str:
+        # skip whitespace and the given separators, returning the next char
+        nonlocal buffer
+        while True:
+            stripped = buffer.lstrip()
+            while stripped and stripped[0] in chars:
+                stripped = stripped[1:].lstrip()
+            buffer = stripped
+            if buffer or not fill():
+                return buffer[:1]
+
+    def decode() -> Any:
+        nonlocal buffer
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer)
+                # a number may continue in the next chunk
+                if (
+                    not eof
+                    and not isinstance(value, (dict, list, str))
+                    and (end == len(buffer) or buffer[end] not in ",]}: \t\r\n")
+                ):
+                    raise json.JSONDecodeError("Incomplete value", buffer, end)
+            except json.JSONDecodeError:
+                if len(buffer) > MAX_JSON_ITEM_CHARS:
+                    raise IngestLimitError("A JSON item is too large to read")
+                if not fill():
+                    raise
+                continue
+            buffer = buffer[end:]
+            return value
+
+    first = skip("")
+    if first not in ("[", "{"):
+        yield None, decode()
+        return
+    buffer = buffer[1:]
+    closing = "]" if first == "[" else "}"
+    index = 0
+    while True:
+        char = skip(",")
+        if char == closing or not char:
+            return
+        if first == "[":
+            yield index, decode()
+            index += 1
+        else:
+            key = decode()
+            skip(":")
+            yield key, decode()
+
+
+def summarize_json(path: str) -> Dict[str, Any]:
+    r"""Summary of a large JSON or JSONL file, read incrementally."""
+    sampler = _Sampler()
+    summary: Dict[str, Any] = {"file": path, "bytes": os.path.getsize(path)}
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        if path.lower().endswith(".jsonl"):
+            summary["format"] = "jsonl"
+            invalid = 0
+            for line in f:
+                if line.strip():
+                    try:
+                        sampler.add(json.loads(line))
+                    except json.JSONDecodeError:
+                        invalid += 1
+            if invalid:
+                summary["invalid_lines"] = invalid
+        else:
+            summary["format"] = "json"
+            keys = []
+            try:
+                for key, value in iter_json_items(f):
+                    sampler.add(value)
+                    if isinstance(key, str) and len(keys) < 100:
+                        keys.append(key)
+            except (json.JSONDecodeError, IngestLimitError) as e:
+                summary["error"] = f"Stopped reading after {sampler.count} items: {e}"
+            if keys:
+                summary["top_level_keys"] = keys
+    summary.update(sampler.summary())
+    return summary
+
+
+def summarize_xml(path: str) -> Dict[str, Any]:
+    r"""Summary of a large XML file, parsed incrementally: the root element,
+    the counts of the element paths up to three levels deep and samples of
+    the root's children."""
+    import xmltodict
+
+    sampler = _Sampler()
+    paths: Dict[str, int] = {}
+    stack: List[str] = []
+    root = None
+    for event, element in ElementTree.iterparse(path, events=("start", "end")):
+        if event == "start":
+            stack.append(element.tag)
+            if root is None:
+                root = element
+            if len(stack) <= 3:
+                key = "/".join(stack)
+                paths[key] = paths.get(key, 0) + 1
+            continue
+        stack.pop()
+        if len(stack) == 1:
+            # a child of the root is complete: sample it, then free it
+            sampler.add_lazy(lambda: xmltodict.parse(ElementTree.tostring(element)))
+            root.clear()
+    summary = {
+        "file": path,
+        "bytes": os.path.getsize(path),
+        "format": "xml",
+        "root": root.tag if root is not None else None,
+        "element_counts": paths,
+    }
+    summary.update(sampler.summary())
+    return summary
+
+
+def read_structured_file(path: str, max_inline_bytes: int = MAX_INLINE_BYTES) -> Any:
+    r"""Content of a JSON, JSONL or XML file: parsed in full when it is small,
+    otherwise a summary with sample records.
+
+    Args:
+        path (str): Path of the file.
+        max_inline_bytes (int): Largest file returned in full.
+            (default: :obj:`MAX_INLINE_BYTES`)
+
+    Returns:
+        Any: The parsed content, or a string with the summary.
+    """
+    lower = path.lower()
+    if os.path.getsize(path) > max_inline_bytes:
+        summary = summarize_xml(path) if lower.endswith(".xml") else summarize_json(path)
+        summary["note"] = (
+            "The file is too large to return in full; this is a summary with sample records. "
+            "Process the full file with code if more detail is needed."
+        )
+        return json.dumps(summary, ensure_ascii=False, indent=2, default=str)
+
+    with open(path, "r", encoding="utf-8") as f:
+        if lower.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        if lower.endswith(".xml"):
+            import xmltodict
+
+            content = f.read()
+            try:
+                return xmltodict.parse(content)
+            except Exception:
+                logger.debug(f"The raw xml data is: {content}")
+                return content
+        return json.load(f)
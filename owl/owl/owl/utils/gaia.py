@@ -15,12 +15,19 @@ import sys
 
 sys.path.append("../")
 
+import os
 import json
+import time
+import pickle
 import random
 import re
 import string
+import functools
+import traceback
+import multiprocessing
+from multiprocessing.connection import wait
 from pathlib import Path
-from typing import Any, Dict, List, Literal, Optional, Union, Tuple
+from typing import Any, Callable, Dict, List, Literal, Optional, Set, Union, Tuple
 
 from tqdm import tqdm
 from camel.benchmarks import BaseBenchmark
@@ -28,21 +35,131 @@ from camel.tasks import Task
 from camel.logger import get_logger
 
 from .common import extract_pattern
-from .enhanced_role_playing import run_society, OwlGAIARolePlaying
+from .enhanced_role_playing import run_society, OwlGAIARolePlaying, ContextCompactor
 
 logger = get_logger(__name__)
 
+AgentKwargsFactory = Callable[[], Tuple[dict, dict]]
+
+
+def _solve_task(
+    task: Dict[str, Any],
+    user_role_name: str,
+    assistant_role_name: str,
+    user_agent_kwargs: dict,
+    assistant_agent_kwargs: dict,
+    context_compactor: Optional[ContextCompactor] = None,
+) -> Tuple[str, List[dict], dict]:
+    r"""Run the society of one task, returning the output of
+    :func:`run_society`."""
+    logger.info(f"Task Question: {task['Question']}")
+    logger.info(f"Required tools: {task['Annotator Metadata']['Tools']}")
+
+    task_kwargs = {
+        "task_prompt": task["Question"],
+        "with_task_specify": False,
+    }
+
+    society = OwlGAIARolePlaying(
+        **task_kwargs,
+        user_role_name=user_role_name,
+        user_agent_kwargs=user_agent_kwargs,
+        assistant_role_name=assistant_role_name,
+        assistant_agent_kwargs=assistant_agent_kwargs,
+        context_compactor=context_compactor,
+    )
+
+    return run_society(society)
+
+
+def _agent_kwargs(user_agent_kwargs: dict, assistant_agent_kwargs: dict) -> Tuple[dict, dict]:
+    return user_agent_kwargs, assistant_agent_kwargs
+
+
+def _task_worker_main(conn, agent_kwargs_factory, user_role_name, assistant_role_name, context_compactor):
+    r"""Entry point of a worker process: builds its own models and tools
+    once, then solves the tasks it receives until it gets ``None``."""
+    try:
+        user_agent_kwargs, assistant_agent_kwargs = agent_kwargs_factory()
+    except Exception:
+        conn.send(("failed", traceback.format_exc()))
+        return
+    conn.send(("ready", None))
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        try:
+            output = _solve_task(
+                task,
+                user_role_name,
+                assistant_role_name,
+                user_agent_kwargs,
+                assistant_agent_kwargs,
+                context_compactor,
+            )
+            conn.send(("done", output))
+        except Exception:
+            conn.send(("error", traceback.format_exc()))
+    conn.close()
+
+
+class _TaskWorker:
+    r"""A worker process of :meth:`GAIABenchmark.run`, solving one task at a
+    time."""
+
+    def __init__(self, ctx, worker_args: tuple):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_task_worker_main, args=(child_conn, *worker_args))
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.task: Optional[Dict[str, Any]] = None
+        self.deadline: Optional[float] = None
+
+    def assign(self, task: Dict[str, Any], timeout: Optional[float]) -> None:
+        self.conn.send(task)
+        self.task = task
+        self.deadline = time.monotonic() + timeout if timeout else None
+
+    def release(self) -> Dict[str, Any]:
+        task, self.task, self.deadline = self.task, None, None
+        return task
+
+    def stop(self, timeout: float = 5) -> None:
+        try:
+            self.conn.send(None)
+        except (EOFError, OSError):
+            pass
+        self.process.join(timeout)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+        self.conn.close()
+
 
 class GAIABenchmark(BaseBenchmark):
     r"""GAIA Benchmark adapted from `"GAIA: a benchmark for General AI
     Assistants"
     <https://huggingface.co/datasets/gaia-benchmark/GAIA>`_.
 
+    Results are appended to a JSONL log next to ``save_to`` (e.g.
+    ``result.jsonl`` for ``result.json``) as each task finishes, and a run
+    resumes from that log. :meth:`export_results` writes the results to
+    ``save_to`` as a JSON list.
+
     Args:
         data_dir (str): The directory to save the data.
         save_to (str): The file to save the results.
-        processes (int, optional): The number of processes to use.
-            (default: :obj:`1`)
+        processes (int, optional): The number of processes to use. With more
+            than one, :meth:`run` solves that many tasks at once in worker
+            processes. (default: :obj:`1`)
     """
 
     def __init__(
@@ -60,6 +177,9 @@ class GAIABenchmark(BaseBenchmark):
                 parallel processing. (default: :obj:`1`)
         """
         super().__init__("gaia", data_dir, save_to, processes)
+        log_file = str(Path(save_to).with_suffix(".jsonl"))
+        self.log_file = log_file if log_file != str(save_to) else f"{save_to}.log"
+        self._completed: Set[str] = set()
 
     def download(self):
         r"""Download the GAIA dataset."""
@@ -73,10 +193,121 @@ class GAIABenchmark(BaseBenchmark):
         )
 
     def _check_task_completed(self, task_id: str) -> bool:
-        for data in self._results:
-            if data["task_id"] == task_id:
-                return True
-        return False
+        return task_id in self._completed
+
+    @staticmethod
+    def _is_completed(result: Dict[str, Any]) -> bool:
+        # results with an error (e.g. a timeout) are retried by the next run
+        return "error" not in result
+
+    def _load_results(self) -> None:
+        r"""Load the results of earlier runs from the result log, or from the
+        ``save_to`` JSON of runs that predate the log."""
+        self._results = []
+        self._completed = set()
+        if os.path.exists(self.log_file):
+            results: Dict[str, Dict[str, Any]] = {}
+            with open(self.log_file, "rb+") as f:
+                end = 0
+                for line_number, line in enumerate(f, start=1):
+                    if not line.endswith(b"\n"):
+                        # cut short by an interrupted run, drop it so that the
+                        # next result starts on a line of its own
+                        logger.warning(
+                            f"Dropping incomplete line {line_number} of {self.log_file}"
+                        )
+                        f.truncate(end)
+                        break
+                    end += len(line)
+                    if not line.strip():
+                        continue
+                    try:
+                        result = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(
+                            f"Skipping unreadable line {line_number} of {self.log_file}"
+                        )
+                        continue
+                    results[result["task_id"]] = result
+            self._results = list(results.values())
+        elif os.path.exists(self.save_to):
+            try:
+                with open(self.save_to, "r", encoding="utf-8") as f:
+                    self._results = json.load(f)
+            except Exception as e:
+                logger.warning(e)
+            # start the log from the legacy results
+            self._rewrite_log()
+        self._completed = {
+            result["task_id"] for result in self._results if self._is_completed(result)
+        }
+
+    def _record_result(self, result: Dict[str, Any], save_result: bool) -> None:
+        r"""Keep the result of a task, appending it to the result log."""
+        if any(r["task_id"] == result["task_id"] for r in self._results):
+            # a retry of a task that failed in an earlier run
+            self._results = [r for r in self._results if r["task_id"] != result["task_id"]]
+        self._results.append(result)
+        if self._is_completed(result):
+            self._completed.add(result["task_id"])
+        if not save_result:
+            return
+        line = json.dumps(result, ensure_ascii=False) + "\n"
+        os.makedirs(os.path.dirname(self.log_file) or ".", exist_ok=True)
+        # one write per line, flushed to disk, so an interrupted run loses at
+        # most the line being written
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def export_results(self, path: Optional[str] = None) -> str:
+        r"""Compact the result log, keeping the last result of each task, and
+        write the results as one JSON list in the format of earlier versions.
+
+        Args:
+            path (str, optional): The file to write, ``save_to`` by default.
+
+        Returns:
+            str: The path of the written file.
+        """
+        path = path or self.save_to
+        if os.path.exists(self.log_file):
+            # results in memory are the latest and keep their order, followed
+            # by the logged results of tasks not run since
+            results = {result["task_id"]: result for result in self._results}
+            self._load_results()
+            for result in self._results:
+                results.setdefault(result["task_id"], result)
+            self._results = list(results.values())
+            self._completed = {
+                task_id for task_id, result in results.items() if self._is_completed(result)
+            }
+            self._rewrite_log()
+        self._write_atomic(
+            path, json.dumps(self._results, indent=4, ensure_ascii=False)
+        )
+        return path
+
+    def _rewrite_log(self) -> None:
+        self._write_atomic(
+            self.log_file,
+            "".join(
+                json.dumps(result, ensure_ascii=False) + "\n"
+                for result in self._results
+            ),
+        )
+
+    @staticmethod
+    def _write_atomic(path: str, content: str) -> None:
+        r"""Replace a file, so that readers never see it half written."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
 
     def dump_tasks(self, save_path: str, datas):
         constructed_data = []
@@ -140,15 +371,58 @@ class GAIABenchmark(BaseBenchmark):
         self,
         user_role_name: str,
         assistant_role_name: str,
-        user_agent_kwargs: dict,
-        assistant_agent_kwargs: dict,
+        user_agent_kwargs: Optional[dict],
+        assistant_agent_kwargs: Optional[dict],
         on: Literal["train", "valid", "test"],
         level: Union[int, List[int], Literal["all"]],
         randomize: bool = False,
         subset: Optional[int] = None,
         idx: Optional[List[int]] = None,
         save_result: bool = False,
+        context_compactor: Optional[ContextCompactor] = None,
+        agent_kwargs_factory: Optional[AgentKwargsFactory] = None,
+        task_timeout: Optional[float] = None,
     ) -> Dict[str, Any]:
+        r"""Run the benchmark.
+
+        With ``processes`` greater than one, or with a ``task_timeout``, tasks
+        are solved in worker processes. Each worker builds its own models
+        and tools with ``agent_kwargs_factory`` and its own
+        :class:`OwlGAIARolePlaying` per task; the results are collected and
+        saved by this process only. A worker exceeding ``task_timeout`` is
+        killed, the task is recorded as failed and a new worker is started.
+
+        Args:
+            user_role_name (str): Role name of the user agent.
+            assistant_role_name (str): Role name of the assistant agent.
+            user_agent_kwargs (dict, optional): Arguments of the user agent.
+                May be :obj:`None` when the tasks are solved in worker
+                processes built with ``agent_kwargs_factory``.
+            assistant_agent_kwargs (dict, optional): Arguments of the
+                assistant agent, see ``user_agent_kwargs``.
+            on (Literal["train", "valid", "test"]): The split to run.
+            level (Union[int, List[int], Literal["all"]]): Levels to run.
+            randomize (bool): Whether to shuffle the tasks.
+                (default: :obj:`False`)
+            subset (int, optional): Number of tasks to run.
+            idx (List[int], optional): Indices of the tasks to run.
+            save_result (bool): Whether to log the results, skip tasks
+                already logged and export them to ``save_to`` at the end.
+                (default: :obj:`False`)
+            context_compactor (ContextCompactor, optional): Compacts the
+                agents' context between rounds.
+            agent_kwargs_factory (Callable[[], Tuple[dict, dict]], optional):
+                Module-level function returning ``(user_agent_kwargs,
+                assistant_agent_kwargs)``, called once in each worker
+                process. Required for worker processes unless the agent
+                kwargs can be pickled. (default: :obj:`None`)
+            task_timeout (float, optional): Seconds a task may run in a worker
+                process. A timed-out task scores 0 and is retried when the
+                run is resumed. (default: :obj:`None`)
+
+        Returns:
+            Dict[str, Any]: The summary of the results.
+        """
         # Validate inputs
         if on not in ["valid", "test"]:
             raise ValueError(
@@ -182,87 +456,209 @@ class GAIABenchmark(BaseBenchmark):
         logger.info(f"Number of tasks: {len(datas)}")
 
         self._results = []
+        self._completed = set()
 
         if save_result:
-            try:
-                with open(self.save_to, "r", encoding="utf-8") as f:
-                    self._results = json.load(f)
-                f.close()
-            except Exception as e:
-                logger.warning(e)
-                # raise FileNotFoundError(f"{self.save_to} does not exist.")
+            self._load_results()
         datas = [
             data for data in datas if not self._check_task_completed(data["task_id"])
         ]
         logger.info(f"Number of tasks to be processed: {len(datas)}")
         # Process tasks
+        if self.processes > 1 or task_timeout is not None:
+            if agent_kwargs_factory is None:
+                if user_agent_kwargs is None or assistant_agent_kwargs is None:
+                    raise ValueError(
+                        "`agent_kwargs_factory` is required when the agent "
+                        "kwargs are not given"
+                    )
+                try:
+                    pickle.dumps((user_agent_kwargs, assistant_agent_kwargs))
+                except Exception as e:
+                    raise ValueError(
+                        "The agent kwargs cannot be sent to worker processes, pass "
+                        f"`agent_kwargs_factory` to build them in each worker: {e}"
+                    )
+                agent_kwargs_factory = functools.partial(
+                    _agent_kwargs, user_agent_kwargs, assistant_agent_kwargs
+                )
+            worker_args = (
+                agent_kwargs_factory,
+                user_role_name,
+                assistant_role_name,
+                context_compactor,
+            )
+            self._run_in_workers(datas, worker_args, task_timeout, save_result)
+            if save_result:
+                self.export_results()
+            return self._generate_summary()
+
+        if user_agent_kwargs is None or assistant_agent_kwargs is None:
+            if agent_kwargs_factory is None:
+                raise ValueError(
+                    "`agent_kwargs_factory` is required when the agent "
+                    "kwargs are not given"
+                )
+            user_agent_kwargs, assistant_agent_kwargs = agent_kwargs_factory()
+
         for task in tqdm(datas, desc="Running"):
             if_prepared_task, info = self._prepare_task(task)
             if not if_prepared_task:
-                _result_info = {
-                    "task_id": task["task_id"],
-                    "question": task["Question"],
-                    "level": task["Level"],
-                    "model_answer": None,
-                    "ground_truth": None,
-                    "score": 0,
-                    "history": None,
-                }
-                self._results.append(_result_info)
+                self._record_result(self._skipped_result(task), save_result)
                 continue
             try:
-                logger.info(f"Task Question: {task['Question']}")
-                logger.info(f"Required tools: {task['Annotator Metadata']['Tools']}")
-
-                task_kwargs = {
-                    "task_prompt": task["Question"],
-                    "with_task_specify": False,
-                }
-
-                society = OwlGAIARolePlaying(
-                    **task_kwargs,
-                    user_role_name=user_role_name,
-                    user_agent_kwargs=user_agent_kwargs,
-                    assistant_role_name=assistant_role_name,
-                    assistant_agent_kwargs=assistant_agent_kwargs,
+                raw_answer, chat_history, token_info = _solve_task(
+                    task,
+                    user_role_name,
+                    assistant_role_name,
+                    user_agent_kwargs,
+                    assistant_agent_kwargs,
+                    context_compactor,
                 )
-
-                raw_answer, chat_history, token_info = run_society(society)
-                try:
-                    answer = extract_pattern(raw_answer, "final_answer")
-                except Exception as e:
-                    logger.error(
-                        f"Error in extracting final answer from text {raw_answer}: {e}"
-                    )
-                    answer = None
-
-                logger.info(
-                    f"Model answer: {answer}, Ground truth: {task['Final answer']}"
+                self._record_result(
+                    self._task_result(task, raw_answer, chat_history, token_info),
+                    save_result,
                 )
 
-                _result_info = {
-                    "task_id": task["task_id"],
-                    "question": task["Question"]
-                    + "Please decompose the task into several sub-tasks and find the answer step-by-step.",
-                    "level": task["Level"],
-                    "model_answer": answer,
-                    "ground_truth": task["Final answer"],
-                    "score": self.question_scorer(answer, task["Final answer"]),
-                    "token_info": token_info,
-                    "history": chat_history,
-                }
-                self._results.append(_result_info)
-
             except Exception as e:
                 logger.error(f"Error in processing task: {e}")
 
-            if save_result:
-                with open(self.save_to, "w") as f:
-                    json.dump(self._results, f, indent=4, ensure_ascii=False)
-                f.close()
-
+        if save_result:
+            self.export_results()
         return self._generate_summary()
 
+    def _run_in_workers(
+        self,
+        datas: List[Dict[str, Any]],
+        worker_args: tuple,
+        task_timeout: Optional[float],
+        save_result: bool,
+    ) -> None:
+        r"""Solve the tasks in ``self.processes`` worker processes. Only this
+        process writes results; progress is reported as tasks complete."""
+        ctx = multiprocessing.get_context("spawn")
+        pending = []
+        progress = tqdm(total=len(datas), desc="Running")
+        for task in datas:
+            if_prepared_task, info = self._prepare_task(task)
+            if if_prepared_task:
+                pending.append(task)
+            else:
+                self._record_result(self._skipped_result(task), save_result)
+                progress.update()
+        order = {task["task_id"]: i for i, task in enumerate(datas)}
+        pending.reverse()
+
+        def finish(task: Dict[str, Any], result: Optional[Dict[str, Any]]) -> None:
+            if result is not None:
+                self._record_result(result, save_result)
+            progress.update()
+            progress.set_postfix_str(f"last: {task['task_id']}")
+
+        workers = [_TaskWorker(ctx, worker_args) for _ in range(min(self.processes, len(pending)))]
+        try:
+            while pending or any(worker.task is not None for worker in workers):
+                for worker in workers:
+                    if worker.ready and worker.task is None and pending:
+                        worker.assign(pending.pop(), task_timeout)
+
+                deadlines = [w.deadline for w in workers if w.deadline is not None]
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                ready_conns = wait([worker.conn for worker in workers], timeout)
+
+                for i, worker in enumerate(list(workers)):
+                    if worker.conn in ready_conns:
+                        try:
+                            kind, payload = worker.conn.recv()
+                        except (EOFError, OSError):
+                            kind, payload = "crashed", f"exit code {worker.process.exitcode}"
+                    elif worker.deadline is not None and time.monotonic() >= worker.deadline:
+                        kind, payload = "timeout", None
+                    else:
+                        continue
+
+                    if kind == "ready":
+                        worker.ready = True
+                        continue
+                    if kind == "failed":
+                        raise RuntimeError(f"Worker process failed to start:\n{payload}")
+                    if kind == "done":
+                        task = worker.release()
+                        try:
+                            result = self._task_result(task, *payload)
+                        except Exception as e:
+                            logger.error(f"Error in processing task {task['task_id']}: {e}")
+                            result = None
+                        finish(task, result)
+                        continue
+
+                    task = worker.release()
+                    if task is None:
+                        raise RuntimeError(f"Worker process exited before its first task: {payload}")
+                    if kind == "timeout":
+                        logger.error(f"Task {task['task_id']} timed out after {task_timeout}s")
+                        finish(task, self._skipped_result(task, f"Timed out after {task_timeout}s"))
+                    else:
+                        logger.error(f"Error in processing task {task['task_id']}: {payload}")
+                        finish(task, None)
+                    if kind != "error":
+                        # the worker is stuck or gone, replace it
+                        worker.kill()
+                        workers[i] = _TaskWorker(ctx, worker_args)
+        finally:
+            progress.close()
+            for worker in workers:
+                worker.stop()
+
+        self._results.sort(key=lambda result: order.get(result["task_id"], -1))
+
+    def _skipped_result(self, task: Dict[str, Any], error: Optional[str] = None) -> Dict[str, Any]:
+        r"""Result of a task that was not solved."""
+        result = {
+            "task_id": task["task_id"],
+            "question": task["Question"],
+            "level": task["Level"],
+            "model_answer": None,
+            "ground_truth": None,
+            "score": 0,
+            "history": None,
+        }
+        if error is not None:
+            result["error"] = error
+        return result
+
+    def _task_result(
+        self,
+        task: Dict[str, Any],
+        raw_answer: str,
+        chat_history: List[dict],
+        token_info: dict,
+    ) -> Dict[str, Any]:
+        r"""Score the answer of a solved task."""
+        try:
+            answer = extract_pattern(raw_answer, "final_answer")
+        except Exception as e:
+            logger.error(
+                f"Error in extracting final answer from text {raw_answer}: {e}"
+            )
+            answer = None
+
+        logger.info(
+            f"Model answer: {answer}, Ground truth: {task['Final answer']}"
+        )
+
+        return {
+            "task_id": task["task_id"],
+            "question": task["Question"]
+            + "Please decompose the task into several sub-tasks and find the answer step-by-step.",
+            "level": task["Level"],
+            "model_answer": answer,
+            "ground_truth": task["Final answer"],
+            "score": self.question_scorer(answer, task["Final answer"]),
+            "token_info": token_info,
+            "history": chat_history,
+        }
+
     def _prepare_task(self, task: Dict[str, Any]) -> Tuple[bool, str]:
         r"""Prepare the task by validating and enriching its data."""
         if task["file_name"]:
@@ -0,0 +1,301 @@
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+
+import os
+import re
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+from camel.logger import get_logger
+
+logger = get_logger(__name__)
+
+TEXT_EXTENSIONS = (".txt", ".md", ".markdown", ".csv", ".tsv", ".log", ".rst")
+HTML_EXTENSIONS = (".html", ".htm")
+
+# Elements that never hold the main content of a page
+NON_CONTENT_TAGS = [
+    "script", "style", "noscript", "iframe", "svg", "canvas", "form", "button",
+    "template", "nav", "header", "footer", "aside",
+]
+# class/id hints of readability: boilerplate blocks and content blocks
+BOILERPLATE_PATTERN = re.compile(
+    r"comment|sidebar|footer|footnote-nav|menu|nav|banner|breadcrumb|share|social"
+    r"|related|recommend|cookie|popup|modal|subscribe|advert|\bad-|\bads\b|sponsor",
+    re.I,
+)
+CONTENT_PATTERN = re.compile(r"article|content|main|post|entry|text|body|story", re.I)
+
+# Unreadable characters: replacement char, control chars and private use area
+# glyphs, which PDFs with broken font encodings produce instead of text
+BAD_CHAR_PATTERN = re.compile(r"[\ufffd\x00-\x08\x0b\x0c\x0e-\x1f\ue000-\uf8ff]")
+
+# PDFs with fewer pages are extracted in-process
+PARALLEL_MIN_PAGES = 32
+
+
+def _open_pdf(path: str):
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    return pymupdf.open(path)
+
+
+def _pdf_page_texts(path: str, start: int, stop: int) -> List[str]:
+    r"""Text of the pages ``[start, stop)``; runs in the process pool."""
+    try:
+        with _open_pdf(path) as doc:
+            return [doc[i].get_text() for i in range(start, stop)]
+    except ImportError:
+        from pypdf import PdfReader
+
+        reader = PdfReader(path)
+        return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def pdf_page_count(path: str) -> int:
+    try:
+        with _open_pdf(path) as doc:
+            return doc.page_count
+    except ImportError:
+        from pypdf import PdfReader
+
+        return len(PdfReader(path).pages)
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    r"""Process pool shared by all extractors, sized by the
+    ``OWL_EXTRACT_PROCESSES`` environment variable (default: up to 4, one per
+    CPU). Returns ``None`` when it is set to 0 or processes cannot be started
+    here (e.g. inside a daemon process)."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            processes = int(
+                os.getenv("OWL_EXTRACT_PROCESSES", str(min(4, os.cpu_count() or 1)))
+            )
+            if processes <= 0 or multiprocessing.current_process().daemon:
+                return None
+            # spawn rather than fork: the toolkit runs in multi-threaded processes
+            _process_pool = ProcessPoolExecutor(
+                processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def extract_pdf_text(path: str, pool: Optional[ProcessPoolExecutor] = None) -> Tuple[List[str], int]:
+    r"""Extract the text of each page of a PDF.
+
+    Large PDFs are split into page ranges extracted in parallel by the
+    process pool.
+
+    Args:
+        path (str): Path of the PDF.
+        pool (ProcessPoolExecutor, optional): Pool for large PDFs; extracts
+            in-process if ``None``.
+
+    Returns:
+        Tuple[List[str], int]: The text of each page and the page count.
+    """
+    pages = pdf_page_count(path)
+    if pool is None or pages < PARALLEL_MIN_PAGES:
+        return _pdf_page_texts(path, 0, pages), pages
+
+    step = -(-pages // pool._max_workers)
+    try:
+        futures = [
+            pool.submit(_pdf_page_texts, path, start, min(start + step, pages))
+            for start in range(0, pages, step)
+        ]
+        texts: List[str] = []
+        for future in futures:
+            texts.extend(future.result())
+    except BrokenProcessPool as e:
+        logger.warning(f"PDF process pool failed, extracting in-process: {e}")
+        return _pdf_page_texts(path, 0, pages), pages
+    return texts, pages
+
+
+def _text_length(node) -> int:
+    return len(node.get_text(" ", strip=True))
+
+
+def _link_density(node) -> float:
+    length = _text_length(node)
+    if not length:
+        return 1.0
+    return sum(_text_length(a) for a in node.find_all("a")) / length
+
+
+def _main_content(soup):
+    r"""Readability-style pass: drop boilerplate and return the element that
+    most likely holds the main content of the page."""
+    for tag in soup(NON_CONTENT_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(True):
+        if tag.decomposed or tag.name in ("html", "body", "article", "main"):
+            continue
+        hints = " ".join(tag.get("class") or []) + " " + (tag.get("id") or "")
+        if BOILERPLATE_PATTERN.search(hints) and not CONTENT_PATTERN.search(hints):
+            tag.decompose()
+
+    body = soup.body or soup
+    body_length = _text_length(body)
+    if not body_length:
+        return body
+
+    # pages that mark up their content
+    marked = soup.find_all(["article", "main"]) + soup.find_all(attrs={"role": "main"})
+    if marked:
+        best = max(marked, key=_text_length)
+        if _text_length(best) >= 0.25 * body_length:
+            return best
+
+    # otherwise score the parents of paragraphs by the text they hold
+    # (tags compare by content, so they are keyed by id)
+    nodes, scores = {}, {}
+    for paragraph in soup.find_all(["p", "pre", "td", "blockquote"]):
+        text = paragraph.get_text(" ", strip=True)
+        if len(text) < 25:
+            continue
+        score = 1 + text.count(",") + text.count("，") + min(len(text) / 100, 3)
+        parent = paragraph.parent
+        for node, weight in ((parent, 1.0), (parent.parent if parent else None, 0.5)):
+            if node is not None:
+                nodes[id(node)] = node
+                scores[id(node)] = scores.get(id(node), 0) + score * weight
+    if not scores:
+        return body
+    best = nodes[max(scores, key=lambda key: scores[key] * (1 - _link_density(nodes[key])))]
+    if _text_length(best) < 0.25 * body_length:
+        return body
+    return best
+
+
+def html_to_markdown(html: str, base_url: str = "") -> str:
+    r"""Convert the main content of an HTML page to markdown."""
+    import html2text
+    from bs4 import BeautifulSoup
+
+    try:
+        soup = BeautifulSoup(html, "lxml")
+    except Exception:
+        soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+
+    converter = html2text.HTML2Text(baseurl=base_url)
+    converter.body_width = 0
+    converter.ignore_images = False
+    converter.ignore_emphasis = False
+    markdown = converter.handle(str(_main_content(soup))).strip()
+    if title and not markdown.startswith("#"):
+        markdown = f"# {title}\n\n{markdown}"
+    return markdown
+
+
+class LocalExtractor:
+    r"""Extracts PDFs, HTML and plain text locally, and judges whether the
+    result is good enough to skip the remote services (Chunkr, Firecrawl).
+
+    A PDF passes when most pages have text and the text is readable; scanned
+    or badly encoded PDFs fail and go to Chunkr, which runs OCR. A webpage
+    passes when its main content has enough text that is not links; pages
+    rendered by JavaScript fail and go to Firecrawl.
+
+    Args:
+        min_chars_per_page (int): Minimum average characters per PDF page.
+            (default: :obj:`100`)
+        min_text_page_ratio (float): Minimum fraction of PDF pages with
+            text. (default: :obj:`0.5`)
+        max_bad_char_ratio (float): Maximum fraction of unreadable
+            characters. (default: :obj:`0.05`)
+        min_html_chars (int): Minimum characters of a webpage's main
+            content. (default: :obj:`200`)
+        max_link_ratio (float): Maximum fraction of a webpage's main content
+            that is link text. (default: :obj:`0.6`)
+        use_process_pool (bool): Whether to extract large PDFs in parallel,
+            see :func:`get_process_pool`. (default: :obj:`True`)
+    """
+
+    def __init__(
+        self,
+        min_chars_per_page: int = 100,
+        min_text_page_ratio: float = 0.5,
+        max_bad_char_ratio: float = 0.05,
+        min_html_chars: int = 200,
+        max_link_ratio: float = 0.6,
+        use_process_pool: bool = True,
+    ):
+        self.min_chars_per_page = min_chars_per_page
+        self.min_text_page_ratio = min_text_page_ratio
+        self.max_bad_char_ratio = max_bad_char_ratio
+        self.min_html_chars = min_html_chars
+        self.max_link_ratio = max_link_ratio
+        self.use_process_pool = use_process_pool
+
+    def extract_pdf(self, path: str) -> Optional[str]:
+        r"""Text of the PDF, or ``None`` if it fails the quality checks."""
+        pool = get_process_pool() if self.use_process_pool else None
+        texts, pages = extract_pdf_text(path, pool)
+        text = "\n\n".join(page.strip() for page in texts)
+        reason = self._pdf_rejection(texts, pages, text)
+        if reason:
+            logger.info(f"Local PDF extraction of {path} rejected: {reason}")
+            return None
+        return text
+
+    def _pdf_rejection(self, texts: List[str], pages: int, text: str) -> Optional[str]:
+        if not pages:
+            return "no pages"
+        if len(text) < self.min_chars_per_page * pages:
+            return f"{len(text) / pages:.0f} characters per page"
+        text_pages = sum(1 for page in texts if len(page.strip()) >= 20)
+        if text_pages < self.min_text_page_ratio * pages:
+            return f"only {text_pages} of {pages} pages have text"
+        bad_chars = len(BAD_CHAR_PATTERN.findall(text))
+        if bad_chars > self.max_bad_char_ratio * len(text):
+            return f"{bad_chars} unreadable characters"
+        return None
+
+    def extract_html(self, html: str, url: str = "") -> Optional[str]:
+        r"""Markdown of the page's main content, or ``None`` if it fails the
+        quality checks."""
+        markdown = html_to_markdown(html, url)
+        # link targets are not content
+        text = re.sub(r"\]\([^)]*\)", "]", markdown)
+        link_text = sum(len(m) for m in re.findall(r"\[([^\]]*)\]", text))
+        plain_length = len(re.sub(r"[\s#*>\-|\[\]!]+", "", text))
+        if plain_length < self.min_html_chars:
+            logger.info(f"Local HTML extraction of {url} rejected: {plain_length} characters")
+            return None
+        if link_text > self.max_link_ratio * plain_length:
+            logger.info(f"Local HTML extraction of {url} rejected: mostly links")
+            return None
+        return markdown
+
+    def extract_text_file(self, path: str) -> str:
+        r"""Content of a local plain text or HTML file."""
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            content = f.read()
+        if path.lower().endswith(HTML_EXTENSIONS):
+            return html_to_markdown(content)
+        return content
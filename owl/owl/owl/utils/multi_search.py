@@ -0,0 +1,244 @@
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from camel.toolkits import SearchToolkit
+from camel.toolkits.base import BaseToolkit
+from camel.toolkits.function_tool import FunctionTool
+from camel.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "spm", "from", "ref", "ref_src"}
+
+# Constant of reciprocal rank fusion; larger values flatten the rank weights
+RRF_K = 60
+
+DEFAULT_ENGINES = ("duckduckgo", "google", "wiki", "baidu")
+
+
+def normalize_url(url: str) -> str:
+    r"""Reduce a URL to a key under which the same page found by different
+    engines compares equal.
+
+    The scheme, ``www.`` prefix, default port, fragment, trailing slash and
+    tracking parameters are dropped, the host is lowercased and the remaining
+    query parameters are sorted.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith("utm_")
+    )
+    path = parts.path.rstrip("/")
+    return urlunsplit(("", host, path, urlencode(query), "")).lstrip("/")
+
+
+class MultiSearchToolkit(BaseToolkit):
+    r"""A toolkit that sends one query to several search engines at once and
+    returns a single merged, deduplicated and ranked list of results.
+
+    Each engine runs in its own thread with its own timeout; an engine that
+    fails or is too slow is reported under ``errors`` and the results of the
+    others are returned. Results are ranked by reciprocal rank fusion, so a
+    page returned near the top by several engines ranks first.
+
+    Args:
+        engines (List[str], optional): Engines to query, any of
+            ``"duckduckgo"``, ``"google"``, ``"wiki"``, ``"baidu"`` and
+            ``"bing"``. (default: :obj:`DEFAULT_ENGINES`)
+        engine_timeout (float): Seconds to wait for each engine.
+            (default: :obj:`10`)
+        engine_timeouts (Dict[str, float], optional): Per-engine timeouts
+            overriding ``engine_timeout``. (default: :obj:`None`)
+    """
+
+    def __init__(
+        self,
+        engines: Optional[List[str]] = None,
+        engine_timeout: float = 10,
+        engine_timeouts: Optional[Dict[str, float]] = None,
+    ):
+        self.search_toolkit = SearchToolkit()
+        self.engines: Dict[str, Callable[[str, int], Any]] = {
+            "duckduckgo": lambda query, n: self.search_toolkit.search_duckduckgo(
+                query, max_results=n
+            ),
+            "google": lambda query, n: self.search_toolkit.search_google(query),
+            "wiki": lambda query, n: self.search_toolkit.search_wiki(query),
+            "baidu": lambda query, n: self.search_toolkit.search_baidu(
+                query, max_results=n
+            ),
+            "bing": lambda query, n: self.search_toolkit.search_bing(
+                query, max_results=n
+            ),
+        }
+        self.enabled = list(engines or DEFAULT_ENGINES)
+        unknown = [name for name in self.enabled if name not in self.engines]
+        if unknown:
+            raise ValueError(f"Unknown search engines: {unknown}")
+        self.engine_timeout = engine_timeout
+        self.engine_timeouts = dict(engine_timeouts or {})
+        # twice the engines, so that engines still running past their timeout
+        # do not hold up the next query
+        self._pool = ThreadPoolExecutor(
+            max_workers=2 * len(self.enabled), thread_name_prefix="owl-search"
+        )
+
+    def search_web(self, query: str, max_results: int = 10) -> Dict[str, Any]:
+        r"""Search the web with several search engines (DuckDuckGo, Google,
+        Wikipedia, Baidu) at the same time and return one merged list of
+        results, with duplicates removed and the best results first. Prefer
+        this tool over calling the individual search tools one by one.
+
+        Args:
+            query (str): The query to be searched.
+            max_results (int): Max number of merged results to return.
+                (default: :obj:`10`)
+
+        Returns:
+            Dict[str, Any]: A dictionary with the keys:
+                - 'results': A list of results, each with 'result_id',
+                  'title', 'description', 'url' and 'engines' (the engines
+                  that returned it).
+                - 'summaries': Text answers of engines that return no links
+                  (e.g. the Wikipedia summary), keyed by engine.
+                - 'errors': Engines that failed or timed out, keyed by engine.
+        """
+        start = time.monotonic()
+        futures = {
+            name: self._pool.submit(self.engines[name], query, max_results)
+            for name in self.enabled
+        }
+
+        hits: Dict[str, List[Dict[str, Any]]] = {}
+        summaries: Dict[str, str] = {}
+        errors: Dict[str, str] = {}
+        for name, future in futures.items():
+            timeout = self.engine_timeouts.get(name, self.engine_timeout)
+            remaining = max(0.0, timeout - (time.monotonic() - start))
+            try:
+                response = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                future.cancel()
+                errors[name] = f"timed out after {timeout}s"
+                continue
+            except Exception as e:
+                errors[name] = f"{e!s}"
+                continue
+            if isinstance(response, str):
+                summaries[name] = response
+                continue
+            results, error = _engine_results(response)
+            if error:
+                errors[name] = error
+            if results:
+                hits[name] = results
+
+        merged = merge_results(hits)[:max_results]
+        logger.debug(
+            f"search_web({query!r}): {len(merged)} results from {list(hits)} "
+            f"in {time.monotonic() - start:.2f}s, errors: {errors}"
+        )
+        return {"results": merged, "summaries": summaries, "errors": errors}
+
+    def get_tools(self) -> List[FunctionTool]:
+        r"""Returns a list of FunctionTool objects representing the
+        functions in the toolkit.
+
+        Returns:
+            List[FunctionTool]: A list of FunctionTool objects
+                representing the functions in the toolkit.
+        """
+        return [FunctionTool(self.search_web)]
+
+
+def _engine_results(response: Any) -> tuple:
+    r"""Split an engine response into its results and error message.
+
+    The engines of :class:`SearchToolkit` return either a list of results or
+    a ``{"results": [...]}`` dict, and report errors as ``{"error": ...}``
+    entries.
+    """
+    if isinstance(response, dict):
+        if "error" in response:
+            return [], str(response["error"])
+        response = response.get("results", [])
+    results, error = [], None
+    for item in response or []:
+        if not isinstance(item, dict):
+            continue
+        if "error" in item:
+            error = str(item["error"])
+            continue
+        url = item.get("url") or item.get("link")
+        if url:
+            results.append(
+                {
+                    "title": item.get("title") or "",
+                    "description": item.get("description") or item.get("snippet") or "",
+                    "url": url,
+                }
+            )
+    return results, error
+
+
+def merge_results(hits: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    r"""Merge per-engine result lists into one list ranked by reciprocal rank
+    fusion, keeping one entry per normalized URL.
+
+    Args:
+        hits (Dict[str, List[Dict[str, Any]]]): Results of each engine, best
+            first, each with 'title', 'description' and 'url'.
+
+    Returns:
+        List[Dict[str, Any]]: The merged results, best first.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    scores: Dict[str, float] = {}
+    for engine, results in hits.items():
+        for rank, result in enumerate(results, start=1):
+            key = normalize_url(result["url"])
+            if key not in merged:
+                merged[key] = {**result, "engines": []}
+                scores[key] = 0.0
+            entry = merged[key]
+            if engine not in entry["engines"]:
+                entry["engines"].append(engine)
+                scores[key] += 1.0 / (RRF_K + rank)
+            # keep the most informative title and description
+            for field in ("title", "description"):
+                if len(result[field]) > len(entry[field]):
+                    entry[field] = result[field]
+
+    # sorted() is stable, so ties keep the order the pages were first seen
+    ranked = sorted(merged, key=lambda key: scores[key], reverse=True)
+    return [
+        {"result_id": i, **merged[key]} for i, key in enumerate(ranked, start=1)
+    ]
@@ -0,0 +1,361 @@
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+
+import os
+import asyncio
+import logging
+import threading
+from types import MethodType
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Type, Union
+
+from pydantic import BaseModel
+
+from camel.agents import ChatAgent
+from camel.agents._types import ToolCallRequest
+from camel.messages.base import BaseMessage
+from camel.responses import ChatAgentResponse
+from camel.types import OpenAIBackendRole
+from camel.types.agents import ToolCallingRecord
+from camel.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Tools that only do I/O and keep no shared state, so several calls from one
+# model response can run at once. Values are the maximum number of
+# concurrent calls per tool.
+DEFAULT_TOOL_LIMITS: Dict[str, int] = {
+    "search_web": 2,
+    "search_google": 2,
+    "search_baidu": 2,
+    "search_wiki": 2,
+    "search_duckduckgo": 2,
+    "search_bing": 2,
+    "search_papers": 2,
+    "extract_document_content": 2,
+}
+
+
+class ToolCallExecutor:
+    r"""Runs the independent tool calls of one model response concurrently.
+
+    Calls are submitted to a bounded thread pool (async tools become asyncio
+    tasks in :meth:`aexecute`), and each tool has its own concurrency limit.
+    Results are recorded into the agent's memory in the order the model
+    issued the calls, exactly as if they had run one after another.
+
+    Tools with a limit of ``0`` run on the calling thread, one after another.
+    This is the default for tools not listed in ``tool_limits``, since many
+    toolkits (e.g. the browser) are not thread-safe.
+
+    Args:
+        max_workers (int): Size of the thread pool shared by all agents using
+            this executor. (default: :obj:`4`)
+        tool_limits (Dict[str, int], optional): Maximum concurrent calls per
+            tool name. (default: :obj:`DEFAULT_TOOL_LIMITS`)
+        default_limit (int): Limit for tools not in ``tool_limits``.
+            (default: :obj:`0`)
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        tool_limits: Optional[Dict[str, int]] = None,
+        default_limit: int = 0,
+    ):
+        self.max_workers = max_workers
+        self.tool_limits = dict(DEFAULT_TOOL_LIMITS if tool_limits is None else tool_limits)
+        self.default_limit = default_limit
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="owl-tool")
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def limit(self, tool_name: str) -> int:
+        return self.tool_limits.get(tool_name, self.default_limit)
+
+    def _semaphore(self, tool_name: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if tool_name not in self._semaphores:
+                self._semaphores[tool_name] = threading.BoundedSemaphore(
+                    self.limit(tool_name)
+                )
+            return self._semaphores[tool_name]
+
+    def _limited_call(self, agent: ChatAgent, request: ToolCallRequest) -> Any:
+        with self._semaphore(request.tool_name):
+            return agent._call_tool(request)
+
+    def execute(
+        self, agent: ChatAgent, requests: List[ToolCallRequest]
+    ) -> List[ToolCallingRecord]:
+        r"""Run the requests and record them in the agent's memory in their
+        original order."""
+        parallel = [r for r in requests if self.limit(r.tool_name) > 0]
+        if len(parallel) < 2:
+            results = [agent._call_tool(request) for request in requests]
+        else:
+            futures = {
+                id(request): self._pool.submit(self._limited_call, agent, request)
+                for request in parallel
+            }
+            # tools that must not leave this thread run while the pool works
+            inline = {
+                id(request): agent._call_tool(request)
+                for request in requests
+                if id(request) not in futures
+            }
+            results = [
+                futures[id(request)].result()
+                if id(request) in futures
+                else inline[id(request)]
+                for request in requests
+            ]
+        return [
+            agent._record_tool_calling(
+                request.tool_name, request.args, result, request.tool_call_id
+            )
+            for request, result in zip(requests, results)
+        ]
+
+    async def aexecute(
+        self, agent: ChatAgent, requests: List[ToolCallRequest]
+    ) -> List[ToolCallingRecord]:
+        r"""Async counterpart of :meth:`execute`. Async tools run as asyncio
+        tasks, sync tools in the thread pool, both within their limits."""
+        loop = asyncio.get_running_loop()
+        semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        async def run(request: ToolCallRequest) -> Any:
+            tool_name = request.tool_name
+            if tool_name not in semaphores:
+                semaphores[tool_name] = asyncio.Semaphore(self.limit(tool_name))
+            async with semaphores[tool_name]:
+                if agent.tool_dict[tool_name].is_async:
+                    return await agent._acall_tool(request)
+                return await loop.run_in_executor(
+                    self._pool, self._limited_call, agent, request
+                )
+
+        tasks = {
+            id(request): asyncio.ensure_future(run(request))
+            for request in requests
+            if self.limit(request.tool_name) > 0
+        }
+        results = []
+        for request in requests:
+            if id(request) in tasks:
+                results.append(await tasks[id(request)])
+            else:
+                results.append(await agent._acall_tool(request))
+        return [
+            agent._record_tool_calling(
+                request.tool_name, request.args, result, request.tool_call_id
+            )
+            for request, result in zip(requests, results)
+        ]
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+def _call_tool(self: ChatAgent, request: ToolCallRequest) -> Any:
+    r"""Run a tool without recording it, capturing errors like
+    :meth:`ChatAgent._execute_tool`."""
+    try:
+        return self.tool_dict[request.tool_name](**request.args)
+    except Exception as e:
+        error_msg = f"Error executing tool '{request.tool_name}': {e!s}"
+        logging.warning(error_msg)
+        return {"error": error_msg}
+
+
+async def _acall_tool(self: ChatAgent, request: ToolCallRequest) -> Any:
+    try:
+        return await self.tool_dict[request.tool_name].async_call(**request.args)
+    except Exception as e:
+        error_msg = f"Error executing async tool '{request.tool_name}': {e!s}"
+        logging.warning(error_msg)
+        return {"error": error_msg}
+
+
+def _parallel_step(
+    self: ChatAgent,
+    input_message: Union[BaseMessage, str],
+    response_format: Optional[Type[BaseModel]] = None,
+) -> ChatAgentResponse:
+    r"""Same loop as :meth:`ChatAgent.step`, but the internal tool calls of
+    each model response run through the agent's :class:`ToolCallExecutor`."""
+    if isinstance(input_message, str):
+        input_message = BaseMessage.make_user_message(
+            role_name="User", content=input_message
+        )
+
+    self.update_memory(input_message, OpenAIBackendRole.USER)
+
+    tool_call_records: List[ToolCallingRecord] = []
+    external_tool_call_requests: Optional[List[ToolCallRequest]] = None
+
+    while True:
+        try:
+            openai_messages, num_tokens = self.memory.get_context()
+        except RuntimeError as e:
+            return self._step_token_exceed(
+                e.args[1], tool_call_records, "max_tokens_exceeded"
+            )
+        response = self._get_model_response(
+            openai_messages,
+            num_tokens,
+            response_format,
+            self._get_full_tool_schemas(),
+        )
+
+        if self.single_iteration:
+            break
+
+        if tool_call_requests := response.tool_call_requests:
+            internal_requests = []
+            for tool_call_request in tool_call_requests:
+                if tool_call_request.tool_name in self._external_tool_schemas:
+                    if external_tool_call_requests is None:
+                        external_tool_call_requests = []
+                    external_tool_call_requests.append(tool_call_request)
+                else:
+                    internal_requests.append(tool_call_request)
+            tool_call_records.extend(
+                self._tool_executor.execute(self, internal_requests)
+            )
+
+            if external_tool_call_requests:
+                break
+            continue
+
+        break
+
+    self._format_response_if_needed(response, response_format)
+    self._record_final_output(response.output_messages)
+
+    return self._convert_to_chatagent_response(
+        response,
+        tool_call_records,
+        num_tokens,
+        external_tool_call_requests,
+    )
+
+
+async def _parallel_astep(
+    self: ChatAgent,
+    input_message: Union[BaseMessage, str],
+    response_format: Optional[Type[BaseModel]] = None,
+) -> ChatAgentResponse:
+    r"""Async counterpart of :func:`_parallel_step`."""
+    if isinstance(input_message, str):
+        input_message = BaseMessage.make_user_message(
+            role_name="User", content=input_message
+        )
+
+    self.update_memory(input_message, OpenAIBackendRole.USER)
+
+    tool_call_records: List[ToolCallingRecord] = []
+    external_tool_call_requests: Optional[List[ToolCallRequest]] = None
+
+    while True:
+        try:
+            openai_messages, num_tokens = self.memory.get_context()
+        except RuntimeError as e:
+            return self._step_token_exceed(
+                e.args[1], tool_call_records, "max_tokens_exceeded"
+            )
+        response = await self._aget_model_response(
+            openai_messages,
+            num_tokens,
+            response_format,
+            self._get_full_tool_schemas(),
+        )
+
+        if self.single_iteration:
+            break
+
+        if tool_call_requests := response.tool_call_requests:
+            internal_requests = []
+            for tool_call_request in tool_call_requests:
+                if tool_call_request.tool_name in self._external_tool_schemas:
+                    if external_tool_call_requests is None:
+                        external_tool_call_requests = []
+                    external_tool_call_requests.append(tool_call_request)
+                else:
+                    internal_requests.append(tool_call_request)
+            tool_call_records.extend(
+                await self._tool_executor.aexecute(self, internal_requests)
+            )
+
+            if external_tool_call_requests:
+                break
+            continue
+
+        break
+
+    await self._aformat_response_if_needed(response, response_format)
+    self._record_final_output(response.output_messages)
+
+    return self._convert_to_chatagent_response(
+        response,
+        tool_call_records,
+        num_tokens,
+        external_tool_call_requests,
+    )
+
+
+_default_executor: Optional[ToolCallExecutor] = None
+_default_executor_lock = threading.Lock()
+
+
+def default_tool_executor() -> Optional[ToolCallExecutor]:
+    r"""Process-wide executor sized by the ``OWL_TOOL_WORKERS`` environment
+    variable (default 4). Returns ``None`` when it is set to 0."""
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            max_workers = int(os.getenv("OWL_TOOL_WORKERS", "4"))
+            if max_workers <= 0:
+                return None
+            _default_executor = ToolCallExecutor(max_workers=max_workers)
+        return _default_executor
+
+
+def enable_parallel_tool_calls(
+    agent: ChatAgent, executor: Optional[ToolCallExecutor] = None
+) -> ChatAgent:
+    r"""Let the agent run the independent tool calls of each model response
+    concurrently.
+
+    Works on an existing agent (e.g. ``society.assistant_agent`` of a camel
+    ``RolePlaying``) by replacing its ``step`` and ``astep``.
+
+    Args:
+        agent (ChatAgent): The agent, usually the society's assistant.
+        executor (ToolCallExecutor, optional): The executor to use.
+            (default: :func:`default_tool_executor`)
+
+    Returns:
+        ChatAgent: The same agent.
+    """
+    executor = executor or default_tool_executor()
+    if executor is None:
+        return agent
+    agent._tool_executor = executor
+    agent._call_tool = MethodType(_call_tool, agent)
+    agent._acall_tool = MethodType(_acall_tool, agent)
+    agent.step = MethodType(_parallel_step, agent)
+    agent.astep = MethodType(_parallel_astep, agent)
+    return agent
@@ -0,0 +1,274 @@
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+
+import enum
+import json
+import time
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+from camel.models import BaseModelBackend, ModelFactory
+from camel.toolkits import FunctionTool
+from camel.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Toolkits bound to the thread that created them: the browser drives a sync
+# Playwright instance. They are shared between the societies built on one
+# thread (a worker runs its jobs on its main thread) instead of across
+# threads; the browser resets its agents at the start of every browse_url.
+THREAD_BOUND_TOOLKITS = {"BrowserToolkit"}
+
+
+def _freeze(value: Any) -> Hashable:
+    r"""A hashable key for a constructor argument. Containers are compared by
+    value, other objects (e.g. shared model backends) by identity."""
+    if value is None or isinstance(value, (str, int, float, bool, enum.Enum)):
+        return value
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_freeze(v) for v in value]
+        return tuple(sorted(items, key=repr) if isinstance(value, (set, frozenset)) else items)
+    return ("id", id(value))
+
+
+def _validate_once(tool: FunctionTool) -> FunctionTool:
+    r"""Skip repeated JSON-schema validation of a shared tool.
+
+    :obj:`FunctionTool` validates its schema on every
+    :meth:`get_function_name` and :meth:`get_openai_tool_schema`, i.e. for
+    every tool whenever an agent is created and on every model request. A
+    schema that already passed is not validated again.
+    """
+    validate = tool.validate_openai_tool_schema
+    validated = set()
+    # the tool is shared, so agents on several threads may validate at once
+    lock = threading.Lock()
+
+    def validate_openai_tool_schema(schema: Dict[str, Any]) -> None:
+        key = json.dumps(schema, sort_keys=True, default=str)
+        with lock:
+            if key in validated:
+                return
+        validate(schema)
+        with lock:
+            validated.add(key)
+
+    tool.validate_openai_tool_schema = validate_openai_tool_schema
+    return tool
+
+
+class ComponentRegistry:
+    r"""Process-wide cache of model backends and toolkit tools.
+
+    Every scene script used to create its model backends (each with its own
+    HTTP client) and toolkits from scratch in ``construct_society``. The
+    registry builds each of them once per configuration and hands the same
+    instance to every later society, so a long-lived worker pays the
+    construction cost once, and model calls reuse the keep-alive connections
+    of the backend's client.
+
+    Lookups are thread-safe and an entry is built at most once, even when
+    several threads ask for it at the same time; building different entries
+    does not block each other. A failed build is not cached.
+
+    Sharing an entry between threads is only safe if it keeps no per-call
+    state. Agents keep their own memory and wrap a shared model backend in
+    their own model manager; the backend itself only holds its HTTP client.
+    The toolkits the scene scripts share across threads were checked:
+
+    - :obj:`SearchToolkit`, :obj:`MultiSearchToolkit`, :obj:`ExcelToolkit`
+      and :obj:`FileWriteToolkit` keep nothing between calls.
+    - :obj:`DocumentProcessingToolkit` keeps the response of its webpage
+      probe per thread and opens one sqlite connection per thread for its
+      extraction cache.
+    - :obj:`CodeExecutionToolkit` with ``sandbox="subprocess"`` runs every
+      call in a new process.
+    - :obj:`ImageAnalysisToolkit` creates a new chat agent for every call.
+
+    Toolkits holding state bound to a thread are listed in
+    :obj:`THREAD_BOUND_TOOLKITS`. Toolkits that keep state from one call to
+    the next must not be shared at all: :obj:`VideoAnalysisToolkit` keeps a
+    single chat agent that is never reset, so later jobs would see earlier
+    videos and questions, and it is built per society instead. Any other
+    toolkit has to be checked the same way before it is shared.
+    """
+
+    def __init__(self):
+        self._items: Dict[Hashable, Any] = {}
+        self._building: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def get(self, key: Hashable, build: Callable[[], Any], per_thread: bool = False) -> Any:
+        r"""Return the entry for ``key``, calling ``build`` if it is missing.
+
+        Args:
+            key (Hashable): Key of the entry.
+            build (Callable[[], Any]): Creates the entry.
+            per_thread (bool): Keep one entry per thread instead of one per
+                process. (default: :obj:`False`)
+
+        Returns:
+            Any: The cached entry.
+        """
+        if per_thread:
+            if not hasattr(self._local, "items"):
+                self._local.items = {}
+            if key not in self._local.items:
+                self._local.items[key] = self._build(key, build)
+            return self._local.items[key]
+
+        item = self._items.get(key)
+        if item is not None:
+            return item
+        with self._lock:
+            key_lock = self._building.setdefault(key, threading.Lock())
+        with key_lock:
+            item = self._items.get(key)
+            if item is None:
+                item = self._build(key, build)
+                self._items[key] = item
+        with self._lock:
+            self._building.pop(key, None)
+        return item
+
+    def _build(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        item = build()
+        logger.debug(f"Built {key[1]} in {time.perf_counter() - start:.2f}s")
+        return item
+
+    def model(
+        self,
+        model_platform: Any,
+        model_type: Any,
+        model_config_dict: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> BaseModelBackend:
+        r"""A shared model backend, created with :meth:`ModelFactory.create`
+        the first time a configuration is requested.
+
+        Args:
+            model_platform (Any): Platform of the model, as accepted by
+                :meth:`ModelFactory.create`.
+            model_type (Any): Type of the model.
+            model_config_dict (Dict[str, Any], optional): Model configuration.
+                (default: :obj:`None`)
+            **kwargs: Other arguments of :meth:`ModelFactory.create` (e.g.
+                ``url`` or ``api_key``), also part of the configuration.
+
+        Returns:
+            BaseModelBackend: The shared backend.
+        """
+        key = (
+            "model",
+            str(model_platform),
+            str(model_type),
+            _freeze(model_config_dict),
+            _freeze(kwargs),
+        )
+        return self.get(
+            key,
+            lambda: ModelFactory.create(
+                model_platform=model_platform,
+                model_type=model_type,
+                model_config_dict=model_config_dict,
+                **kwargs,
+            ),
+        )
+
+    def tools(
+        self,
+        toolkit_cls: type,
+        *args: Any,
+        names: Optional[Sequence[str]] = None,
+        **kwargs: Any,
+    ) -> List[FunctionTool]:
+        r"""The tools of a shared toolkit instance.
+
+        The toolkit is created with ``toolkit_cls(*args, **kwargs)`` once per
+        set of arguments, and its :obj:`FunctionTool` wrappers (whose schemas
+        are parsed from the docstrings) are built once as well, and their
+        schemas are only validated the first time. Toolkits in
+        :obj:`THREAD_BOUND_TOOLKITS` are shared per thread.
+
+        Args:
+            toolkit_cls (type): The toolkit class.
+            *args: Positional arguments of the toolkit.
+            names (Sequence[str], optional): Only return the toolkit methods
+                with these names, in this order, instead of
+                :meth:`get_tools`. (default: :obj:`None`)
+            **kwargs: Keyword arguments of the toolkit.
+
+        Returns:
+            List[FunctionTool]: The shared tools.
+        """
+        key = (
+            "tools",
+            f"{toolkit_cls.__module__}.{toolkit_cls.__qualname__}",
+            _freeze(args),
+            _freeze(kwargs),
+            _freeze(names),
+        )
+
+        def build() -> List[FunctionTool]:
+            toolkit = toolkit_cls(*args, **kwargs)
+            if names is None:
+                tools = toolkit.get_tools()
+            else:
+                tools = [FunctionTool(getattr(toolkit, name)) for name in names]
+            return [_validate_once(tool) for tool in tools]
+
+        tools = self.get(
+            key, build, per_thread=toolkit_cls.__name__ in THREAD_BOUND_TOOLKITS
+        )
+        # callers may extend or reorder the list they get
+        return list(tools)
+
+    def clear(self) -> None:
+        r"""Drop all entries shared between threads; entries of the calling
+        thread are dropped too."""
+        with self._lock:
+            self._items.clear()
+        self._local.__dict__.pop("items", None)
+
+    def __len__(self) -> int:
+        return len(self._items) + len(getattr(self._local, "items", {}))
+
+
+registry = ComponentRegistry()
+
+
+def shared_model(
+    model_platform: Any,
+    model_type: Any,
+    model_config_dict: Optional[Dict[str, Any]] = None,
+    **kwargs: Any,
+) -> BaseModelBackend:
+    r"""A model backend from the process-wide registry, see
+    :meth:`ComponentRegistry.model`."""
+    return registry.model(model_platform, model_type, model_config_dict, **kwargs)
+
+
+def shared_tools(
+    toolkit_cls: type,
+    *args: Any,
+    names: Optional[Sequence[str]] = None,
+    **kwargs: Any,
+) -> List[FunctionTool]:
+    r"""The tools of a toolkit from the process-wide registry, see
+    :meth:`ComponentRegistry.tools`."""
+    return registry.tools(toolkit_cls, *args, names=names, **kwargs)
@@ -0,0 +1,295 @@
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+
+r"""Benchmark the society loop offline by replaying recorded runs.
+
+Record cassettes by running any scene script with ``OWL_RECORD_DIR`` set,
+then replay them against stub models and tools::
+
+    python -m owl.utils.replay_bench recordings/ --repeat 5 --json report.json
+
+For each cassette, the median over the repeats of the wall time, the
+framework overhead per round (round time minus the time spent in the stubs),
+the time spent deep-copying messages and the memory high-water mark are
+reported.
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import statistics
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from camel.logger import set_log_level
+
+from . import enhanced_role_playing
+from .enhanced_role_playing import iter_society
+from .cassette import RECORD_DIR_ENV, CassettePlayer, load_cassette
+
+
+def _max_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class _TimedDeepcopy:
+    r"""Stands in for ``deepcopy`` in :mod:`enhanced_role_playing` and
+    times its calls."""
+
+    def __init__(self, deepcopy):
+        self.deepcopy = deepcopy
+        self.calls = 0
+        self.seconds = 0.0
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.deepcopy(*args, **kwargs)
+        finally:
+            self.calls += 1
+            self.seconds += time.perf_counter() - start
+
+
+def replay_cassette(
+    cassette: Dict[str, Any],
+    token_counter: Any = None,
+    trace_memory: bool = False,
+) -> Dict[str, Any]:
+    r"""Replay a cassette once and measure the run.
+
+    Args:
+        cassette (Dict[str, Any]): The cassette to replay.
+        token_counter (BaseTokenCounter, optional): Token counter of the
+            stub models. (default: :obj:`None`)
+        trace_memory (bool): Whether to trace Python allocations for the
+            peak memory of the run; slows the run down.
+            (default: :obj:`False`)
+
+    Returns:
+        Dict[str, Any]: The measurements of the run.
+    """
+    player = CassettePlayer(cassette, token_counter)
+    timed_deepcopy = _TimedDeepcopy(enhanced_role_playing.deepcopy)
+    enhanced_role_playing.deepcopy = timed_deepcopy
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        society = player.build_society()
+        build_seconds = time.perf_counter() - start
+
+        overheads: List[float] = []
+        record: Dict[str, Any] = {}
+        round_start, stub_seconds = time.perf_counter(), player.stub_seconds
+        for record in iter_society(society, player.round_limit):
+            now = time.perf_counter()
+            overheads.append(
+                (now - round_start) - (player.stub_seconds - stub_seconds)
+            )
+            round_start, stub_seconds = now, player.stub_seconds
+        wall_seconds = time.perf_counter() - start
+        peak_traced = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        enhanced_role_playing.deepcopy = timed_deepcopy.deepcopy
+        if trace_memory:
+            tracemalloc.stop()
+
+    return {
+        "wall_seconds": wall_seconds,
+        "build_seconds": build_seconds,
+        "rounds": len(overheads),
+        "round_overhead_ms": {
+            "mean": 1000 * statistics.fmean(overheads) if overheads else 0.0,
+            "p50": 1000 * _percentile(overheads, 0.5),
+            "max": 1000 * max(overheads, default=0.0),
+        },
+        "stub_seconds": player.stub_seconds,
+        "deepcopy": {"calls": timed_deepcopy.calls, "seconds": timed_deepcopy.seconds},
+        "peak_traced_mb": None
+        if peak_traced is None
+        else round(peak_traced / (1024 * 1024), 1),
+        "max_rss_mb": _max_rss_mb(),
+        "answer_matches": record.get("assistant") == player.answer,
+        "divergences": list(player.divergences),
+        "unused_calls": player.unused(),
+    }
+
+
+def benchmark_cassette(
+    path: str,
+    repeat: int = 3,
+    warmup: int = 1,
+    token_counter: Any = None,
+    trace_memory: bool = False,
+) -> Dict[str, Any]:
+    r"""Replay a cassette ``warmup + repeat`` times and report the median of
+    the measured runs."""
+    cassette = load_cassette(path)
+    for _ in range(warmup):
+        replay_cassette(cassette, token_counter)
+    runs = [
+        replay_cassette(cassette, token_counter, trace_memory) for _ in range(repeat)
+    ]
+
+    def median(key: str, sub_key: Optional[str] = None) -> float:
+        values = [run[key] if sub_key is None else run[key][sub_key] for run in runs]
+        return round(statistics.median(values), 4)
+
+    recorded_seconds = sum(
+        interaction["seconds"] for interaction in cassette["interactions"]
+    )
+    return {
+        "cassette": path,
+        "rounds": runs[-1]["rounds"],
+        "model_calls": sum(1 for i in cassette["interactions"] if i["kind"] == "model"),
+        "tool_calls": sum(1 for i in cassette["interactions"] if i["kind"] == "tool"),
+        "recorded_seconds": round(cassette["rounds"][-1]["seconds"], 3),
+        "recorded_call_seconds": round(recorded_seconds, 3),
+        "wall_seconds": median("wall_seconds"),
+        "build_seconds": median("build_seconds"),
+        "round_overhead_ms": {
+            key: median("round_overhead_ms", key) for key in ("mean", "p50", "max")
+        },
+        "deepcopy_calls": runs[-1]["deepcopy"]["calls"],
+        "deepcopy_ms": round(1000 * median("deepcopy", "seconds"), 3),
+        "peak_traced_mb": max(
+            (run["peak_traced_mb"] for run in runs if run["peak_traced_mb"] is not None),
+            default=None,
+        ),
+        "max_rss_mb": runs[-1]["max_rss_mb"],
+        "deterministic": all(
+            run["answer_matches"] and not run["divergences"] and not run["unused_calls"]
+            for run in runs
+        ),
+        "divergences": runs[-1]["divergences"],
+    }
+
+
+def _cassette_paths(paths: List[str]) -> List[str]:
+    found: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(glob.glob(os.path.join(path, "*.json"))))
+        else:
+            found.append(path)
+    return found
+
+
+def _print_report(results: List[Dict[str, Any]]) -> None:
+    header = (
+        f"{'cassette':<40} {'rounds':>6} {'wall s':>8} {'ovh/round ms':>13} "
+        f"{'p50 ms':>8} {'deepcopy ms':>12} {'peak MB':>8} {'rss MB':>7}  ok"
+    )
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        if "error" in result:
+            print(f"{os.path.basename(result['cassette']):<40} error: {result['error']}")
+            continue
+        overhead = result["round_overhead_ms"]
+        peak = result["peak_traced_mb"]
+        print(
+            f"{os.path.basename(result['cassette'])[:40]:<40} {result['rounds']:>6} "
+            f"{result['wall_seconds']:>8.3f} {overhead['mean']:>13.2f} "
+            f"{overhead['p50']:>8.2f} {result['deepcopy_ms']:>12.3f} "
+            f"{'-' if peak is None else peak:>8} {result['max_rss_mb'] or '-':>7}  "
+            f"{'yes' if result['deterministic'] else 'NO'}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Replay recorded society runs offline and report framework overhead."
+    )
+    parser.add_argument("paths", nargs="+", help="cassette files or directories of cassettes")
+    parser.add_argument("--repeat", type=int, default=3, help="measured replays per cassette")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured replays per cassette")
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="trace Python allocations for the peak memory (slower)",
+    )
+    parser.add_argument(
+        "--openai-token-counter",
+        action="store_true",
+        help="count tokens like an OpenAI model instead of the stub counter",
+    )
+    parser.add_argument("--json", dest="json_path", help="write the report to this file")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    # replays must not record cassettes of their own
+    os.environ.pop(RECORD_DIR_ENV, None)
+    set_log_level(level=args.log_level)
+
+    token_counter = None
+    if args.openai_token_counter:
+        from camel.types import ModelType
+        from camel.utils import OpenAITokenCounter
+
+        token_counter = OpenAITokenCounter(ModelType.GPT_4O_MINI)
+
+    results: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+    for path in _cassette_paths(args.paths):
+        try:
+            results.append(
+                benchmark_cassette(
+                    path, args.repeat, args.warmup, token_counter, args.trace_memory
+                )
+            )
+        except Exception as e:
+            results.append({"cassette": path, "error": f"{e!s}"})
+
+    _print_report(results)
+    measured = [result for result in results if "error" not in result]
+    report = {
+        "repeat": args.repeat,
+        "cassettes": results,
+        "total": {
+            "cassettes": len(measured),
+            "rounds": sum(result["rounds"] for result in measured),
+            "wall_seconds": round(sum(result["wall_seconds"] for result in measured), 3),
+            "benchmark_seconds": round(time.perf_counter() - start, 3),
+            "max_rss_mb": _max_rss_mb(),
+        },
+    }
+    print(
+        f"\n{report['total']['cassettes']} cassettes, {report['total']['rounds']} rounds, "
+        f"{report['total']['wall_seconds']}s replayed, max RSS {report['total']['max_rss_mb']} MB"
+    )
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0 if measured and all(result["deterministic"] for result in measured) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
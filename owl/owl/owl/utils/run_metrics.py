@@ -0,0 +1,261 @@
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+from camel.agents import ChatAgent
+from camel.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _new_usage() -> Dict[str, Any]:
+    return {"calls": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+def _usage_tokens(usage: Any) -> Optional[Dict[str, int]]:
+    r"""Read prompt and completion tokens from a ``ChatCompletion.usage``
+    object or a usage dict. Returns ``None`` when no usage is reported."""
+    if usage is None:
+        return None
+    if isinstance(usage, dict):
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+    else:
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+    if prompt_tokens is None and completion_tokens is None:
+        return None
+    return {
+        "prompt_tokens": prompt_tokens or 0,
+        "completion_tokens": completion_tokens or 0,
+    }
+
+
+class RunMetrics:
+    r"""Token and latency accounting for one society run.
+
+    :meth:`attach` wraps the model backend and the tool execution of each
+    agent, so that every model call is timed and its usage counted, including
+    the calls an agent makes between tool calls within a single step (the
+    step's ``info["usage"]`` only reports the last one). Streaming responses
+    carry no usage; for those the step usage is counted instead, see
+    :meth:`end_step`.
+
+    Tool calls may run on several threads, so updates are locked.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.rounds = 0
+        # filled in by the society runner when context compaction is on
+        self.prompt_tokens_saved = 0
+        self.llm = _new_usage()
+        self.agents: Dict[str, Dict[str, Any]] = {}
+        self.models: Dict[str, Dict[str, Any]] = {}
+        self.tools: Dict[str, Dict[str, Any]] = {}
+        self.llm_calls: List[Dict[str, Any]] = []
+        self._unmetered: Dict[str, str] = {}
+        self._patched: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def attach(self, agents: Dict[str, ChatAgent]) -> None:
+        r"""Instrument the given agents, keyed by the name used in the report
+        (e.g. ``{"user": ..., "assistant": ...}``)."""
+        for agent_name, agent in agents.items():
+            backend = agent.model_backend
+            self._patch(backend, "run", self._timed_model(agent_name, backend, backend.run))
+            self._patch(backend, "arun", self._atimed_model(agent_name, backend, backend.arun))
+            # agents with parallel tool calls run tools through _call_tool
+            # (see parallel_tools.enable_parallel_tool_calls)
+            if hasattr(agent, "_call_tool"):
+                execute, aexecute = "_call_tool", "_acall_tool"
+            else:
+                execute, aexecute = "_execute_tool", "_aexecute_tool"
+            self._patch(agent, execute, self._timed_tool(getattr(agent, execute)))
+            self._patch(agent, aexecute, self._atimed_tool(getattr(agent, aexecute)))
+
+    def detach(self) -> None:
+        r"""Restore the methods wrapped by :meth:`attach`."""
+        for obj, name, previous in reversed(self._patched):
+            if previous is None:
+                obj.__dict__.pop(name, None)
+            else:
+                obj.__dict__[name] = previous
+        self._patched.clear()
+
+    def _patch(self, obj: Any, name: str, wrapper: Any) -> None:
+        # keep methods already set on the instance (e.g. _call_tool)
+        self._patched.append((obj, name, obj.__dict__.get(name)))
+        setattr(obj, name, wrapper)
+
+    def _timed_model(self, agent_name, backend, run):
+        def timed_run(*args, **kwargs):
+            start = time.perf_counter()
+            response = None
+            try:
+                response = run(*args, **kwargs)
+                return response
+            finally:
+                self.record_llm_call(
+                    agent_name,
+                    _model_name(backend),
+                    time.perf_counter() - start,
+                    getattr(response, "usage", None),
+                )
+
+        return timed_run
+
+    def _atimed_model(self, agent_name, backend, arun):
+        async def timed_arun(*args, **kwargs):
+            start = time.perf_counter()
+            response = None
+            try:
+                response = await arun(*args, **kwargs)
+                return response
+            finally:
+                self.record_llm_call(
+                    agent_name,
+                    _model_name(backend),
+                    time.perf_counter() - start,
+                    getattr(response, "usage", None),
+                )
+
+        return timed_arun
+
+    def _timed_tool(self, execute):
+        def timed_execute(tool_call_request):
+            start = time.perf_counter()
+            record = execute(tool_call_request)
+            self.record_tool_call(
+                tool_call_request.tool_name,
+                time.perf_counter() - start,
+                _is_tool_error(record),
+            )
+            return record
+
+        return timed_execute
+
+    def _atimed_tool(self, aexecute):
+        async def timed_aexecute(tool_call_request):
+            start = time.perf_counter()
+            record = await aexecute(tool_call_request)
+            self.record_tool_call(
+                tool_call_request.tool_name,
+                time.perf_counter() - start,
+                _is_tool_error(record),
+            )
+            return record
+
+        return timed_aexecute
+
+    def record_llm_call(
+        self, agent_name: str, model: str, seconds: float, usage: Any = None
+    ) -> None:
+        r"""Count one model call. Calls without usage are left for
+        :meth:`end_step` to fill in from the step usage."""
+        tokens = _usage_tokens(usage)
+        with self._lock:
+            for bucket in (
+                self.llm,
+                self.agents.setdefault(agent_name, _new_usage()),
+                self.models.setdefault(model, _new_usage()),
+            ):
+                bucket["calls"] += 1
+                bucket["seconds"] += seconds
+                if tokens is not None:
+                    bucket["prompt_tokens"] += tokens["prompt_tokens"]
+                    bucket["completion_tokens"] += tokens["completion_tokens"]
+            if tokens is None:
+                self._unmetered[agent_name] = model
+            self.llm_calls.append(
+                {
+                    "round": self.rounds,
+                    "agent": agent_name,
+                    "model": model,
+                    "seconds": round(seconds, 3),
+                    **(tokens or {}),
+                }
+            )
+
+    def record_tool_call(self, tool_name: str, seconds: float, error: bool = False) -> None:
+        r"""Count one tool call."""
+        with self._lock:
+            tool = self.tools.setdefault(
+                tool_name, {"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0}
+            )
+            tool["calls"] += 1
+            tool["errors"] += int(error)
+            tool["seconds"] += seconds
+            tool["max_seconds"] = max(tool["max_seconds"], seconds)
+
+    def end_step(self, agent_name: str, usage: Any) -> None:
+        r"""Called with the ``info["usage"]`` of each agent step. If the
+        step's model calls reported no usage (streaming), count the step
+        usage instead so the totals stay complete."""
+        with self._lock:
+            model = self._unmetered.pop(agent_name, None)
+            tokens = _usage_tokens(usage)
+            if model is None or tokens is None:
+                return
+            for bucket in (self.llm, self.agents[agent_name], self.models[model]):
+                bucket["prompt_tokens"] += tokens["prompt_tokens"]
+                bucket["completion_tokens"] += tokens["completion_tokens"]
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self.llm["prompt_tokens"]
+
+    @property
+    def completion_tokens(self) -> int:
+        return self.llm["completion_tokens"]
+
+    def as_dict(self) -> Dict[str, Any]:
+        r"""Snapshot of the run's metrics, JSON serializable."""
+
+        def rounded(bucket: Dict[str, Any]) -> Dict[str, Any]:
+            return {
+                key: round(value, 3) if isinstance(value, float) else value
+                for key, value in bucket.items()
+            }
+
+        with self._lock:
+            tool_seconds = sum(tool["seconds"] for tool in self.tools.values())
+            return {
+                "started_at": self.started_at,
+                "wall_seconds": round(time.perf_counter() - self._start, 3),
+                "rounds": self.rounds,
+                "llm": rounded(self.llm),
+                "tool_seconds": round(tool_seconds, 3),
+                "prompt_tokens_saved": self.prompt_tokens_saved,
+                "agents": {name: rounded(b) for name, b in self.agents.items()},
+                "models": {name: rounded(b) for name, b in self.models.items()},
+                "tools": {name: rounded(b) for name, b in self.tools.items()},
+                "llm_calls": list(self.llm_calls),
+            }
+
+
+def _model_name(backend: Any) -> str:
+    model_type = backend.model_type
+    return str(getattr(model_type, "value", model_type))
+
+
+def _is_tool_error(record: Any) -> bool:
+    # ChatAgent reports a failed tool as {"error": "..."} instead of raising;
+    # record is a ToolCallingRecord or, for _call_tool, the raw result
+    result = getattr(record, "result", record)
+    return isinstance(result, dict) and set(result) == {"error"}
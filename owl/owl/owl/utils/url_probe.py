@@ -0,0 +1,109 @@
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ========= Copyright 2023-2024 @ CAMEL-AI.org. All Rights Reserved. =========
+
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Some sites refuse the default python-requests user agent
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+# (connect, read) timeouts of requests made with http_session()
+HTTP_TIMEOUT = (5, 15)
+
+NUMBER_SEGMENT = re.compile(r"^\d+([._-]\d+)*(v\d+)?$")
+ID_SEGMENT = re.compile(r"^(?=.*\d)[0-9a-zA-Z_-]{16,}$")
+
+_local = threading.local()
+
+
+def http_session() -> requests.Session:
+    r"""Keep-alive session of the calling thread, so that repeated requests
+    to a host reuse its connection."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["User-Agent"] = USER_AGENT
+        _local.session = session
+    return session
+
+
+def url_pattern(url: str) -> str:
+    r"""Host and path of a URL with its variable segments (numbers, long
+    ids) replaced, e.g. ``arxiv.org/abs/{n}`` for
+    ``https://arxiv.org/abs/2303.17760v2``."""
+    parsed_url = urlparse(url)
+    segments = []
+    for segment in parsed_url.path.split("/"):
+        if NUMBER_SEGMENT.match(segment):
+            segment = "{n}"
+        elif ID_SEGMENT.match(segment):
+            segment = "{id}"
+        segments.append(segment)
+    return parsed_url.netloc.lower() + "/".join(segments)
+
+
+class UrlTypeCache:
+    r"""Remembers the content type of the URLs of a host and path pattern
+    (see :func:`url_pattern`), so that URLs like ones seen before need no
+    request to tell whether they are webpages.
+
+    Args:
+        max_entries (int): Patterns kept, least recently used are dropped.
+            (default: :obj:`4096`)
+        ttl (float): Seconds an entry stays valid. (default: :obj:`3600`)
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[str]:
+        key = url_pattern(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            content_type, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return content_type
+
+    def set(self, url: str, content_type: str) -> None:
+        r"""Store the media type of a response, e.g. ``text/html``."""
+        key = url_pattern(url)
+        with self._lock:
+            self._entries[key] = (content_type, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# shared by all toolkits of the process
+url_type_cache = UrlTypeCache()
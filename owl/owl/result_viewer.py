@@ -9,36 +9,49 @@
 
 import os
 import http.server
-import socketserver
 import threading
 from pathlib import Path
-import queue
 import json
 from datetime import datetime
 import shutil
 import re
-import sqlite3  # 添加sqlite3导入
+import math
+import html
+import sqlite3
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+from server_utils import PooledHTTPServer, LatencyHistogram, TimedRequestMixin, HTTP_WORKERS
+from history_db import get_connection, db_size_bytes, DB_FILE
 
-# 创建一个全局队列用于存储最新结果
-result_queue = queue.Queue()
 current_result = "等待处理结果..."
 
-# 结果历史记录
-results_history = []
+# WebSocket服务器的事件循环和更新队列，在start_websocket_server中创建
+_ws_loop = None
+_ws_updates = None
+# 每个WebSocket连接最多积压多少条待发送的结果，超出时丢弃最早的
+WS_SEND_BUFFER_SIZE = int(os.getenv("OWL_WS_SEND_BUFFER", "8"))
+
 # 结果历史文件路径 - 使用pathlib获取相对路径
 base_dir = Path(__file__).parent
-HISTORY_FILE = str(base_dir / "owl_results_history.json")
+# 历史数据与数据库放在同一目录，设置OWL_DB_FILE时不会读写默认目录下的历史文件
+history_dir = Path(DB_FILE).parent
+# 旧版历史文件，启动时一次性迁移到数据库
+HISTORY_FILE = str(history_dir / "owl_results_history.json")
+# 只追加的JSONL历史日志，作为数据库之外的文本备份，设置OWL_HISTORY_LOG=0可关闭
+HISTORY_LOG_FILE = str(history_dir / "owl_results_history.jsonl")
+HISTORY_LOG_ENABLED = os.getenv("OWL_HISTORY_LOG", "1").lower() not in ("0", "false", "no")
 # HTML报告目录
 REPORTS_DIR = str(base_dir / "reports")
 os.makedirs(REPORTS_DIR, exist_ok=True)
 
-# 数据库文件路径
-DB_FILE = str(base_dir / "owl_results.db")
+# 历史记录列表每页的默认条数和上限
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
 
 # 初始化数据库
 def init_db():
     """初始化数据库，创建必要的表"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection()
     cursor = conn.cursor()
     
     # 创建结果历史表
@@ -51,163 +64,528 @@ def init_db():
         article_url TEXT,
         scene TEXT,
         images TEXT,
-        tables TEXT
+        tables TEXT,
+        metrics TEXT
     )
     ''')
-    
+
+    # 旧版数据库没有metrics列（运行指标），补充该列
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(results_history)')}
+    if 'metrics' not in columns:
+        cursor.execute('ALTER TABLE results_history ADD COLUMN metrics TEXT')
+
+    # 历史记录按时间倒序分页，按场景筛选时同样按时间排序
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_results_history_timestamp ON results_history (timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_results_history_scene_timestamp ON results_history (scene, timestamp)')
     conn.commit()
-    conn.close()
+
+    init_search_index(conn)
     print(f"数据库初始化完成: {DB_FILE}")
 
-# 加载历史记录
-def load_history():
-    """加载历史记录"""
-    global results_history
-    
-    # 首先尝试从数据库加载
+# 全文索引是否可用（SQLite需要编译FTS5扩展）
+FTS_ENABLED = False
+
+# 初始化全文索引
+def init_search_index(conn):
+    """
+    创建results_history的FTS5全文索引，并用触发器保持同步。
+
+    索引使用trigram分词，中文等不以空格分词的文本也能按子串检索。
+    首次创建时从已有的历史记录重建索引。
+    """
+    global FTS_ENABLED
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row  # 启用行工厂，以便通过名称访问列
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT timestamp, result, instruction, article_url, scene, images, tables
-        FROM results_history
-        ORDER BY timestamp DESC
-        ''')
-        
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'results_history_fts'"
+        ).fetchone()
+        with conn:
+            conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS results_history_fts USING fts5 (
+                instruction, result, scene,
+                content = 'results_history', content_rowid = 'id', tokenize = 'trigram'
+            )
+            ''')
+            conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS results_history_fts_insert AFTER INSERT ON results_history BEGIN
+                INSERT INTO results_history_fts (rowid, instruction, result, scene)
+                VALUES (new.id, new.instruction, new.result, new.scene);
+            END
+            ''')
+            conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS results_history_fts_delete AFTER DELETE ON results_history BEGIN
+                INSERT INTO results_history_fts (results_history_fts, rowid, instruction, result, scene)
+                VALUES ('delete', old.id, old.instruction, old.result, old.scene);
+            END
+            ''')
+            conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS results_history_fts_update AFTER UPDATE ON results_history BEGIN
+                INSERT INTO results_history_fts (results_history_fts, rowid, instruction, result, scene)
+                VALUES ('delete', old.id, old.instruction, old.result, old.scene);
+                INSERT INTO results_history_fts (rowid, instruction, result, scene)
+                VALUES (new.id, new.instruction, new.result, new.scene);
+            END
+            ''')
+            if not exists:
+                conn.execute("INSERT INTO results_history_fts (results_history_fts) VALUES ('rebuild')")
+        FTS_ENABLED = True
+    except sqlite3.OperationalError as e:
+        # 没有FTS5时搜索退回到LIKE逐行匹配
+        print(f"创建全文索引失败，搜索将使用逐行匹配: {str(e)}")
+        FTS_ENABLED = False
+
+# 解析历史记录列表的查询参数
+def parse_history_query(path):
+    """
+    从请求路径中解析历史记录列表的分页参数。
+
+    支持的参数: limit、page、before_id、before_ts（游标，取上一页返回的nextCursor）、scene。
+
+    返回:
+        dict: 可直接传给query_history_page的参数。
+
+    异常:
+        ValueError: 参数格式不正确。
+    """
+    query = parse_qs(urlparse(path).query)
+
+    def get(name):
+        values = query.get(name)
+        return values[0] if values and values[0] != '' else None
+
+    limit = int(get('limit') or HISTORY_PAGE_SIZE)
+    page = int(get('page') or 1)
+    if limit < 1 or page < 1:
+        raise ValueError("limit和page必须为正整数")
+
+    before_id = get('before_id')
+    return {
+        'limit': min(limit, HISTORY_MAX_PAGE_SIZE),
+        'page': page,
+        'before_id': int(before_id) if before_id is not None else None,
+        'before_ts': get('before_ts'),
+        'scene': get('scene'),
+    }
+
+# 分页查询历史记录
+def query_history_page(limit=HISTORY_PAGE_SIZE, page=1, before_id=None, before_ts=None, scene=None):
+    """
+    按时间倒序分页查询历史记录（只返回列表所需的基本信息）。
+
+    传入游标（上一页最后一条记录的before_id/before_ts）时借助timestamp索引
+    直接定位，耗时只与每页条数有关；否则按page计算偏移量，适合跳转到靠前的页码。
+
+    返回:
+        dict: 包含history、total、totalPages、page、limit、hasMore和nextCursor。
+    """
+    cursor = get_connection().cursor()
+
+    filters = []
+    params = []
+    if scene:
+        filters.append('scene = ?')
+        params.append(scene)
+    # 总数只受筛选条件影响，不受游标影响
+    total_where = f"WHERE {' AND '.join(filters)}" if filters else ''
+    total_params = list(params)
+
+    # 只给了before_id时，取该记录的时间作为游标
+    if before_id is not None and before_ts is None:
+        cursor.execute('SELECT timestamp FROM results_history WHERE id = ?', (before_id,))
+        row = cursor.fetchone()
+        if row:
+            before_ts = row['timestamp']
+
+    offset = 0
+    if before_ts is not None and before_id is not None:
+        # 时间相同的记录再按ID排序，翻页时不会重复或遗漏
+        filters.append('timestamp <= ? AND (timestamp < ? OR id < ?)')
+        params.extend([before_ts, before_ts, before_id])
+    elif before_ts is not None:
+        filters.append('timestamp < ?')
+        params.append(before_ts)
+    elif before_id is not None:
+        filters.append('id < ?')
+        params.append(before_id)
+    else:
+        offset = (page - 1) * limit
+
+    where = f"WHERE {' AND '.join(filters)}" if filters else ''
+    # 多取一条，用于判断是否还有下一页
+    cursor.execute(f'''
+    SELECT id, timestamp, instruction, scene
+    FROM results_history
+    {where}
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ? OFFSET ?
+    ''', params + [limit + 1, offset])
+    rows = cursor.fetchall()
+
+    cursor.execute(f'SELECT COUNT(*) FROM results_history {total_where}', total_params)
+    total = cursor.fetchone()[0]
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    history = [{
+        'id': row['id'],
+        'timestamp': row['timestamp'],
+        'instruction': row['instruction'],
+        'scene': row['scene']
+    } for row in rows]
+
+    next_cursor = None
+    if has_more:
+        next_cursor = {'before_id': rows[-1]['id'], 'before_ts': rows[-1]['timestamp']}
+
+    return {
+        'history': history,
+        'total': total,
+        'totalPages': max(1, math.ceil(total / limit)),
+        'page': page,
+        'limit': limit,
+        'hasMore': has_more,
+        'nextCursor': next_cursor
+    }
+
+# 搜索结果中标记命中位置的控制字符，转义HTML后再替换为<mark>标签
+HIGHLIGHT_OPEN = '\x02'
+HIGHLIGHT_CLOSE = '\x03'
+
+def _render_highlight(text, terms=None):
+    """转义HTML并把命中位置替换为<mark>标签；terms不为空时按关键词标记"""
+    if not text:
+        return ''
+    if terms:
+        for term in terms:
+            text = text.replace(term, f'{HIGHLIGHT_OPEN}{term}{HIGHLIGHT_CLOSE}')
+    return html.escape(text).replace(HIGHLIGHT_OPEN, '<mark>').replace(HIGHLIGHT_CLOSE, '</mark>')
+
+# 解析历史记录搜索的查询参数
+def parse_history_search_query(path):
+    """
+    从请求路径中解析历史记录搜索参数: q（必填）、limit、page、scene。
+
+    异常:
+        ValueError: 缺少关键词或参数格式不正确。
+    """
+    query = parse_history_query(path)
+    values = parse_qs(urlparse(path).query).get('q')
+    q = values[0].strip() if values else ''
+    if not q:
+        raise ValueError("缺少搜索关键词q")
+    return {'q': q, 'limit': query['limit'], 'page': query['page'], 'scene': query['scene']}
+
+# 全文搜索历史记录
+def search_history(q, limit=HISTORY_PAGE_SIZE, page=1, scene=None):
+    """
+    在历史记录的指令、结果和场景中搜索关键词，按相关度排序分页返回。
+
+    空格分隔的多个关键词需要同时命中。全文索引按三个字符切分，
+    关键词都不短于三个字符时使用FTS5索引并按bm25排序；
+    否则（或没有FTS5时）退回到LIKE逐行匹配，按时间倒序返回。
+
+    返回:
+        dict: 包含history（带<mark>高亮的instruction和snippet）、total、totalPages、
+            page、limit、hasMore和mode（fts或like）。
+    """
+    cursor = get_connection().cursor()
+    terms = q.split()
+    offset = (page - 1) * limit
+
+    if FTS_ENABLED and all(len(term) >= 3 for term in terms):
+        mode = 'fts'
+        # 每个关键词加引号作为短语匹配，避免用户输入被解析为FTS5查询语法
+        match = ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+        filters = ['results_history_fts MATCH ?']
+        params = [match]
+        if scene:
+            filters.append('h.scene = ?')
+            params.append(scene)
+        where = ' AND '.join(filters)
+        from_clause = 'FROM results_history_fts JOIN results_history h ON h.id = results_history_fts.rowid'
+        # 指令的权重高于结果正文，场景最低
+        cursor.execute(f'''
+        SELECT h.id, h.timestamp, h.scene,
+            highlight(results_history_fts, 0, ?, ?) AS instruction,
+            snippet(results_history_fts, 1, ?, ?, '…', 24) AS snippet,
+            bm25(results_history_fts, 4.0, 1.0, 0.5) AS score
+        {from_clause}
+        WHERE {where}
+        ORDER BY score
+        LIMIT ? OFFSET ?
+        ''', [HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE] * 2 + params + [limit + 1, offset])
         rows = cursor.fetchall()
-        conn.close()
-        
-        if rows:
-            results_history = []
-            for row in rows:
-                item = {
-                    "timestamp": row["timestamp"],
-                    "result": row["result"],
-                    "instruction": row["instruction"],
-                    "article_url": row["article_url"],
-                    "scene": row["scene"]
-                }
-                
-                # 处理JSON格式的字段
-                if row["images"]:
-                    try:
-                        item["images"] = json.loads(row["images"])
-                    except:
-                        item["images"] = []
-                
-                if row["tables"]:
-                    try:
-                        item["tables"] = json.loads(row["tables"])
-                    except:
-                        item["tables"] = []
-                
-                results_history.append(item)
-            
-            print(f"从数据库加载了 {len(results_history)} 条历史记录")
-            return
-    except Exception as e:
-        print(f"从数据库加载历史记录时出错: {str(e)}")
-    
-    # 如果数据库加载失败，则尝试从JSON文件加载
-    try:
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                file_content = f.read().strip()
-                if file_content:  # 检查文件是否为空
-                    results_history = json.loads(file_content)
-                else:
-                    results_history = []  # 如果文件为空，初始化为空列表
-                
-            # 确保历史记录按时间戳倒序排列
-            results_history = sorted(results_history, 
-                                    key=lambda x: x.get('timestamp', ''), 
-                                    reverse=True)
-            
-            # 数据库和JSON文件同步
-            if results_history:
-                sync_history_to_db()
+        cursor.execute(f'SELECT COUNT(*) {from_clause} WHERE {where}', params)
+        total = cursor.fetchone()[0]
+        highlight_terms = None
+    else:
+        mode = 'like'
+        filters = []
+        params = []
+        for term in terms:
+            pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            filters.append("(h.instruction LIKE ? ESCAPE '\\' OR h.result LIKE ? ESCAPE '\\' OR h.scene LIKE ? ESCAPE '\\')")
+            params.extend([pattern] * 3)
+        if scene:
+            filters.append('h.scene = ?')
+            params.append(scene)
+        where = ' AND '.join(filters)
+        # 摘要取第一个关键词在结果中出现位置附近的一段文字
+        cursor.execute(f'''
+        SELECT h.id, h.timestamp, h.scene, h.instruction,
+            substr(h.result, max(1, instr(h.result, ?) - 40), 120) AS snippet,
+            NULL AS score
+        FROM results_history h
+        WHERE {where}
+        ORDER BY h.timestamp DESC, h.id DESC
+        LIMIT ? OFFSET ?
+        ''', [terms[0]] + params + [limit + 1, offset])
+        rows = cursor.fetchall()
+        cursor.execute(f'SELECT COUNT(*) FROM results_history h WHERE {where}', params)
+        total = cursor.fetchone()[0]
+        highlight_terms = terms
+
+    has_more = len(rows) > limit
+    history = [{
+        'id': row['id'],
+        'timestamp': row['timestamp'],
+        'scene': row['scene'],
+        'instruction': _render_highlight(row['instruction'], highlight_terms),
+        'snippet': _render_highlight(row['snippet'], highlight_terms),
+        'score': row['score']
+    } for row in rows[:limit]]
+
+    return {
+        'history': history,
+        'total': total,
+        'totalPages': max(1, math.ceil(total / limit)),
+        'page': page,
+        'limit': limit,
+        'hasMore': has_more,
+        'query': q,
+        'mode': mode
+    }
+
+# 解析运行指标统计的查询参数
+def parse_run_stats_query(path):
+    """
+    从请求路径中解析运行指标统计的筛选参数: scene、since（起始时间，如2025-04-01）。
+
+    异常:
+        ValueError: since不是有效的日期时间。
+    """
+    query = parse_qs(urlparse(path).query)
+    scene = (query.get('scene') or [''])[0] or None
+    since = (query.get('since') or [''])[0] or None
+    if since is not None:
+        for fmt in ('%Y-%m-%d', '%Y-%m-%d %H:%M:%S'):
+            try:
+                datetime.strptime(since, fmt)
+                break
+            except ValueError:
+                continue
         else:
-            results_history = []
+            raise ValueError("since的格式应为YYYY-MM-DD或YYYY-MM-DD HH:MM:SS")
+    return {'scene': scene, 'since': since}
+
+# 汇总历史记录中的运行指标
+def aggregate_run_metrics(scene=None, since=None):
+    """
+    汇总历史记录中保存的运行指标（场景脚本run_society返回的token_info["metrics"]），
+    按场景、模型、智能体和工具分别统计耗时与token用量，用于找出时间和费用花在哪里。
+
+    统计直接用SQLite的JSON函数在数据库中完成，不需要把每条记录的指标读入内存。
+
+    返回:
+        dict: 总计、平均值以及byScene、byModel、byAgent、byTool列表（按耗时倒序）。
+    """
+    cursor = get_connection().cursor()
+    filters = ['h.metrics IS NOT NULL']
+    params = []
+    if scene:
+        filters.append('h.scene = ?')
+        params.append(scene)
+    if since:
+        filters.append('h.timestamp >= ?')
+        params.append(since)
+    where = ' AND '.join(filters)
+
+    cursor.execute(f'''
+    SELECT h.scene AS scene,
+        COUNT(*) AS runs,
+        TOTAL(json_extract(h.metrics, '$.rounds')) AS rounds,
+        TOTAL(json_extract(h.metrics, '$.wall_seconds')) AS wall_seconds,
+        TOTAL(json_extract(h.metrics, '$.llm.seconds')) AS llm_seconds,
+        TOTAL(json_extract(h.metrics, '$.tool_seconds')) AS tool_seconds,
+        TOTAL(json_extract(h.metrics, '$.llm.prompt_tokens')) AS prompt_tokens,
+        TOTAL(json_extract(h.metrics, '$.llm.completion_tokens')) AS completion_tokens,
+        TOTAL(json_extract(h.metrics, '$.prompt_tokens_saved')) AS prompt_tokens_saved
+    FROM results_history h
+    WHERE {where}
+    GROUP BY h.scene
+    ORDER BY wall_seconds DESC
+    ''', params)
+    by_scene = [{
+        'scene': row['scene'],
+        'runs': row['runs'],
+        'rounds': int(row['rounds']),
+        'wallSeconds': round(row['wall_seconds'], 3),
+        'llmSeconds': round(row['llm_seconds'], 3),
+        'toolSeconds': round(row['tool_seconds'], 3),
+        'promptTokens': int(row['prompt_tokens']),
+        'completionTokens': int(row['completion_tokens']),
+        'promptTokensSaved': int(row['prompt_tokens_saved']),
+    } for row in cursor.fetchall()]
+
+    def usage_breakdown(section, key):
+        # 展开每条记录指标中的models/agents对象，按名称汇总
+        cursor.execute(f'''
+        SELECT e.key AS name,
+            TOTAL(json_extract(e.value, '$.calls')) AS calls,
+            TOTAL(json_extract(e.value, '$.seconds')) AS seconds,
+            TOTAL(json_extract(e.value, '$.prompt_tokens')) AS prompt_tokens,
+            TOTAL(json_extract(e.value, '$.completion_tokens')) AS completion_tokens
+        FROM results_history h, json_each(h.metrics, '$.{section}') e
+        WHERE {where}
+        GROUP BY e.key
+        ORDER BY seconds DESC
+        ''', params)
+        return [{
+            key: row['name'],
+            'calls': int(row['calls']),
+            'seconds': round(row['seconds'], 3),
+            'avgSeconds': round(row['seconds'] / row['calls'], 3) if row['calls'] else 0,
+            'promptTokens': int(row['prompt_tokens']),
+            'completionTokens': int(row['completion_tokens']),
+        } for row in cursor.fetchall()]
+
+    cursor.execute(f'''
+    SELECT e.key AS name,
+        TOTAL(json_extract(e.value, '$.calls')) AS calls,
+        TOTAL(json_extract(e.value, '$.errors')) AS errors,
+        TOTAL(json_extract(e.value, '$.seconds')) AS seconds,
+        MAX(json_extract(e.value, '$.max_seconds')) AS max_seconds
+    FROM results_history h, json_each(h.metrics, '$.tools') e
+    WHERE {where}
+    GROUP BY e.key
+    ORDER BY seconds DESC
+    ''', params)
+    by_tool = [{
+        'tool': row['name'],
+        'calls': int(row['calls']),
+        'errors': int(row['errors']),
+        'seconds': round(row['seconds'], 3),
+        'avgSeconds': round(row['seconds'] / row['calls'], 3) if row['calls'] else 0,
+        'maxSeconds': round(row['max_seconds'] or 0, 3),
+    } for row in cursor.fetchall()]
+
+    runs = sum(item['runs'] for item in by_scene)
+    totals = {
+        field: sum(item[field] for item in by_scene)
+        for field in ('rounds', 'wallSeconds', 'llmSeconds', 'toolSeconds',
+                      'promptTokens', 'completionTokens', 'promptTokensSaved')
+    }
+    return {
+        'runs': runs,
+        **{field: round(value, 3) for field, value in totals.items()},
+        'avgRounds': round(totals['rounds'] / runs, 2) if runs else 0,
+        'avgWallSeconds': round(totals['wallSeconds'] / runs, 3) if runs else 0,
+        'byScene': by_scene,
+        'byModel': usage_breakdown('models', 'model'),
+        'byAgent': usage_breakdown('agents', 'agent'),
+        'byTool': by_tool,
+    }
+
+# 插入一条历史记录的SQL
+INSERT_HISTORY_SQL = '''
+INSERT INTO results_history 
+(timestamp, result, instruction, article_url, scene, images, tables, metrics)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def _history_row(item):
+    """把历史记录条目转换为INSERT_HISTORY_SQL的参数"""
+    # 处理复杂字段
+    images = json.dumps(item.get('images', []), ensure_ascii=False) if item.get('images') else None
+    tables = json.dumps(item.get('tables', []), ensure_ascii=False) if item.get('tables') else None
+    metrics = json.dumps(item['metrics'], ensure_ascii=False) if item.get('metrics') else None
+    return (
+        item.get('timestamp', ''),
+        item.get('result', ''),
+        item.get('instruction', ''),
+        item.get('article_url', ''),
+        item.get('scene', '默认场景'),
+        images,
+        tables,
+        metrics,
+    )
+
+def _append_history_log(items):
+    """把历史记录追加到JSONL日志（每行一条记录，只追加不重写）"""
+    if not HISTORY_LOG_ENABLED or not items:
+        return
+    try:
+        with open(HISTORY_LOG_FILE, 'a', encoding='utf-8') as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False) + '\n')
     except Exception as e:
-        print(f"从JSON文件加载历史记录时出错: {str(e)}")
-        results_history = []
+        print(f"追加历史记录到JSONL日志出错: {str(e)}")
+
+# 保存一条新的历史记录
+def append_history(entry):
+    """
+    把一条新的历史记录写入数据库并追加到JSONL日志。
+
+    只插入这一行，写入耗时与已有历史记录的数量无关。
+
+    参数:
+        entry (dict): 历史记录条目。
 
-# 将JSON文件中的历史记录同步到数据库
-def sync_history_to_db():
-    """将JSON文件中的历史记录同步到数据库中"""
+    返回:
+        int: 新记录在数据库中的ID，写入失败时返回None。
+    """
+    entry_id = None
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # 清空数据库中的历史记录
-        cursor.execute('DELETE FROM results_history')
-        
-        # 将JSON中的历史记录插入数据库
-        for item in results_history:
-            timestamp = item.get('timestamp', '')
-            result = item.get('result', '')
-            instruction = item.get('instruction', '')
-            article_url = item.get('article_url', '')
-            scene = item.get('scene', '默认场景')
-            
-            # 处理复杂字段
-            images = json.dumps(item.get('images', [])) if item.get('images') else None
-            tables = json.dumps(item.get('tables', [])) if item.get('tables') else None
-            
-            cursor.execute('''
-            INSERT INTO results_history 
-            (timestamp, result, instruction, article_url, scene, images, tables)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (timestamp, result, instruction, article_url, scene, images, tables))
-        
-        conn.commit()
-        conn.close()
-        print(f"已同步 {len(results_history)} 条历史记录到数据库")
+        conn = get_connection()
+        with conn:  # 单个事务，出错时自动回滚
+            entry_id = conn.execute(INSERT_HISTORY_SQL, _history_row(entry)).lastrowid
     except Exception as e:
-        print(f"同步历史记录到数据库时出错: {str(e)}")
+        print(f"保存历史记录到数据库出错: {str(e)}")
+    
+    _append_history_log([dict(entry, id=entry_id)])
+    return entry_id
 
-# 保存历史记录
-def save_history():
-    """保存历史记录到JSON文件和数据库"""
-    # 保存到JSON文件
+# 迁移旧版历史记录文件
+def migrate_legacy_history():
+    """
+    一次性迁移旧版的JSON历史文件。
+
+    旧版每次更新都会整体重写该文件和数据库。数据库为空时把文件中的记录导入数据库，
+    之后将文件重命名为.migrated，不再读写。
+    """
+    if not os.path.exists(HISTORY_FILE):
+        return
+    
     try:
-        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(results_history, f, ensure_ascii=False, indent=2)
+        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
+            file_content = f.read().strip()
+        items = json.loads(file_content) if file_content else []
     except Exception as e:
-        print(f"保存历史记录到JSON文件出错: {str(e)}")
+        print(f"读取旧版历史记录文件时出错，跳过迁移: {str(e)}")
+        return
     
-    # 保存到数据库
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # 清空当前记录
-        cursor.execute('DELETE FROM results_history')
-        
-        # 插入最新的记录
-        for item in results_history:
-            timestamp = item.get('timestamp', '')
-            result = item.get('result', '')
-            instruction = item.get('instruction', '')
-            article_url = item.get('article_url', '')
-            scene = item.get('scene', '默认场景')
-            
-            # 处理复杂字段
-            images = json.dumps(item.get('images', [])) if item.get('images') else None
-            tables = json.dumps(item.get('tables', [])) if item.get('tables') else None
-            
-            cursor.execute('''
-            INSERT INTO results_history 
-            (timestamp, result, instruction, article_url, scene, images, tables)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (timestamp, result, instruction, article_url, scene, images, tables))
-        
-        conn.commit()
-        conn.close()
+        conn = get_connection()
+        existing = conn.execute('SELECT COUNT(*) FROM results_history').fetchone()[0]
+        if existing == 0 and items:
+            # 按时间正序插入，使ID与时间顺序一致
+            items = sorted(items, key=lambda x: x.get('timestamp', ''))
+            with conn:
+                conn.executemany(INSERT_HISTORY_SQL, [_history_row(item) for item in items])
+            _append_history_log(items)
+            print(f"已从旧版历史记录文件迁移 {len(items)} 条记录到数据库")
+        os.replace(HISTORY_FILE, HISTORY_FILE + ".migrated")
     except Exception as e:
-        print(f"保存历史记录到数据库出错: {str(e)}")
+        print(f"迁移旧版历史记录文件时出错: {str(e)}")
 
 # HTML模板
 HTML_TEMPLATE = """
@@ -276,6 +654,11 @@ HTML_TEMPLATE = """
             margin-bottom: 12px;
             white-space: pre-wrap;
         }}
+        .history-sentinel {{
+            text-align: center;
+            color: #888;
+            padding: 10px;
+        }}
         .history-container {{
             margin-top: 15px;
         }}
@@ -428,6 +811,15 @@ HTML_TEMPLATE = """
             display: flex;
             gap: 10px;
         }}
+        .search-snippet {{
+            color: #555;
+            margin: 6px 0;
+            font-size: 0.95em;
+        }}
+        .search-snippet mark, .instruction mark {{
+            background-color: #ffe58f;
+            padding: 0 1px;
+        }}
         .search-input {{
             flex-grow: 1;
             padding: 8px;
@@ -510,16 +902,45 @@ HTML_TEMPLATE = """
         document.addEventListener('DOMContentLoaded', function() {{
             const resultArea = document.getElementById('result-area');
 
+            // 只解析尚未解析过的元素，滚动加载新记录时不会重复解析已有内容
             const parseMarkdownElements = () => {{
-                document.querySelectorAll('.content').forEach(element => {{
+                document.querySelectorAll('.content:not([data-parsed])').forEach(element => {{
                     const raw = element.textContent;
                     const clean = DOMPurify.sanitize(raw);
+                    element.setAttribute('data-parsed', '1');
                     element.innerHTML = marked.parse(clean);
                 }});
             }};
 
             parseMarkdownElements();
             
+            // 历史记录滚动到底部时按游标加载下一页
+            const historyObserver = new IntersectionObserver(entries => {{
+                entries.forEach(entry => {{
+                    if (!entry.isIntersecting) return;
+                    const sentinel = entry.target;
+                    historyObserver.unobserve(sentinel);
+                    const url = `/api/history/fragments?before_id=${{sentinel.dataset.beforeId}}&before_ts=${{encodeURIComponent(sentinel.dataset.beforeTs)}}`;
+                    fetch(url)
+                        .then(response => response.json())
+                        .then(data => {{
+                            if (data.status === 'success') {{
+                                sentinel.insertAdjacentHTML('beforebegin', data.html);
+                                sentinel.remove();
+                                observeHistorySentinel();
+                            }}
+                        }})
+                        .catch(error => {{
+                            console.error('加载更多历史记录出错:', error);
+                            historyObserver.observe(sentinel);
+                        }});
+                }});
+            }});
+            const observeHistorySentinel = () => {{
+                document.querySelectorAll('.history-sentinel').forEach(sentinel => historyObserver.observe(sentinel));
+            }};
+            observeHistorySentinel();
+            
             // 建立WebSocket连接
             const ws = new WebSocket('ws://localhost:{ws_port}');
             
@@ -600,10 +1021,21 @@ HTML_TEMPLATE = """
             }};
             
             // 加载数据库历史记录
+            // 已知的各页游标：翻到相邻页时按游标查询，不必让数据库跳过前面的所有记录
+            let historyCursors = {{}};
+            let historySearch = '';
             const loadDbHistory = (page = 1, search = '') => {{
+                if (search !== historySearch) {{
+                    historyCursors = {{}};
+                    historySearch = search;
+                }}
                 let url = `/api/history?page=${{page}}`;
+                const cursor = historyCursors[page];
                 if (search) {{
-                    url += `&search=${{encodeURIComponent(search)}}`;
+                    // 全文搜索按相关度排序，返回带高亮的摘要
+                    url = `/api/history/search?q=${{encodeURIComponent(search)}}&page=${{page}}`;
+                }} else if (cursor) {{
+                    url += `&before_id=${{cursor.before_id}}&before_ts=${{encodeURIComponent(cursor.before_ts)}}`;
                 }}
                 
                 fetch(url)
@@ -612,6 +1044,9 @@ HTML_TEMPLATE = """
                         if (data.status === 'success') {{
                             const historyList = document.getElementById('db-history-list');
                             historyList.innerHTML = '';
+                            if (data.nextCursor) {{
+                                historyCursors[page + 1] = data.nextCursor;
+                            }}
                             
                             data.history.forEach(item => {{
                                 const historyItem = document.createElement('div');
@@ -621,6 +1056,7 @@ HTML_TEMPLATE = """
                                     <div class="timestamp">${{item.timestamp}}</div>
                                     <div class="scene-tag"><span>场景: ${{item.scene || '默认场景'}}</span></div>
                                     <div class="instruction"><strong>指令:</strong> <em>${{item.instruction || '无指令'}}</em></div>
+                                    ${{item.snippet ? `<div class="search-snippet">${{item.snippet}}</div>` : ''}}
                                     <button class="secondary view-detail-btn" data-id="${{item.id}}">查看详情</button>
                                 `;
                                 historyList.appendChild(historyItem);
@@ -647,8 +1083,19 @@ HTML_TEMPLATE = """
                                     pagination.appendChild(prevBtn);
                                 }}
                                 
-                                // 页码
-                                for (let i = 1; i <= data.totalPages; i++) {{
+                                // 页码：只显示首页、末页和当前页附近的页码
+                                const pages = new Set([1, data.totalPages]);
+                                for (let i = Math.max(1, page - 2); i <= Math.min(data.totalPages, page + 2); i++) {{
+                                    pages.add(i);
+                                }}
+                                let lastPage = 0;
+                                [...pages].sort((a, b) => a - b).forEach(i => {{
+                                    if (i - lastPage > 1) {{
+                                        const gap = document.createElement('span');
+                                        gap.textContent = '…';
+                                        pagination.appendChild(gap);
+                                    }}
+                                    lastPage = i;
                                     const pageBtn = document.createElement('button');
                                     pageBtn.textContent = i;
                                     if (i === page) {{
@@ -656,7 +1103,7 @@ HTML_TEMPLATE = """
                                     }}
                                     pageBtn.addEventListener('click', () => loadDbHistory(i, search));
                                     pagination.appendChild(pageBtn);
-                                }}
+                                }});
                                 
                                 // 下一页按钮
                                 if (page < data.totalPages) {{
@@ -827,7 +1274,7 @@ HTML_TEMPLATE = """
             
             <div class="search-container">
                 <form id="search-form">
-                    <input type="text" id="search-input" class="search-input" placeholder="搜索指令或场景...">
+                    <input type="text" id="search-input" class="search-input" placeholder="搜索指令、结果或场景...">
                     <button type="submit" class="secondary">搜索</button>
                 </form>
             </div>
@@ -865,16 +1312,188 @@ HTML_TEMPLATE = """
 </html>
 """
 
+# 结果查看器的请求延迟统计
+viewer_latency = LatencyHistogram()
+
+# 首页直接渲染的历史记录条数
+HOME_HISTORY_PAGE_SIZE = 10
+# 最多缓存多少条历史记录的HTML片段
+FRAGMENT_CACHE_SIZE = 500
+
+# 历史记录HTML片段缓存：记录写入后不再修改，片段按ID缓存，清除历史记录时清空
+_fragment_cache = OrderedDict()
+# 首页第一页的HTML及下一页游标，新增记录时失效
+_home_history_cache = None
+# 每次失效时加一，渲染期间失效过的结果不写入缓存
+_home_history_generation = 0
+_fragment_lock = threading.Lock()
+
+def invalidate_history_cache(clear_fragments=False):
+    """使首页历史记录缓存失效；clear_fragments为True时同时清空片段缓存"""
+    global _home_history_cache, _home_history_generation
+    with _fragment_lock:
+        _home_history_cache = None
+        _home_history_generation += 1
+        if clear_fragments:
+            _fragment_cache.clear()
+
+def render_history_item(item):
+    """渲染单条历史记录的HTML片段（包括图像和表格）"""
+    timestamp = item.get('timestamp', '')
+    result = item.get('result', '')
+    instruction = item.get('instruction', '')
+    images = item.get('images', [])
+    tables = item.get('tables', [])
+    scene = item.get('scene', '默认场景')
+    
+    # 添加指令显示区域
+    instruction_html = ""
+    if instruction and instruction.strip():
+        # 对指令进行HTML转义，防止XSS攻击
+        instruction = instruction.replace('<', '&lt;').replace('>', '&gt;')
+        instruction_html = f'<div class="instruction"><strong>指令:</strong> <em>{instruction}</em></div>'
+    
+    # 添加场景显示
+    scene_html = f'<div class="scene-tag"><span>场景: {scene}</span></div>'
+    
+    # 添加图像显示区域
+    images_html = ""
+    if images:
+        images_html = '<div class="image-section"><h3>提取的图像</h3>'
+        for i, img in enumerate(images):
+            img_path = img.get('path', '')
+            img_desc = img.get('description', '图像描述')
+            if img_path:
+                images_html += f'''
+                <div class="image-container">
+                    <img src="/images/{img_path}" alt="图像 {i+1}" loading="lazy">
+                    <p class="image-description">{img_desc}</p>
+                </div>
+                '''
+        images_html += '</div>'
+    
+    # 添加表格显示区域
+    tables_html = ""
+    if tables:
+        tables_html = '<div class="table-section"><h3>提取的表格</h3>'
+        for i, table in enumerate(tables):
+            table_data = table.get('data', '')
+            table_desc = table.get('description', '表格描述')
+            tables_html += f'''
+            <div class="table-container">
+                <p class="table-description">{table_desc}</p>
+                {table_data}
+            </div>
+            '''
+        tables_html += '</div>'
+    
+    return f"""
+    <div class="history-item">
+        <h3>任务结果</h3>
+        <div class="timestamp">{timestamp}</div>
+        {scene_html}
+        {instruction_html}
+        <div class="content">{result}</div>
+        {images_html}
+        {tables_html}
+    </div>
+    """
+
+def render_history_fragments(limit=HOME_HISTORY_PAGE_SIZE, before_id=None, before_ts=None):
+    """
+    按时间倒序渲染一页历史记录的HTML。
+
+    先通过索引取出这一页的ID，只有不在片段缓存中的记录才读取完整内容并渲染。
+
+    返回:
+        tuple: (HTML字符串, 下一页游标或None)
+    """
+    page = query_history_page(limit=limit, before_id=before_id, before_ts=before_ts)
+    ids = [item['id'] for item in page['history']]
+    
+    with _fragment_lock:
+        fragments = {record_id: _fragment_cache[record_id] for record_id in ids if record_id in _fragment_cache}
+    
+    missing = [record_id for record_id in ids if record_id not in fragments]
+    if missing:
+        placeholders = ','.join('?' * len(missing))
+        cursor = get_connection().cursor()
+        cursor.execute(f'''
+        SELECT id, timestamp, result, instruction, scene, images, tables
+        FROM results_history
+        WHERE id IN ({placeholders})
+        ''', missing)
+        for row in cursor.fetchall():
+            item = {
+                'timestamp': row['timestamp'],
+                'result': row['result'],
+                'instruction': row['instruction'],
+                'scene': row['scene']
+            }
+            # 处理JSON格式的字段
+            for field in ('images', 'tables'):
+                if row[field]:
+                    try:
+                        item[field] = json.loads(row[field])
+                    except:
+                        item[field] = []
+            fragments[row['id']] = render_history_item(item)
+        
+        with _fragment_lock:
+            for record_id in missing:
+                if record_id in fragments:
+                    _fragment_cache[record_id] = fragments[record_id]
+            while len(_fragment_cache) > FRAGMENT_CACHE_SIZE:
+                _fragment_cache.popitem(last=False)
+    
+    history_html = ''.join(fragments[record_id] for record_id in ids if record_id in fragments)
+    return history_html, page['nextCursor']
+
+def render_home_history():
+    """渲染首页的历史记录区域：第一页记录，以及用于滚动加载下一页的标记"""
+    global _home_history_cache
+    with _fragment_lock:
+        cached = _home_history_cache
+        generation = _home_history_generation
+    if cached is not None:
+        return cached
+    
+    history_html, next_cursor = render_history_fragments(HOME_HISTORY_PAGE_SIZE)
+    history_html += _history_sentinel(next_cursor)
+    with _fragment_lock:
+        # 渲染期间有新记录写入时，结果可能已过期，只返回不缓存
+        if generation == _home_history_generation:
+            _home_history_cache = history_html
+    return history_html
+
+def _history_sentinel(next_cursor):
+    """生成滚动加载标记，前端看到它时按其中的游标请求下一页"""
+    if not next_cursor:
+        return ''
+    return (
+        f'<div class="history-sentinel" data-before-id="{next_cursor["before_id"]}" '
+        f'data-before-ts="{html.escape(next_cursor["before_ts"], quote=True)}">加载中...</div>'
+    )
+
 # 自定义HTTP请求处理器
-class ResultViewerHandler(http.server.SimpleHTTPRequestHandler):
+class ResultViewerHandler(TimedRequestMixin, http.server.SimpleHTTPRequestHandler):
+    # 记录各接口的请求耗时
+    latency_histogram = viewer_latency
+
     def do_GET(self):
         # 添加调试日志
         print(f"收到GET请求: {self.path}")
         
         # 处理图像请求
         if self.path.startswith('/images/'):
+            image_path = self.path[8:]
             try:
-                image_path = self.path[8:]
+                f = open(image_path, 'rb')
+            except Exception as e:
+                print(f"提供图像时出错: {str(e)}")
+                self.send_error(404, "File not found")
+                return
+            with f:
                 self.send_response(200)
                 if image_path.endswith('.png'):
                     self.send_header('Content-type', 'image/png')
@@ -882,35 +1501,75 @@ class ResultViewerHandler(http.server.SimpleHTTPRequestHandler):
                     self.send_header('Content-type', 'image/jpeg')
                 else:
                     self.send_header('Content-type', 'application/octet-stream')
+                self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
                 self.end_headers()
-                with open(image_path, 'rb') as f:
-                    self.wfile.write(f.read())
-                return
-            except Exception as e:
-                print(f"提供图像时出错: {str(e)}")
-                self.send_error(404, "File not found")
+                # 分块发送，避免把大文件整个读入内存
+                shutil.copyfileobj(f, self.wfile)
+            return
+        # 请求延迟统计
+        elif self.path == '/api/metrics/latency':
+            self._send_json({
+                'status': 'success',
+                'workers': HTTP_WORKERS,
+                **viewer_latency.snapshot()
+            })
+            return
+        # 运行指标汇总（耗时、token用量）
+        elif self.path.split('?', 1)[0] == '/api/metrics/runs':
+            try:
+                query = parse_run_stats_query(self.path)
+            except ValueError as e:
+                self.send_error(400, f"无效的统计参数: {str(e)}")
                 return
+            self._send_json({
+                'status': 'success',
+                **aggregate_run_metrics(**query)
+            })
+            return
         # 处理数据库统计API
         elif self.path == '/api/db-stats':
             print("处理数据库统计请求")
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')  # 添加CORS头
-            self.end_headers()
-            
             stats = self._get_db_stats()
-            response = json.dumps({
+            response = {
                 'status': 'success',
                 **stats
-            })
+            }
             print(f"数据库统计响应: {response}")
-            self.wfile.write(response.encode('utf-8'))
+            self._send_json(response)
             return
         # 处理历史记录API
         elif self.path.startswith('/api/history'):
             print(f"处理历史记录请求: {self.path}")
+            # 首页滚动加载的历史记录HTML片段
+            if self.path.split('?', 1)[0] == '/api/history/fragments':
+                try:
+                    query = parse_history_query(self.path)
+                except ValueError as e:
+                    self.send_error(400, f"无效的分页参数: {str(e)}")
+                    return
+                history_html, next_cursor = render_history_fragments(
+                    min(query['limit'], HOME_HISTORY_PAGE_SIZE), query['before_id'], query['before_ts']
+                )
+                self._send_json({
+                    'status': 'success',
+                    'html': history_html + _history_sentinel(next_cursor),
+                    'nextCursor': next_cursor
+                })
+                return
+            # 全文搜索历史记录
+            elif self.path.split('?', 1)[0] == '/api/history/search':
+                try:
+                    query = parse_history_search_query(self.path)
+                except ValueError as e:
+                    self.send_error(400, f"无效的搜索参数: {str(e)}")
+                    return
+                self._send_json({
+                    'status': 'success',
+                    **search_history(**query)
+                })
+                return
             # 检查是否是单条记录详情请求
-            if self.path.startswith('/api/history/'):
+            elif self.path.startswith('/api/history/'):
                 record_id = self.path.split('/')[-1]
                 if not record_id.isdigit():
                     self.send_error(400, "无效的记录ID")
@@ -918,119 +1577,58 @@ class ResultViewerHandler(http.server.SimpleHTTPRequestHandler):
                 
                 record = self._get_history_detail_from_db(int(record_id))
                 if record:
-                    self.send_response(200)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Access-Control-Allow-Origin', '*')  # 添加CORS头
-                    self.end_headers()
-                    response = json.dumps({
+                    print(f"记录详情响应: {record['id']}")
+                    self._send_json({
                         'status': 'success',
                         'record': record
                     })
-                    print(f"记录详情响应: {record['id']}")
-                    self.wfile.write(response.encode('utf-8'))
                 else:
                     self.send_error(404, "Record not found")
                 return
             else:
                 # 处理历史记录列表请求
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')  # 添加CORS头
-                self.end_headers()
-                
-                history = self._get_history_from_db()
-                response = json.dumps({
+                try:
+                    query = parse_history_query(self.path)
+                except ValueError as e:
+                    self.send_error(400, f"无效的分页参数: {str(e)}")
+                    return
+                page = query_history_page(**query)
+                print(f"历史记录响应: 找到{len(page['history'])}条记录")
+                self._send_json({
                     'status': 'success',
-                    'history': history,
-                    'totalPages': 1
+                    **page
                 })
-                print(f"历史记录响应: 找到{len(history)}条记录")
-                self.wfile.write(response.encode('utf-8'))
                 return
         elif self.path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            
             # 初始化当前结果为空
             global current_result
             current_result = "准备好接收新任务..."
             
-            history_html = ""
-            sorted_history = sorted(results_history, 
-                                   key=lambda x: x.get('timestamp', ''), 
-                                   reverse=True)
-            
-            for item in sorted_history:
-                timestamp = item.get('timestamp', '')
-                result = item.get('result', '')
-                instruction = item.get('instruction', '')
-                images = item.get('images', [])
-                tables = item.get('tables', [])
-                scene = item.get('scene', '默认场景')
-                
-                # 添加指令显示区域
-                instruction_html = ""
-                if instruction and instruction.strip():
-                    # 对指令进行HTML转义，防止XSS攻击
-                    instruction = instruction.replace('<', '&lt;').replace('>', '&gt;')
-                    instruction_html = f'<div class="instruction"><strong>指令:</strong> <em>{instruction}</em></div>'
-                
-                # 添加场景显示
-                scene_html = f'<div class="scene-tag"><span>场景: {scene}</span></div>'
-                
-                # 添加图像显示区域
-                images_html = ""
-                if images:
-                    images_html = '<div class="image-section"><h3>提取的图像</h3>'
-                    for i, img in enumerate(images):
-                        img_path = img.get('path', '')
-                        img_desc = img.get('description', '图像描述')
-                        if img_path:
-                            images_html += f'''
-                            <div class="image-container">
-                                <img src="/images/{img_path}" alt="图像 {i+1}">
-                                <p class="image-description">{img_desc}</p>
-                            </div>
-                            '''
-                    images_html += '</div>'
-                
-                # 添加表格显示区域
-                tables_html = ""
-                if tables:
-                    tables_html = '<div class="table-section"><h3>提取的表格</h3>'
-                    for i, table in enumerate(tables):
-                        table_data = table.get('data', '')
-                        table_desc = table.get('description', '表格描述')
-                        tables_html += f'''
-                        <div class="table-container">
-                            <p class="table-description">{table_desc}</p>
-                            {table_data}
-                        </div>
-                        '''
-                    tables_html += '</div>'
-                
-                history_html += f"""
-                <div class="history-item">
-                    <h3>任务结果</h3>
-                    <div class="timestamp">{timestamp}</div>
-                    {scene_html}
-                    {instruction_html}
-                    <div class="content">{result}</div>
-                    {images_html}
-                    {tables_html}
-                </div>
-                """
+            # 只渲染第一页历史记录，其余的在滚动时通过/api/history/fragments加载
+            history_html = render_home_history()
             
-            html = HTML_TEMPLATE.format(result=current_result, history=history_html, ws_port=7866)
-            self.wfile.write(html.encode('utf-8'))
+            page = HTML_TEMPLATE.format(result=current_result, history=history_html, ws_port=7866).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
         else:
             super().do_GET()
 
+    def _send_json(self, data):
+        """发送JSON响应（带Content-Length，以便复用长连接）"""
+        response = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.send_header('Access-Control-Allow-Origin', '*')  # 添加CORS头
+        self.end_headers()
+        self.wfile.write(response)
+
     def _get_db_stats(self):
         """获取数据库统计信息"""
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         
         # 获取总记录数
         cursor.execute('SELECT COUNT(*) FROM results_history')
@@ -1043,65 +1641,34 @@ class ResultViewerHandler(http.server.SimpleHTTPRequestHandler):
         
         # 获取数据库文件大小
         try:
-            db_size_bytes = os.path.getsize(DB_FILE)
-            if db_size_bytes < 1024:
-                db_size = f"{db_size_bytes} B"
-            elif db_size_bytes < 1024 * 1024:
-                db_size = f"{db_size_bytes / 1024:.2f} KB"
+            size_bytes = db_size_bytes()
+            if size_bytes < 1024:
+                db_size = f"{size_bytes} B"
+            elif size_bytes < 1024 * 1024:
+                db_size = f"{size_bytes / 1024:.2f} KB"
             else:
-                db_size = f"{db_size_bytes / (1024 * 1024):.2f} MB"
+                db_size = f"{size_bytes / (1024 * 1024):.2f} MB"
         except:
             db_size = "未知"
         
-        conn.close()
-        
         return {
             'totalRecords': total_records,
             'latestRecord': latest_record,
             'dbSize': db_size
         }
 
-    def _get_history_from_db(self):
-        """从数据库获取历史记录"""
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # 查询历史记录，只返回基本信息
-        cursor.execute('''
-        SELECT id, timestamp, instruction, scene
-        FROM results_history
-        ORDER BY timestamp DESC
-        LIMIT 100
-        ''')
-        
-        results = []
-        for row in cursor.fetchall():
-            results.append({
-                'id': row['id'],
-                'timestamp': row['timestamp'],
-                'instruction': row['instruction'],
-                'scene': row['scene']
-            })
-        
-        conn.close()
-        return results
-    
     def _get_history_detail_from_db(self, record_id):
         """从数据库获取单条历史记录的详细信息"""
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         
         # 查询指定ID的历史记录详情
         cursor.execute('''
-        SELECT id, timestamp, result, instruction, article_url, scene, images, tables
+        SELECT id, timestamp, result, instruction, article_url, scene, images, tables, metrics
         FROM results_history
         WHERE id = ?
         ''', (record_id,))
         
         row = cursor.fetchone()
-        conn.close()
         
         if not row:
             return None
@@ -1129,12 +1696,18 @@ class ResultViewerHandler(http.server.SimpleHTTPRequestHandler):
             except:
                 detail['tables'] = []
         
+        if row['metrics']:
+            try:
+                detail['metrics'] = json.loads(row['metrics'])
+            except ValueError:
+                pass
+        
         return detail
 
 # 添加一个函数用于更新结果
 def update_result(data):
     """更新当前结果并广播给所有连接的客户端"""
-    global current_result, results_history
+    global current_result
     instruction = data.get("instruction", "")
     # 处理数据
     content = data["answer"]
@@ -1177,23 +1750,40 @@ def update_result(data):
             new_entry["images"] = images
         if tables:
             new_entry["tables"] = tables
+        # 场景脚本返回的运行指标（耗时、token用量）随记录一起保存
+        if data.get("metrics"):
+            new_entry["metrics"] = data["metrics"]
         
-        # 添加到历史记录中
-        results_history.insert(0, new_entry)
- 
-    # 保存历史记录到文件和数据库
-    save_history()
+        # 只写入这一条新记录，首页缓存随之失效
+        append_history(new_entry)
+        invalidate_history_cache()
     
-    # 将更新后的结果放入队列，供WebSocket发送
-    result_queue.put(current_result)
+    # 通知WebSocket服务器广播更新后的结果
+    notify_result(current_result)
+
+def notify_result(result):
+    """
+    从任意线程通知WebSocket服务器有新结果。
+
+    通过call_soon_threadsafe把结果放入事件循环中的队列，广播任务被立即唤醒；
+    WebSocket服务器尚未启动时忽略，新连接建立时会收到current_result。
+    """
+    loop = _ws_loop
+    if loop is None or loop.is_closed():
+        return
+    try:
+        loop.call_soon_threadsafe(_ws_updates.put_nowait, result)
+    except RuntimeError:
+        # 事件循环已关闭
+        pass
 
 def start_result_viewer():
     """启动结果查看器服务器"""
     # 初始化数据库
     init_db()
     
-    # 加载历史记录
-    load_history()
+    # 迁移旧版历史记录文件（仅首次启动时生效）
+    migrate_legacy_history()
     
     # 使用不同的端口
     http_port = 7865
@@ -1201,8 +1791,8 @@ def start_result_viewer():
     
     # 启动HTTP服务器
     handler = ResultViewerHandler
-    httpd = socketserver.TCPServer(("", http_port), handler)
-    print(f"结果查看器已启动，访问 http://localhost:{http_port} 查看结果")
+    httpd = PooledHTTPServer(("", http_port), handler, workers=HTTP_WORKERS)
+    print(f"结果查看器已启动，访问 http://localhost:{http_port} 查看结果，处理线程数: {HTTP_WORKERS}")
     
     # 启动WebSocket服务器线程
     ws_thread = threading.Thread(target=start_websocket_server, args=(ws_port,))
@@ -1217,58 +1807,85 @@ def start_websocket_server(port=7866):
     import asyncio
     import websockets
     
-    # 存储活动连接
-    active_connections = set()
+    # 存储活动连接及其发送通道
+    active_connections = {}
+    
+    class ClientChannel:
+        """
+        单个连接的发送通道：有界缓冲区加独立的发送任务。
+        
+        缓冲区满时丢弃最早的消息（客户端只关心最新结果），
+        慢客户端只会拖慢自己的发送任务，不影响其他连接。
+        """
+        
+        def __init__(self, websocket):
+            self.websocket = websocket
+            self.buffer = asyncio.Queue(maxsize=WS_SEND_BUFFER_SIZE)
+            self.last_sent = None
+            self.task = asyncio.create_task(self._send_loop())
+        
+        def offer(self, message):
+            # 与最近入队的内容相同时不再发送
+            if message == self.last_sent:
+                return
+            self.last_sent = message
+            if self.buffer.full():
+                self.buffer.get_nowait()
+            self.buffer.put_nowait(message)
+        
+        async def _send_loop(self):
+            while True:
+                message = await self.buffer.get()
+                try:
+                    await self.websocket.send(message)
+                except websockets.ConnectionClosed:
+                    break
+                except Exception as e:
+                    print(f"发送结果时出错: {str(e)}")
+    
+    def broadcast(message):
+        """把结果放入每个连接的发送缓冲区（不等待发送完成）"""
+        for channel in active_connections.values():
+            channel.offer(message)
     
     async def register(websocket):
         """注册新的WebSocket连接"""
         global current_result
-        active_connections.add(websocket)
+        channel = ClientChannel(websocket)
+        active_connections[websocket] = channel
         try:
             # 发送当前结果
-            await websocket.send(current_result)
+            channel.offer(current_result)
             
             # 处理来自客户端的消息
             async for message in websocket:
                 if message == 'clear':
                     current_result = "准备好接收新任务..."
                     # 通知所有客户端
-                    if active_connections:
-                        websockets_tasks = [
-                            conn.send(current_result) for conn in active_connections
-                        ]
-                        await asyncio.gather(*websockets_tasks)
+                    broadcast(current_result)
                 elif message == 'clear_history':
-                    clear_history()
+                    # 清除数据库等阻塞操作放到线程中执行，不阻塞事件循环
+                    await asyncio.get_running_loop().run_in_executor(None, clear_history)
                     current_result = "历史记录已清除，准备好接收新任务..."
-                    if active_connections:
-                        websockets_tasks = [
-                            conn.send(current_result) for conn in active_connections
-                        ]
-                        await asyncio.gather(*websockets_tasks)
+                    broadcast(current_result)
         finally:
-            active_connections.remove(websocket)
+            del active_connections[websocket]
+            channel.task.cancel()
     
     async def broadcast_results():
-        """广播结果更新到所有连接的客户端"""
+        """等待update_result的通知并广播，没有更新时不占用CPU"""
         while True:
-            try:
-                # 非阻塞方式检查队列
-                if not result_queue.empty():
-                    result = result_queue.get_nowait()
-                    if active_connections:  # 只有在有连接时才广播
-                        websockets_tasks = [
-                            websocket.send(result) for websocket in active_connections
-                        ]
-                        await asyncio.gather(*websockets_tasks)
-                
-                # 短暂休眠以避免CPU占用过高
-                await asyncio.sleep(0.1)
-            except Exception as e:
-                print(f"广播结果时出错: {str(e)}")
+            result = await _ws_updates.get()
+            # 积压了多条更新时只广播最新的一条
+            while not _ws_updates.empty():
+                result = _ws_updates.get_nowait()
+            broadcast(result)
     
     async def main():
         """主WebSocket服务器函数"""
+        global _ws_loop, _ws_updates
+        _ws_updates = asyncio.Queue()
+        _ws_loop = asyncio.get_running_loop()
         # 启动WebSocket服务器
         async with websockets.serve(register, "localhost", port):
             print(f"WebSocket服务器已启动，监听端口 {port}")
@@ -1283,24 +1900,25 @@ def start_websocket_server(port=7866):
 # 添加一个清除历史记录的函数
 def clear_history():
     """清除历史记录"""
-    global results_history
-    results_history = []
-    
-    # 清除JSON文件
-    save_history()
+    # 清空JSONL日志
+    try:
+        if os.path.exists(HISTORY_LOG_FILE):
+            open(HISTORY_LOG_FILE, 'w', encoding='utf-8').close()
+    except Exception as e:
+        print(f"清空JSONL历史日志时出错: {str(e)}")
     
     # 清除数据库记录
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM results_history')
-        
-        # 重置自增ID计数器
-        cursor.execute('DELETE FROM sqlite_sequence WHERE name="results_history"')
-        
-        conn.commit()
-        conn.close()
+        conn = get_connection()
+        with conn:
+            conn.execute('DELETE FROM results_history')
+            
+            # 重置自增ID计数器
+            conn.execute("DELETE FROM sqlite_sequence WHERE name='results_history'")
     except Exception as e:
         print(f"清除数据库历史记录时出错: {str(e)}")
     
+    # ID从1重新开始，缓存的片段不再对应原来的记录
+    invalidate_history_cache(clear_fragments=True)
+    
     print("历史记录已清除")
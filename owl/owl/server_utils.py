@@ -0,0 +1,372 @@
+"""
+    * @FileDescription: HTTP服务公共组件：线程池服务器与请求延迟统计
+    * @Author: 胡皓文
+    * @Date: 2025-04-09
+    * @LastEditors: 胡皓文
+    * @LastEditTime: 2025-04-09
+    * @Contributors: 胡皓文
+"""
+
+import os
+import time
+import bisect
+import socket
+import selectors
+import threading
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+
+# 处理HTTP请求的线程数
+HTTP_WORKERS = int(os.getenv("OWL_HTTP_WORKERS", "16"))
+# 长连接空闲多久（秒）后关闭，避免空闲连接长期占用处理线程
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("OWL_HTTP_KEEPALIVE_TIMEOUT", "15"))
+# 同时进行的SSE等推送响应数上限，推送在处理线程池之外的独立线程中进行，超出时返回503
+HTTP_MAX_STREAMS = int(os.getenv("OWL_HTTP_MAX_STREAMS", "64"))
+
+# 延迟直方图的桶上界（毫秒）
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class PooledHTTPServer(socketserver.TCPServer):
+    """
+    使用固定大小线程池处理请求的HTTP服务器。
+
+    与每个连接新建一个线程的ThreadingMixIn不同，线程数有上限，
+    慢请求（大文件传输、历史记录查询）不会阻塞其他请求。
+    处理线程只在处理请求时占用：长连接处理完一个请求后交给IdleConnections等待下一个请求，
+    SSE等长时间推送的响应在独立线程中进行，同时进行的推送数不超过max_streams。
+    需配合TimedRequestMixin使用。
+    """
+
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, workers=HTTP_WORKERS, max_streams=HTTP_MAX_STREAMS):
+        self.workers = workers
+        self.max_streams = max_streams
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+        self._streams = threading.BoundedSemaphore(max_streams)
+        self.idle_connections = IdleConnections(self, HTTP_KEEPALIVE_TIMEOUT)
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request_thread, request, client_address)
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def _process_request_thread(self, request, client_address):
+        handler = None
+        try:
+            handler = self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self._release(handler, request)
+
+    def resume(self, handler):
+        """长连接上有新请求到达，交给处理线程继续处理"""
+        self._executor.submit(self._resume_thread, handler)
+
+    def _resume_thread(self, handler):
+        try:
+            handler.resume()
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+        finally:
+            self._release(handler, handler.request)
+
+    def _release(self, handler, request):
+        # 推送响应和长连接交出后会在其他线程中继续使用，因此必须是本线程对该连接的最后一个操作
+        if getattr(handler, "streaming", False):
+            # 推送线程写完响应后负责关闭连接
+            threading.Thread(target=handler.run_stream, name="http-stream", daemon=True).start()
+            return
+        if getattr(handler, "keep_alive", False):
+            # 交给IdleConnections等待下一个请求
+            self.idle_connections.add(handler)
+            return
+        self.shutdown_request(request)
+
+    def acquire_stream(self):
+        """占用一个推送名额，已达上限时返回False"""
+        return self._streams.acquire(blocking=False)
+
+    def release_stream(self):
+        self._streams.release()
+
+    def server_close(self):
+        super().server_close()
+        self.idle_connections.close()
+        self._executor.shutdown(wait=False)
+
+
+class IdleConnections:
+    """
+    在单个线程中用selector等待所有空闲长连接上的下一个请求。
+
+    请求到达时把连接交回线程池处理，空闲超过timeout秒的连接直接关闭，
+    空闲连接不再各自占用一个处理线程。
+    """
+
+    def __init__(self, server, timeout):
+        self.server = server
+        self.timeout = timeout
+        self._selector = selectors.DefaultSelector()
+        self._pending = []
+        self._deadlines = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+        threading.Thread(target=self._run, name="http-idle", daemon=True).start()
+
+    def add(self, handler):
+        """登记一个刚处理完请求的长连接"""
+        with self._lock:
+            self._pending.append(handler)
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self._wakeup_writer.send(b"\0")
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self._deadlines) + len(self._pending)
+
+    def _run(self):
+        while not self._closed:
+            for key, _ in self._selector.select(timeout=1):
+                if key.fileobj is self._wakeup_reader:
+                    try:
+                        while self._wakeup_reader.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                handler = key.data
+                self._selector.unregister(key.fileobj)
+                self._deadlines.pop(handler, None)
+                self.server.resume(handler)
+
+            with self._lock:
+                pending, self._pending = self._pending, []
+            now = time.monotonic()
+            for handler in pending:
+                try:
+                    self._selector.register(handler.request, selectors.EVENT_READ, handler)
+                    self._deadlines[handler] = now + self.timeout
+                except (ValueError, OSError):
+                    # 连接已关闭
+                    self._close(handler)
+
+            for handler, deadline in list(self._deadlines.items()):
+                if deadline <= now:
+                    self._selector.unregister(handler.request)
+                    del self._deadlines[handler]
+                    self._close(handler)
+
+        for handler in list(self._deadlines):
+            self._close(handler)
+        self._selector.close()
+
+    def _close(self, handler):
+        try:
+            handler.close()
+        finally:
+            self.server.shutdown_request(handler.request)
+
+    def close(self):
+        self._closed = True
+        self._wakeup()
+
+
+def route_key(path):
+    """
+    把请求路径归并为统计用的路由，避免ID、文件名等使统计项无限增长。
+
+    例如 /api/history/12 -> /api/history/*，/images/a.png -> /images/*
+    """
+    path = path.split('?', 1)[0]
+    parts = [part for part in path.split('/') if part]
+    if not parts:
+        return '/'
+    keep = 2 if parts[0] == 'api' else 1
+    key = '/' + '/'.join(parts[:keep])
+    if len(parts) > keep:
+        key += '/*'
+    return key
+
+
+class LatencyHistogram:
+    """按路由统计请求延迟的直方图（线程安全）"""
+
+    def __init__(self, buckets_ms=None):
+        self.buckets_ms = list(buckets_ms or LATENCY_BUCKETS_MS)
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, seconds):
+        """记录一次请求的耗时"""
+        elapsed_ms = seconds * 1000
+        index = bisect.bisect_left(self.buckets_ms, elapsed_ms)
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = {
+                    "counts": [0] * (len(self.buckets_ms) + 1),
+                    "count": 0,
+                    "sum_ms": 0.0,
+                    "max_ms": 0.0,
+                }
+            stats["counts"][index] += 1
+            stats["count"] += 1
+            stats["sum_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def _quantile(self, counts, total, q):
+        # 返回累计数达到q分位的桶上界，落在最后一个桶时返回None（超出最大上界）
+        threshold = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return self.buckets_ms[index] if index < len(self.buckets_ms) else None
+        return None
+
+    def snapshot(self):
+        """返回各路由的直方图和p50/p95/p99估计值（毫秒）"""
+        with self._lock:
+            routes = {route: dict(stats, counts=list(stats["counts"])) for route, stats in self._routes.items()}
+
+        result = {}
+        for route, stats in routes.items():
+            total = stats["count"]
+            result[route] = {
+                "count": total,
+                "avg_ms": round(stats["sum_ms"] / total, 3) if total else 0,
+                "max_ms": round(stats["max_ms"], 3),
+                "p50_ms": self._quantile(stats["counts"], total, 0.50),
+                "p95_ms": self._quantile(stats["counts"], total, 0.95),
+                "p99_ms": self._quantile(stats["counts"], total, 0.99),
+                "buckets": {
+                    **{f"le_{bound}": count for bound, count in zip(self.buckets_ms, stats["counts"])},
+                    "le_inf": stats["counts"][-1],
+                },
+            }
+        return {"buckets_ms": self.buckets_ms, "routes": result}
+
+
+class TimedRequestMixin:
+    """
+    为BaseHTTPRequestHandler启用HTTP/1.1长连接，并记录每个请求的处理耗时。
+
+    每次只处理连接上已到达的请求，之后把长连接交给服务器的IdleConnections等待，不占用处理线程。
+    使用时需把该类放在处理器基类之前，并设置latency_histogram属性。
+    """
+
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分两次写出，长连接上不关闭Nagle算法会与客户端的延迟确认叠加出约40ms的等待
+    disable_nagle_algorithm = True
+    timeout = HTTP_KEEPALIVE_TIMEOUT
+    latency_histogram = None
+    # 处理完当前请求后是否保持连接，等待下一个请求
+    keep_alive = False
+    # 是否已转到推送线程
+    streaming = False
+
+    def handle(self):
+        self.keep_alive = False
+        self.close_connection = True
+        self.handle_one_request()
+        # 客户端连续发送的请求已在缓冲区中，直接处理
+        while not self.close_connection and not self.streaming and self._has_buffered_request():
+            self.handle_one_request()
+        if not isinstance(self.server, PooledHTTPServer):
+            # 其他服务器上按原方式在本线程中处理长连接
+            while not self.close_connection and not self.streaming:
+                self.handle_one_request()
+            return
+        self.keep_alive = not self.close_connection and not self.streaming
+
+    def _has_buffered_request(self):
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def resume(self):
+        """处理空闲长连接上新到达的请求"""
+        try:
+            self.handle()
+        finally:
+            self.finish()
+
+    def finish(self):
+        if self.streaming:
+            return
+        if self.keep_alive:
+            # 连接仍在使用，只把已写入的响应发出
+            self.wfile.flush()
+            return
+        super().finish()
+
+    def close(self):
+        """关闭空闲的长连接"""
+        super().finish()
+
+    def start_stream(self, target, *args):
+        """
+        在独立线程中执行长时间的推送响应（如SSE），不占用处理线程，也不计入延迟统计。
+
+        参数:
+            target: 写出响应的函数，返回后关闭连接。
+            *args: 传给target的参数。
+
+        返回:
+            bool: 推送名额已满时返回False，此时已回复503。
+        """
+        self._request_start = None
+        if not isinstance(self.server, PooledHTTPServer):
+            target(*args)
+            return True
+        if not self.server.acquire_stream():
+            self.send_error(503, "Too many streams")
+            return False
+        # 处理线程结束当前请求后再启动推送线程
+        self._stream = (target, args)
+        self.streaming = True
+        self.close_connection = True
+        return True
+
+    def run_stream(self):
+        """在推送线程中写出响应，之后关闭连接"""
+        target, args = self._stream
+        try:
+            target(*args)
+        except Exception:
+            self.server.handle_error(self.request, self.client_address)
+        finally:
+            self.server.release_stream()
+            try:
+                super().finish()
+            except OSError:
+                pass
+            self.server.shutdown_request(self.request)
+
+    def parse_request(self):
+        # 读到请求行后才开始计时，不计入长连接上等待下一个请求的空闲时间
+        self._request_start = time.perf_counter()
+        return super().parse_request()
+
+    def handle_one_request(self):
+        self.command = None
+        self._request_start = None
+        super().handle_one_request()
+        if self.command and self._request_start is not None and self.latency_histogram is not None:
+            self.latency_histogram.observe(route_key(self.path), time.perf_counter() - self._request_start)
@@ -0,0 +1,288 @@
+"""
+    * @FileDescription: 常驻工作进程池，预先导入场景脚本，避免每条指令都冷启动一个Python解释器
+    * @Author: 胡皓文
+    * @Date: 2025-04-08
+    * @LastEditors: 胡皓文
+    * @LastEditTime: 2025-04-08
+    * @Contributors: 胡皓文
+"""
+
+import io
+import os
+import sys
+import json
+import queue
+import atexit
+import threading
+import importlib
+import traceback
+import multiprocessing
+from pathlib import Path
+from jobs import EVENT_PREFIX
+
+# 场景模块所在目录，需要位于工作进程的sys.path中
+MODULE_DIR = str(Path(__file__).parent)
+
+# 默认预热的场景模块（相对于owl/owl目录）
+DEFAULT_SCENE_MODULES = [
+    "examples.run_default",
+    "examples.run_file",
+    "examples.run_scholar",
+    "examples.run_news",
+    "examples.run_product",
+    "examples.run_travel",
+]
+
+
+class _EventTap(io.TextIOBase):
+    """
+    任务期间替换工作进程的sys.stdout：以EVENT_PREFIX开头的行作为事件
+    通过管道转发给主进程，其余输出照常写到原来的标准输出。
+    """
+
+    def __init__(self, stream, send):
+        self._stream = stream
+        self._send = send
+        self._pending = ""
+
+    def write(self, text):
+        self._pending += text
+        while "\n" in self._pending:
+            line, self._pending = self._pending.split("\n", 1)
+            self._write_line(line)
+        return len(text)
+
+    def _write_line(self, line):
+        if line.startswith(EVENT_PREFIX):
+            try:
+                self._send(("event", json.loads(line[len(EVENT_PREFIX):])))
+                return
+            except (ValueError, OSError):
+                pass
+        self._stream.write(line + "\n")
+
+    def flush(self):
+        # 不完整的事件行留到换行后再处理，普通输出直接写出
+        if self._pending and not self._pending.startswith(EVENT_PREFIX[:len(self._pending)]):
+            self._stream.write(self._pending)
+            self._pending = ""
+        self._stream.flush()
+
+
+def _worker_main(conn, work_dir, scene_modules, warmup):
+    """
+    工作进程主循环：导入场景模块后，通过管道逐个接收并执行任务。
+
+    参数:
+        conn: 与主进程通信的管道端点。
+        work_dir (str): 工作目录，与原先子进程的cwd保持一致。
+        scene_modules (list): 需要预热的场景模块名。
+        warmup (bool): 是否在启动时立即导入全部场景模块。
+    """
+    os.chdir(work_dir)
+    os.environ['PYTHONIOENCODING'] = 'utf-8'
+
+    loaded_modules = {}
+    # 场景脚本在导入时会替换sys.stdout/sys.stderr，
+    # 保留被替换掉的包装器，防止其被回收时关闭共享的底层缓冲区
+    replaced_streams = []
+
+    def load_module(module_name):
+        if module_name not in loaded_modules:
+            stdout, stderr = sys.stdout, sys.stderr
+            loaded_modules[module_name] = importlib.import_module(module_name)
+            replaced_streams.extend([stdout, stderr])
+        return loaded_modules[module_name]
+
+    if warmup:
+        for module_name in scene_modules:
+            try:
+                load_module(module_name)
+            except Exception as e:
+                print(f"工作进程 {os.getpid()} 预热 {module_name} 失败: {str(e)}")
+
+    conn.send(("ready", os.getpid()))
+
+    # 事件可能由场景脚本内的其他线程输出，发送时需要加锁
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+
+        module_name, instruction, job_env = job
+        # 任务相关的环境变量（如OWL_JOB_DIR）只在本次任务期间生效
+        saved_env = {key: os.environ.get(key) for key in job_env}
+        os.environ.update(job_env)
+        try:
+            module = load_module(module_name)
+            stdout = sys.stdout
+            sys.stdout = _EventTap(stdout, send)
+            try:
+                result = module.process_instruction(instruction)
+            finally:
+                sys.stdout.flush()
+                sys.stdout = stdout
+            send(("result", result))
+        except Exception:
+            try:
+                send(("error", traceback.format_exc()))
+            except (EOFError, OSError):
+                break
+        finally:
+            for key, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+    conn.close()
+
+
+class _Worker:
+    """单个常驻工作进程及其管道"""
+
+    def __init__(self, ctx, work_dir, scene_modules, warmup):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, work_dir, scene_modules, warmup),
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.jobs = 0
+
+    def wait_ready(self):
+        """等待工作进程完成启动（预热）"""
+        if not self.ready:
+            kind, _ = self.conn.recv()
+            self.ready = kind == "ready"
+
+    def stop(self, timeout=5):
+        """通知工作进程退出，超时后强制终止"""
+        try:
+            self.conn.send(None)
+        except (EOFError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    常驻工作进程池。
+
+    每个工作进程在启动时导入场景脚本（camel-ai、各个工具包等），
+    之后通过本地管道接收任务，直接调用场景模块的process_instruction。
+
+    参数:
+        work_dir (str): 工作进程的工作目录。
+        size (int): 工作进程数量。
+        max_jobs (int): 每个工作进程处理多少个任务后被回收重建，0表示不回收。
+        warmup (bool): 是否在启动时预先导入全部场景模块。
+        scene_modules (list, optional): 场景模块名列表。
+    """
+
+    def __init__(self, work_dir, size=2, max_jobs=20, warmup=True, scene_modules=None):
+        self.work_dir = str(work_dir)
+        self.size = size
+        self.max_jobs = max_jobs
+        self.warmup = warmup
+        self.scene_modules = list(scene_modules or DEFAULT_SCENE_MODULES)
+        # 使用spawn方式，避免在多线程的服务器进程中fork
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _spawn(self):
+        worker = _Worker(self._ctx, self.work_dir, self.scene_modules, self.warmup)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _retire(self, worker):
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.stop()
+
+    def start(self):
+        """启动全部工作进程"""
+        # spawn出的子进程会继承主进程的sys.path
+        if MODULE_DIR not in sys.path:
+            sys.path.insert(0, MODULE_DIR)
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+        atexit.register(self.shutdown)
+        print(f"工作进程池已启动: {self.size} 个进程，每个进程最多处理 {self.max_jobs} 个任务，预热: {self.warmup}")
+        return self
+
+    def submit(self, module_name, instruction, job_env=None, on_event=None):
+        """
+        将任务交给空闲的工作进程执行，阻塞直到返回结果。
+
+        参数:
+            module_name (str): 场景模块名，例如"examples.run_default"。
+            instruction (str): 要处理的指令。
+            job_env (dict, optional): 本次任务期间设置的环境变量。
+            on_event (callable, optional): 收到场景脚本输出的事件时调用。
+
+        返回:
+            dict: 场景脚本process_instruction的返回值。
+        """
+        if self._closed:
+            raise RuntimeError("工作进程池已关闭")
+
+        worker = self._idle.get()
+        try:
+            worker.wait_ready()
+            worker.conn.send((module_name, instruction, job_env or {}))
+            while True:
+                kind, payload = worker.conn.recv()
+                if kind != "event":
+                    break
+                if on_event is not None:
+                    try:
+                        on_event(payload)
+                    except Exception as e:
+                        print(f"处理任务事件时出错: {str(e)}")
+        except (EOFError, OSError) as e:
+            # 工作进程异常退出，补充一个新的进程
+            self._retire(worker)
+            self._idle.put(self._spawn())
+            raise RuntimeError(f"工作进程异常退出: {str(e)}")
+
+        worker.jobs += 1
+        if self.max_jobs and worker.jobs >= self.max_jobs:
+            self._retire(worker)
+            worker = self._spawn()
+        self._idle.put(worker)
+
+        if kind == "error":
+            raise RuntimeError(f"场景脚本执行失败:\n{payload}")
+        return payload
+
+    def shutdown(self):
+        """关闭全部工作进程"""
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()